@@ -1,17 +1,21 @@
 from __future__ import division
 import sys, os
 import math
-import random
+import multiprocessing
 import time
 import copy
+import heapq
+import itertools
 
 # custom classes in other files
 # -----------------------------
-import AI_class
-import sensors
+import blocks
+import frustum
+import mesher
+import view_distance
+from model import *
 # -----------------------------
 
-from collections import deque
 from pyglet import image
 from pyglet.gl import *
 from pyglet.graphics import TextureGroup
@@ -20,9 +24,6 @@ from pyglet.window import key, mouse
 
 TICKS_PER_SEC = 60
 
-# Size of sectors used to ease block loading.
-SECTOR_SIZE = 16
-
 WALKING_SPEED = 5
 FLYING_SPEED = 15
 
@@ -40,6 +41,31 @@ TERMINAL_VELOCITY = 50
 
 PLAYER_HEIGHT = 2
 
+# Merge neighbouring faces with the same texture into larger quads when
+# building sector meshes. Each texture square is then drawn from its own
+# repeating texture.
+GREEDY_MESHING = False
+
+# Draw sector meshes as indexed triangles sharing their corners instead of
+# quads.
+INDEXED_MESHES = False
+
+# Number of worker processes building sector meshes in the background. The
+# main thread only uploads the finished meshes. 0 builds them in place. The
+# pool is started by main() before the window and its GL context exist.
+MESH_WORKERS = multiprocessing.cpu_count()
+
+# How many sectors around the player are shown at the start, and the range
+# the view distance may adapt within to keep the frame rate near
+# TICKS_PER_SEC.
+VIEW_DISTANCE = 4
+MIN_VIEW_DISTANCE = 2
+MAX_VIEW_DISTANCE = 8
+
+# Model.autosave() runs every AUTOSAVE_INTERVAL seconds, and when O is
+# pressed. 0 turns the timer off.
+AUTOSAVE_INTERVAL = 60.0
+
 if sys.version_info[0] >= 3:
     xrange = range
 
@@ -57,618 +83,270 @@ def cube_vertices(x, y, z, n):
     ]
 
 
-# changed n=4 to n=8 to allow for more textures
-def tex_coord(x, y, n=8):
-    """ Return the bounding vertices of the texture square.
-
-    """
-    m = 1.0 / n
-    dx = x * m
-    dy = y * m
-    return dx, dy, dx + m, dy, dx + m, dy + m, dx, dy + m
-
-
-def tex_coords(top, bottom, side):
-    """ Return a list of the texture squares for the top, bottom and side.
-
-    """
-    top = tex_coord(*top)
-    bottom = tex_coord(*bottom)
-    side = tex_coord(*side)
-    result = []
-    result.extend(top)
-    result.extend(bottom)
-    result.extend(side * 4)
-    return result
-
-
 TEXTURE_PATH = 'story_textures.png'
 
-#                   top,   bottom,  side
-# basic blocks
-GRASS = tex_coords((1, 0), (0, 1), (0, 0))
-SAND = tex_coords((1, 1), (1, 1), (1, 1))
-BRICK = tex_coords((2, 0), (2, 0), (2, 0))
-STONE = tex_coords((2, 1), (2, 1), (2, 1))
-MOB_STATE1 = tex_coords((2, 1), (2, 1), (0, 3))
-MOB_STATE2 = tex_coords((2, 1), (2, 1), (1, 3))
-SAT_PIECE = tex_coords((2, 1), (2, 1), (2, 3))
-HEART_1 = tex_coords((2,1), (2,1), (3,2))
-HEART_2 = tex_coords((2,1), (2,1), (3,3))
-
-# composite blocks
-COMPOSITE_RED = tex_coords((3, 1), (3, 1), (3, 1))
-COMPOSITE_BLUE = tex_coords((3, 0), (3, 0), (3, 0))
-COMPOSITE_BLACK = tex_coords((0, 2), (0, 2), (0, 2))
-COMPOSITE_GREY = tex_coords((1, 2), (1, 2), (1, 2))
-COMPOSITE_GREEN = tex_coords((2, 2), (2, 2), (2, 2))
-
-# green creeper blocks
-CREEPER_HEAD = tex_coords((4, 1), (4, 1), (4, 0))
-CREEPER_BODY = tex_coords((4, 1), (4, 1), (4, 1))
-
-# red creeper coutdown blocks
-CR_HEAD = tex_coords((4, 4), (4, 4), (4, 2))
-CR_1 = tex_coords((4, 4), (4, 4), (0, 4))
-CR_2 = tex_coords((4, 4), (4, 4), (1, 4))
-CR_3 = tex_coords((4, 4), (4, 4), (2, 4))
-CR_4 = tex_coords((4, 4), (4, 4), (3, 4))
-CR_5 = tex_coords((4, 4), (4, 4), (4, 3))
-
-# neutralized creeper blocks
-NC_HEAD = tex_coords((5, 1), (5, 1), (5, 0))
-NC_BODY = tex_coords((5, 1), (5, 1), (5, 1))
-
-# circuit blocks
-CABLE = tex_coords((1, 5), (1, 5), (1, 5))
-ELECH = tex_coords((2, 5), (2, 5), (2, 5))
-ELECT = tex_coords((0, 5), (0, 5), (0, 5))
-
-# sensor blocks
-SENSOR_ACTIVE = tex_coords((4, 5), (4, 5), (4, 5))
-SENSOR_RED = tex_coords((3, 5), (3, 5), (3, 5))
-
-# all textures possible
-ALL_TEXTURE = [GRASS, SAND, BRICK, STONE, MOB_STATE1, MOB_STATE2, SAT_PIECE, HEART_1, HEART_2,
-COMPOSITE_RED, COMPOSITE_BLUE, COMPOSITE_BLACK, COMPOSITE_GREY, COMPOSITE_GREEN,
-CREEPER_HEAD, CREEPER_BODY, CR_HEAD, CR_1, CR_2, CR_3, CR_4, CR_5, CABLE, ELECH, ELECT, 
-SENSOR_ACTIVE, SENSOR_RED]
-
-# all composite blocks
-COMPOSITE = [COMPOSITE_RED, COMPOSITE_BLUE, COMPOSITE_BLACK, COMPOSITE_GREY, COMPOSITE_GREEN]
-
-# all creeper blocks
-CREEPER = [CREEPER_HEAD, CREEPER_BODY, CR_HEAD, CR_1, CR_2, CR_3, CR_4, CR_5,
-NC_HEAD, NC_BODY]
-
-FACES = [
-    ( 0, 1, 0),
-    ( 0,-1, 0),
-    (-1, 0, 0),
-    ( 1, 0, 0),
-    ( 0, 0, 1),
-    ( 0, 0,-1),
-]
-
-
-def normalize(position):
-    """ Accepts `position` of arbitrary precision and returns the block
-    containing that position.
-
-    Parameters
-    ----------
-    position : tuple of len 3
-
-    Returns
-    -------
-    block_position : tuple of ints of len 3
-
-    """
-    x, y, z = position
-    x, y, z = (int(round(x)), int(round(y)), int(round(z)))
-    return (x, y, z)
-
-
-def sectorize(position):
-    """ Returns a tuple representing the sector for the given `position`.
-
-    Parameters
-    ----------
-    position : tuple of len 3
 
-    Returns
-    -------
-    sector : tuple of len 3
+class Renderer(object):
+    """ Draws the world of `model` with pyglet. It subscribes to the model
+    and rebuilds the mesh of each shown sector whose blocks change, on the
+    pool `workers` made by `mesher.start_workers()` if given.
 
     """
-    x, y, z = normalize(position)
-    x, y, z = x // SECTOR_SIZE, y // SECTOR_SIZE, z // SECTOR_SIZE
-    return (x, 0, z)
-
-
-class Model(object):
 
-    def __init__(self):
+    def __init__(self, model, workers=None):
+        self.model = model
 
         # A Batch is a collection of vertex lists for batched rendering.
         self.batch = pyglet.graphics.Batch()
 
         # A TextureGroup manages an OpenGL texture.
-        self.group = TextureGroup(image.load(TEXTURE_PATH).get_texture())
+        self.atlas = image.load(TEXTURE_PATH)
+        self.group = TextureGroup(self.atlas.get_texture())
 
-        # A mapping from position to the texture of the block at that position.
-        # This defines all the blocks that are currently in the world.
-        self.world = {}
+        # Mapping from texture square to a TextureGroup with a repeating
+        # texture of just that square, used for greedy meshing.
+        self.tile_groups = {}
 
-        self.circuit = {}
-
-        self.sensors = []
-
-        self.added_elech = False
-
-        # Same mapping as `world` but only contains blocks that are shown.
-        self.shown = {}
-
-        # Mapping from position to a pyglet `VertextList` for all shown blocks.
+        # Mapping from sector to the (group, mode, `VertexList`) drawing it, one
+        # per texture group, for all shown sectors.
         self._shown = {}
 
-        # Mapping from sector to a list of positions inside that sector.
-        self.sectors = {}
+        # Mapping from shown sector to the (low, high) corners of the box
+        # around its mesh, used to skip sectors outside the view frustum.
+        self.bounds = {}
 
-        # Simple function queue implementation. The queue is populated with
-        # _show_block() and _hide_block() calls
-        self.queue = deque()
+        # How many shown sectors the last `draw()` skipped.
+        self.culled = 0
 
-        self.rocket_loaded = False
-        self.rocket_health_red = pyglet.resource.image("rocket_health_red.png")
-        self.rocket_health_red = pyglet.sprite.Sprite(self.rocket_health_red, 60, 75)
-        self.rocket_health_red.scale_y = 0.5
-        self.rocket_health_outline = pyglet.resource.image("rocket_health_outline.png")
-        self.rocket_health_outline = pyglet.sprite.Sprite(self.rocket_health_outline, 60, 75)
-        self.rocket_health_outline.scale = 0.5
+        # How many sectors around the player are shown.
+        self.view_radius = VIEW_DISTANCE
 
-        self.rocket_health = 1
+        # Shown sectors whose blocks changed and need their mesh rebuilt.
+        self.dirty = set()
 
-        self.mob_loaded = False
+        # Worker pool building sector meshes, and a mapping from sector to the
+        # pending result of its latest build.
+        self.workers = workers
+        self.pending = {}
 
-        self.mob_mode = "1"
+        # Mapping from sector to the pending result of making its chunk when
+        # the world has no edge, see `_show_sector()`.
+        self.generating = {}
 
-        self.mob_x_position = 0
+        # Priority queue of [priority, order, sector, func] entries for the
+        # pending _show_sector() and _hide_sector() calls. Sectors close to
+        # the player and in front of them come first. Cancelled entries have
+        # `func` set to None and are skipped when popped.
+        self.queue = []
+        self._order = itertools.count()
 
-        self.mob_z_position = 0
+        # Mapping from sector to its live entry in the queue.
+        self.queued = {}
 
-        #need for when jumping
-        self.mob_y_position = -1
+        # The sector the player is in and the direction they are looking,
+        # see `set_focus()`.
+        self.focus = ((0, 0, 0), (0, 0, -1))
+        self._heading = None
 
-        self.mob_update_count = 0
+        # How many queued calls the last process_queue() ran, and how many
+        # calls were cancelled by an opposite call for the same sector.
+        self.drained = 0
+        self.cancelled = 0
 
-        self.mob_frames = 33
+        model.subscribe(self)
+        for structure in model.structures:
+            self.structure_added(structure)
 
-        # AI for running or following
-        self.ai = AI_class.AI()
+    def blocks_changed(self, sectors):
+        """ Called by the model when the blocks of `sectors` changed, None
+        for all of them. The shown ones are rebuilt by `process_queue()`.
 
-        # satellite pieces
-        self.sat_pieces = []
-
-        self.trapped = False
-
-        # health blocks
-        self.health_map_icons = {}
-
-        self.rocket_launched = False
-        self.rocket_count = 0
-        self.rocket_altitude = 0
-
-        self._initialize()
-
-    def _initialize(self):
-        """ Initialize the world by placing all the blocks.
-
-        """
-        n = 80  # 1/2 width and height of world
-        s = 1  # step size
-        y = 0  # initial y height
-        for x in xrange(-n, n + 1, s):
-            for z in xrange(-n, n + 1, s):
-                # create a layer stone an grass everywhere.
-                self.add_block((x, y - 2, z), GRASS, immediate=False)
-                self.add_block((x, y - 3, z), STONE, immediate=False)
-                if x in (-n, n) or z in (-n, n):
-                    # create outer walls.
-                    for dy in xrange(-2, 3):
-                        self.add_block((x, y + dy, z), STONE, immediate=False)
-
-        # generate the hills randomly
-        o = n - 10
-        for _ in xrange(120):
-            a = random.randint(-o, o)  # x position of the hill
-            b = random.randint(-o, o)  # z position of the hill
-            c = -1  # base of the hill
-            h = random.randint(1, 6)  # height of the hill
-            s = random.randint(4, 8)  # 2 * s is the side length of the hill
-            d = 1  # how quickly to taper off the hills
-            t = random.choice([GRASS, SAND, BRICK])
-            for y in xrange(c, c + h):
-                for x in xrange(a - s, a + s + 1):
-                    for z in xrange(b - s, b + s + 1):
-                        if (x - a) ** 2 + (z - b) ** 2 > (s + 1) ** 2:
-                            continue
-                        if (x - 0) ** 2 + (z - 0) ** 2 < 5 ** 2:
-                            continue
-                        self.add_block((x, y, z), t, immediate=False)
-                s -= d  # decrement side lenth so hills taper off
-
-        # randomly place pieces of satellite around map
-        for i in xrange(6):
-            x = random.randint(-75, 75)
-            z = random.randint(-75, 75)
-            y = -1
-            pos = (x, y, z)
-            while pos in self.world:
-                y += 1
-                pos = (x, y, z)
-            self.add_block(pos, SAT_PIECE, immediate=False)
-            self.sat_pieces.append(pos)
-
-    def mob_move_right(self):
-        """ Function to move the mob right
         """
-        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
-        self.mob_x_position += 1
-
-        if self.mob_mode == "1":
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
-        else:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+        if sectors is None:
+            self.dirty.update(self._shown)
+            self.dirty.update(self.pending)
+            return
+        for sector in sectors:
+            if sector in self._shown or sector in self.pending:
+                self.dirty.add(sector)
+
+    def structure_added(self, structure):
+        """ Called by the model when `structure` is lifted out of the world.
+        Gives it a mesh of its own, drawn at its offset.
 
-    def mob_move_left(self):
-        """ Function to move the mob left
         """
-        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
-        self.mob_x_position -= 1
+        meshes = mesher.build(*structure.faces(FACES), greedy=GREEDY_MESHING,
+                              indexed=INDEXED_MESHES, textures=blocks.TEXTURES)
+        structure.vertex_lists, structure.bounds = self._add_meshes(meshes)
+        if not structure.vertex_lists:
+            structure.bounds = None
 
-        if self.mob_mode == "1":
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
-        else:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+    def structure_removed(self, structure):
+        """ Called by the model when `structure` is put back into the world.
+        Deletes its mesh.
 
-    def mob_move_forward(self):
-        """ Function to move the mob forward
         """
-        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
-        self.mob_z_position += 1
+        for _, _, vertex_list in structure.vertex_lists:
+            vertex_list.delete()
+        structure.vertex_lists = []
 
-        if self.mob_mode == "1":
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
-        else:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+    def show_sector(self, sector):
+        """ Ensure the blocks in the given sector are drawn to the canvas.
 
-    def mob_move_backward(self):
-        """ Function to move the mob backward
         """
-        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
-        self.mob_z_position -= 1
-
-        if self.mob_mode == "1":
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
-        else:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
-
-    #jump functions
-    def mob_move_up(self):
-        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
-        self.mob_y_position += 1
-
-        if self.mob_mode == "1":
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
-        else:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
-
-    def mob_move_down(self):
-        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
-        self.mob_y_position -= 1
-
-        if self.mob_mode == "1":
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
-        else:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+        self._enqueue(self._show_sector, sector)
 
-    def load_mob(self):
-        if not self.mob_loaded:
-            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+    def _show_sector(self, sector):
+        """ Private implementation of the `show_sector()` method. Builds the
+        sector's mesh from a snapshot of its exposed blocks, on a worker when
+        there is a pool.
 
-    def launch_mob(self):
-        if not self.mob_loaded:
-            self.add_block((self.mob_x_position, -1, self.mob_z_position), MOB_STATE1)
-            self.mob_loaded = True
-
-    def stop_mob(self):
-        if self.mob_loaded:
-            self.mob_loaded = False
-
-    def process_mob(self):
-        """
-            This function will process the mob and decide if it should
-            move left, right, forward, or backward
         """
-
-        if self.mob_loaded and self.mob_update_count >= 128:
-            # adjust the mob
-            if self.mob_mode == "1":
-                self.mob_mode = "2"
-            elif self.mob_mode == "2":
-                self.mob_mode = "1"
-            self.mob_move_left()
-
-            self.mob_update_count = 0
+        self.dirty.discard(sector)
+        model = self.model
+        if model.needs(sector):
+            if self.workers is not None:
+                # shown once it is made, see `process_queue()`.
+                if sector not in self.generating:
+                    self.generating[sector] = self.workers.apply_async(
+                        model.generator.chunk, (sector, SECTOR_SIZE))
+                return
+            model.make(sector)
+        snapshot = model.snapshot(sector)
+        if self.workers is None:
+            self._upload(sector, mesher.build(*snapshot,
+                greedy=GREEDY_MESHING, indexed=INDEXED_MESHES,
+                textures=blocks.TEXTURES))
         else:
-            self.mob_update_count += 1
+            # a newer build replaces any result still on its way.
+            self.pending[sector] = self.workers.apply_async(mesher.build,
+                snapshot, {'greedy': GREEDY_MESHING,
+                           'indexed': INDEXED_MESHES})
 
-        if self.mob_loaded and self.mob_update_count >= 128:
-            # adjust the mob
-            if self.mob_mode == "1":
-                self.mob_mode = "2"
-            elif self.mob_mode == "2":
-                self.mob_mode = "1"
-            self.mob_move_backward()
-
-            self.mob_update_count = 0
-        else:
-            self.mob_update_count += 1
-
-        if self.mob_loaded and self.mob_update_count >= 128:
-            # adjust the mob
-            if self.mob_mode == "1":
-                self.mob_mode = "2"
-            elif self.mob_mode == "2":
-                self.mob_mode = "1"
-            self.mob_move_right()
-
-            self.mob_update_count = 0
-        else:
-            self.mob_update_count += 1
-
-        if self.mob_loaded and self.mob_update_count >= 128:
-            # adjust the mob
-            if self.mob_mode == "1":
-                self.mob_mode = "2"
-            elif self.mob_mode == "2":
-                self.mob_mode = "1"
-            self.mob_move_forward()
-
-            self.mob_update_count = 0
-        else:
-            self.mob_update_count += 1
-
-    def hit_test(self, position, vector, max_distance=8):
-        """ Line of sight search from current position. If a block is
-        intersected it is returned, along with the block previously in the line
-        of sight. If no block is found, return None, None.
-
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position to check visibility from.
-        vector : tuple of len 3
-            The line of sight vector.
-        max_distance : int
-            How many blocks away to search for a hit.
-
-        """
-        m = 8
-        x, y, z = position
-        dx, dy, dz = vector
-        previous = None
-        for _ in xrange(max_distance * m):
-            key = normalize((x, y, z))
-            if key != previous and key in self.world:
-                return key, previous
-            previous = key
-            x, y, z = x + dx / m, y + dy / m, z + dz / m
-        return None, None
-
-    def neighbor(self, position):
-        x, y, z = position
-        local = set()
-        for dx in [-1, 0, 1]:  #if (dx is within [-1,0,1]) is true
-            for dy in [-1, 0, 1]:
-                for dz in [-1, 0, 1]:  #if (dz is within [-1,0,1]) is true then key = (x+dx,y,z+dz)
-                    key = (x + dx, y + dy, z + dz)
-                    local.add(key)
-        return(local)
-
-    def circuit_change(self):
-        count_h = {}
-        to_cable = set()
-        to_elect = set()
-        to_elech = set()
-        elech_safe = set()
-        check_elech = False
-        for position in self.circuit:
-            if self.circuit[position] == ELECH:
-                check_elech = True
-            if position not in count_h:
-                count_h[position] = 0
-            if self.circuit[position] is ELECT:
-                to_cable.add(position)
-            elif self.circuit[position] is ELECH:
-                local = self.neighbor(position)
-                for pos in local:
-                    if pos in self.circuit and self.circuit[pos] is CABLE:
-                        if pos not in count_h:
-                            count_h[pos] = 0
-                        count_h[pos] += 1
-                        if count_h[pos] <= 2:
-                            to_elech.add(pos)
-                        elif pos in to_elech:
-                            to_elech.remove(pos)
-                to_elect.add(position)
-        for position in to_elect:
-            self.add_block(position, ELECT)
-        for position in to_elech:
-                self.add_block(position, ELECH)
-        for position in to_cable:
-            self.add_block(position, CABLE)
-
-        if not check_elech:
-            self.added_elech = False
-
-    def exposed(self, position):
-        """ Returns False is given `position` is surrounded on all 6 sides by
-        blocks, True otherwise.
+    def _upload(self, sector, meshes):
+        """ Replace the vertex lists of `sector` with the built `meshes`, one
+        vertex list per texture group.
 
         """
-        x, y, z = position
-        for dx, dy, dz in FACES:
-            if (x + dx, y + dy, z + dz) not in self.world:
-                return True
-        return False
-
-    def add_block(self, position, texture, immediate=True):
-        """ Add a block with the given `texture` and `position` to the world.
+        self._delete_meshes(sector)
+        vertex_lists, bounds = self._add_meshes(meshes)
+        self._shown[sector] = vertex_lists
+        if vertex_lists:
+            self.bounds[sector] = bounds
 
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position of the block to add.
-        texture : list of len 3
-            The coordinates of the texture squares. Use `tex_coords()` to
-            generate.
-        immediate : bool
-            Whether or not to draw the block immediately.
+    def _add_meshes(self, meshes):
+        """ Add the built `meshes` to the batch, one vertex list per texture
+        group. Returns the (group, mode, `VertexList`) tuples and the (low,
+        high) corners of the box around them.
 
         """
-        if position in self.world:
-            self.remove_block(position, immediate)
-        self.world[position] = texture
-        self.sectors.setdefault(sectorize(position), []).append(position)
-        if immediate:
-            if self.exposed(position):
-                self.show_block(position)
-            self.check_neighbors(position)
-        if texture in [ELECH, CABLE, ELECT]:
-            self.circuit[position] = texture
-
-    def remove_block(self, position, immediate=True):
-        """ Remove the block at the given `position`.
-
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position of the block to remove.
-        immediate : bool
-            Whether or not to immediately remove block from canvas.
-
-        """
-        del self.world[position]
-        self.sectors[sectorize(position)].remove(position)
-        if immediate:
-            if position in self.shown:
-                self.hide_block(position)
-            self.check_neighbors(position)
-        if position in self.circuit:
-            del self.circuit[position]
-
-    def check_neighbors(self, position):
-        """ Check all blocks surrounding `position` and ensure their visual
-        state is current. This means hiding blocks that are not exposed and
-        ensuring that all exposed blocks are shown. Usually used after a block
-        is added or removed.
-
-        """
-        x, y, z = position
-        for dx, dy, dz in FACES:
-            key = (x + dx, y + dy, z + dz)
-            if key not in self.world:
+        vertex_lists = []
+        low, high = [float('inf')] * 3, [float('-inf')] * 3
+        for square, (vertex_data, texture_data, indices) in meshes.items():
+            group = self.group if square is None else self.tile_group(square)
+            count = len(vertex_data) // 3
+            if not count:
                 continue
-            if self.exposed(key):
-                if key not in self.shown:
-                    self.show_block(key)
+            if indices is None:
+                mode = GL_QUADS
+                vertex_list = self.batch.add(count, mode, group,
+                    ('v3f/static', vertex_data),
+                    ('t2f/static', texture_data))
             else:
-                if key in self.shown:
-                    self.hide_block(key)
-
-    def show_block(self, position, immediate=True):
-        """ Show the block at the given `position`. This method assumes the
-        block has already been added with add_block()
-
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position of the block to show.
-        immediate : bool
-            Whether or not to show the block immediately.
+                mode = GL_TRIANGLES
+                vertex_list = self.batch.add_indexed(count, mode,
+                    group, indices,
+                    ('v3f/static', vertex_data),
+                    ('t2f/static', texture_data))
+            vertex_lists.append((group, mode, vertex_list))
+            for i in xrange(3):
+                low[i] = min(low[i], min(vertex_data[i::3]))
+                high[i] = max(high[i], max(vertex_data[i::3]))
+        return vertex_lists, (low, high)
+
+    def tile_group(self, square):
+        """ Return the TextureGroup drawing the texture square whose lower
+        left corner is `square` as a repeating texture.
 
         """
-        texture = self.world[position]
-        self.shown[position] = texture
-        if immediate:
-            self._show_block(position, texture)
-        else:
-            self._enqueue(self._show_block, position, texture)
-
-    def _show_block(self, position, texture):
-        """ Private implementation of the `show_block()` method.
+        group = self.tile_groups.get(square)
+        if group is None:
+            atlas = self.atlas
+            size = atlas.width // 8
+            region = atlas.get_region(int(square[0] * atlas.width),
+                                      int(square[1] * atlas.height),
+                                      size, size)
+            texture = region.get_texture()
+            glBindTexture(texture.target, texture.id)
+            glTexParameteri(texture.target, GL_TEXTURE_WRAP_S, GL_REPEAT)
+            glTexParameteri(texture.target, GL_TEXTURE_WRAP_T, GL_REPEAT)
+            group = self.tile_groups[square] = TextureGroup(texture)
+        return group
 
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position of the block to show.
-        texture : list of len 3
-            The coordinates of the texture squares. Use `tex_coords()` to
-            generate.
+    def hide_sector(self, sector):
+        """ Ensure the blocks in the given sector are removed from the
+        canvas.
 
         """
-        x, y, z = position
-        vertex_data = cube_vertices(x, y, z, 0.5)
-        texture_data = list(texture)
-        # create vertex list
-        # FIXME Maybe `add_indexed()` should be used instead
-        self._shown[position] = self.batch.add(24, GL_QUADS, self.group,
-            ('v3f/static', vertex_data),
-            ('t2f/static', texture_data))
-
-    def hide_block(self, position, immediate=True):
-        """ Hide the block at the given `position`. Hiding does not remove the
-        block from the world.
+        self._enqueue(self._hide_sector, sector)
 
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position of the block to hide.
-        immediate : bool
-            Whether or not to immediately remove the block from the canvas.
+    def _hide_sector(self, sector):
+        """ Private implementation of the `hide_sector()` method.
 
         """
-        self.shown.pop(position)
-        if immediate:
-            self._hide_block(position)
-        else:
-            self._enqueue(self._hide_block, position)
+        self.dirty.discard(sector)
+        self.pending.pop(sector, None)
+        self.generating.pop(sector, None)
+        self._delete_meshes(sector)
+        self.model.release(sector)
 
-    def _hide_block(self, position):
-        """ Private implementation of the 'hide_block()` method.
+    def _delete_meshes(self, sector):
+        """ Remove the vertex lists of `sector` from the batch.
 
         """
-        self._shown.pop(position).delete()
+        self.bounds.pop(sector, None)
+        for _, _, vertex_list in self._shown.pop(sector, []):
+            vertex_list.delete()
 
-    def show_sector(self, sector):
-        """ Ensure all blocks in the given sector that should be shown are
-        drawn to the canvas.
+    def draw(self, planes):
+        """ Draw the shown sectors whose bounding box is at least partly
+        inside the view frustum.
 
-        """
-        for position in self.sectors.get(sector, []):
-            if position not in self.shown and self.exposed(position):
-                self.show_block(position, False)
-
-    def hide_sector(self, sector):
-        """ Ensure all blocks in the given sector that should be hidden are
-        removed from the canvas.
+        Parameters
+        ----------
+        planes : list
+            The six planes of the view frustum, as made by `frustum.planes()`.
 
         """
-        for position in self.sectors.get(sector, []):
-            if position in self.shown:
-                self.hide_block(position, False)
+        visible = {}
+        self.culled = 0
+        for sector, (low, high) in self.bounds.items():
+            if not frustum.box_visible(planes, low, high):
+                self.culled += 1
+                continue
+            for group, mode, vertex_list in self._shown[sector]:
+                visible.setdefault(group, []).append((mode, vertex_list))
+        # set each texture up once for all the sectors using it.
+        for group, vertex_lists in visible.items():
+            group.set_state_recursive()
+            for mode, vertex_list in vertex_lists:
+                vertex_list.draw(mode)
+            group.unset_state_recursive()
+        # structures are drawn shifted by their offset.
+        for structure in self.model.structures:
+            if structure.bounds is None:
+                continue
+            low, high = [[a + b for a, b in zip(corner, structure.offset)]
+                         for corner in structure.bounds]
+            if not frustum.box_visible(planes, low, high):
+                continue
+            glPushMatrix()
+            glTranslatef(*structure.offset)
+            for group, mode, vertex_list in structure.vertex_lists:
+                group.set_state_recursive()
+                vertex_list.draw(mode)
+                group.unset_state_recursive()
+            glPopMatrix()
 
     def change_sectors(self, before, after):
         """ Move from sector `before` to sector `after`. A sector is a
@@ -676,20 +354,8 @@ class Model(object):
         world rendering.
 
         """
-        before_set = set()
-        after_set = set()
-        pad = 4
-        for dx in xrange(-pad, pad + 1):
-            for dy in [0]:  # xrange(-pad, pad + 1):
-                for dz in xrange(-pad, pad + 1):
-                    if dx ** 2 + dy ** 2 + dz ** 2 > (pad + 1) ** 2:
-                        continue
-                    if before:
-                        x, y, z = before
-                        before_set.add((x + dx, y + dy, z + dz))
-                    if after:
-                        x, y, z = after
-                        after_set.add((x + dx, y + dy, z + dz))
+        before_set = sectors_around(before, self.view_radius)
+        after_set = sectors_around(after, self.view_radius)
         show = after_set - before_set
         hide = before_set - after_set
         for sector in show:
@@ -697,75 +363,164 @@ class Model(object):
         for sector in hide:
             self.hide_sector(sector)
 
-    def _enqueue(self, func, *args):
-        """ Add `func` to the internal queue.
+    def change_view_radius(self, sector, radius):
+        """ Show `radius` sectors around `sector` instead of the current
+        view radius. Only the ring of sectors between the old and the new
+        radius is shown or hidden.
+
+        """
+        before_set = sectors_around(sector, self.view_radius)
+        after_set = sectors_around(sector, radius)
+        self.view_radius = radius
+        for sector in after_set - before_set:
+            self.show_sector(sector)
+        for sector in before_set - after_set:
+            self.hide_sector(sector)
+
+    def _enqueue(self, func, sector):
+        """ Add a call of `func` for `sector` to the internal queue. A call
+        still waiting for the same sector is replaced, and a show and a hide
+        of the same sector cancel each other out.
 
         """
-        self.queue.append((func, args))
+        entry = self.queued.pop(sector, None)
+        if entry is not None and entry[3] == func:
+            entry[3] = None
+        elif entry is not None:
+            entry[3] = None
+            self.cancelled += 1
+            shown = sector in self._shown or sector in self.pending or \
+                sector in self.generating
+            if func == self._hide_sector and not shown:
+                # the sector was never shown, nothing to hide.
+                return
+            if func == self._show_sector and shown:
+                # the sector is still shown, edits keep it up to date.
+                return
+        entry = [self._priority(sector), next(self._order), sector, func]
+        heapq.heappush(self.queue, entry)
+        self.queued[sector] = entry
 
     def _dequeue(self):
-        """ Pop the top function from the internal queue and call it.
+        """ Pop the most urgent call from the internal queue and run it.
+
+        """
+        while self.queue:
+            _, _, sector, func = heapq.heappop(self.queue)
+            if func is not None:
+                del self.queued[sector]
+                func(sector)
+                return
+
+    @property
+    def queue_depth(self):
+        """ The number of calls waiting in the queue.
+
+        """
+        return len(self.queued)
+
+    def _priority(self, sector):
+        """ Return the queue priority of `sector`, lower runs first. That is
+        its distance in sectors from the player, doubled beside them and
+        tripled behind them.
+
+        """
+        (x, _, z), (vx, _, vz) = self.focus
+        dx, dz = sector[0] - x, sector[2] - z
+        d = math.sqrt(dx ** 2 + dz ** 2)
+        m = math.sqrt(vx ** 2 + vz ** 2)
+        if not d or not m:
+            return d
+        # 1 straight ahead, -1 straight behind.
+        facing = (dx * vx + dz * vz) / (d * m)
+        return d * (2 - facing)
+
+    def set_focus(self, sector, vector):
+        """ Tell the queue the player is in `sector` looking along
+        `vector`. The queue is reordered when the sector changes or the
+        player turns by more than about 45 degrees.
 
         """
-        func, args = self.queue.popleft()
-        func(*args)
+        self.focus = (sector, vector)
+        heading = (sector, round(math.atan2(vector[2], vector[0]) /
+                                 (math.pi / 4)))
+        if heading == self._heading:
+            return
+        self._heading = heading
+        self.queue = [entry for entry in self.queue if entry[3] is not None]
+        for entry in self.queue:
+            entry[0] = self._priority(entry[2])
+        heapq.heapify(self.queue)
 
     def process_queue(self):
         """ Process the entire queue while taking periodic breaks. This allows
         the game loop to run smoothly. The queue contains calls to
-        _show_block() and _hide_block() so this method should be called if
-        add_block() or remove_block() was called with immediate=False
+        _show_sector() and _hide_sector(). Sectors changed by add_block() or
+        remove_block() are rebuilt first, and meshes finished by the workers
+        are uploaded within the same time budget.
 
         """
-        start = time.process_time()
-        while self.queue and time.process_time() - start < 1.0 / TICKS_PER_SEC:
+        start = time.perf_counter()
+        self.drained = 0
+        while self.dirty:
+            self._show_sector(self.dirty.pop())
+        for sector, result in list(self.pending.items()):
+            if time.perf_counter() - start >= 1.0 / TICKS_PER_SEC:
+                return
+            if result.ready():
+                del self.pending[sector]
+                self._upload(sector, result.get())
+        for sector, result in list(self.generating.items()):
+            if time.perf_counter() - start >= 1.0 / TICKS_PER_SEC:
+                return
+            if result.ready():
+                del self.generating[sector]
+                self._generated(sector, result)
+        while self.queued and \
+                time.perf_counter() - start < 1.0 / TICKS_PER_SEC:
             self._dequeue()
+            self.drained += 1
+
+    def _generated(self, sector, result):
+        """ Add the chunk a worker generated for `sector` and show it. The
+        result is dropped if the sector was made in the meantime, for example
+        by an edit or a collision test, so those blocks are kept.
+
+        """
+        if self.model.needs(sector):
+            self.model.add_chunk(sector, *result.get())
+        self._show_sector(sector)
 
     def process_entire_queue(self):
-        """ Process the entire queue with no breaks.
+        """ Process the entire queue with no breaks, and wait for the workers
+        to finish every mesh.
 
         """
-        while self.queue:
+        while self.dirty:
+            self._show_sector(self.dirty.pop())
+        while self.queued:
             self._dequeue()
+        while self.generating:
+            sector, result = self.generating.popitem()
+            self._generated(sector, result)
+        while self.pending:
+            sector, result = self.pending.popitem()
+            self._upload(sector, result.get())
+
+    def close(self):
+        """ Stop the mesh workers.
 
-    def code_load(self, num="", type=""):
-        """
-        If given a number (num), returns composite block at that index.
-        If given a composite block type (type), returns the index of that type.
-        """
-        if not isinstance(num, str):
-            return COMPOSITE[int(num)]
-        elif not isinstance(type, str):
-            for i in xrange(0, len(COMPOSITE)):
-                if type == COMPOSITE[i]:
-                    return i
-        print("Invalid Call")
-
-    def load_txt(self):
-        """
-        Load composite blocks from a .txt file
         """
-        if not self.rocket_loaded:
-            for x in xrange(1, 21):
-                for z in xrange(-8, 13):
-                    for y in xrange(-1, 6):
-                        pos = (x, y, z)
-                        if pos in self.world:
-                            self.remove_block(pos)
-
-            with open('rocket.txt', 'r') as file:
-                line = file.readline()
-                while line:
-                    line = line.split(" ")
-                    x, y, z = int(line[0]), int(line[1]), int(line[2])
-                    block_type = self.code_load(num=int(line[3]))
-                    self.add_block((x, y, z), block_type)
-                    line = file.readline()
-                self.rocket_loaded = True
+        if self.workers is not None:
+            self.workers.terminate()
+            self.workers = None
+
 
 class Window(pyglet.window.Window):
 
     def __init__(self, *args, **kwargs):
+        # The mesh worker pool for the Renderer, see main().
+        workers = kwargs.pop('workers', None)
         super(Window, self).__init__(*args, **kwargs)
 
         # Whether or not the window exclusively captures the mouse.
@@ -817,6 +572,14 @@ class Window(pyglet.window.Window):
         # Instance of the model that handles the world.
         self.model = Model()
 
+        # Draws the model and keeps the shown sectors up to date with it.
+        self.renderer = Renderer(self.model, workers)
+
+        # Grows or shrinks the number of sectors shown, the far plane and the
+        # fog to hold the frame rate.
+        self.view = view_distance.ViewDistance(SECTOR_SIZE, VIEW_DISTANCE,
+            MIN_VIEW_DISTANCE, MAX_VIEW_DISTANCE, 1.0 / TICKS_PER_SEC)
+
         # The label that is displayed in the top left of the canvas.
         self.label = pyglet.text.Label('', font_name='Arial', font_size=18,
             x=10, y=self.height - 10, anchor_x='left', anchor_y='top',
@@ -825,16 +588,28 @@ class Window(pyglet.window.Window):
         # This call schedules the `update()` method to be called
         # TICKS_PER_SEC. This is the main game event loop.
         pyglet.clock.schedule_interval(self.update, 1.0 / TICKS_PER_SEC)
+        if AUTOSAVE_INTERVAL:
+            pyglet.clock.schedule_interval(self.autosave, AUTOSAVE_INTERVAL)
 
         #health bar setup: initally full health
         self.health = []
         for i in xrange(0,10):
             self.health.append(pyglet.resource.image("heart_2.png"))
-        self.health_value = 10
+        # the health shown by the hearts above, see `update_health()`.
+        self.health_value = self.model.health
         self.fell_height = False
         self.max_vel = 0
 
-        self.count_injure = 91
+        # rocket health bar
+        self.rocket_health_red = pyglet.resource.image("rocket_health_red.png")
+        self.rocket_health_red = pyglet.sprite.Sprite(self.rocket_health_red, 60, 75)
+        self.rocket_health_red.scale_y = 0.5
+        self.rocket_health_outline = pyglet.resource.image("rocket_health_outline.png")
+        self.rocket_health_outline = pyglet.sprite.Sprite(self.rocket_health_outline, 60, 75)
+        self.rocket_health_outline.scale = 0.5
+
+        # health blocks on the map
+        self.health_map_icons = {}
 
         # map objects
         self.map = pyglet.resource.image("black_map.png")
@@ -864,40 +639,31 @@ class Window(pyglet.window.Window):
                            self.height - 85 - 137*(self.sat_pieces[i][2]/160))
             self.sat_pieces[i].scale = 0.025
 
-        self.count_sat = 0
         self.sat_label = pyglet.text.Label('', font_name='Arial', font_size=18,
             x=self.width - 15, y=10, anchor_x='right', anchor_y='bottom',
             color=(0, 0, 0, 255))
 
-        # creeper
-        self.creeper = [AI_class.Creeper(self.model.world),
-                        AI_class.Creeper(self.model.world),
-                        AI_class.Creeper(self.model.world),
-                        AI_class.Creeper(self.model.world),
-                        AI_class.Creeper(self.model.world)]
-        for i in range(0, 5):
-            	for j in range(i + 1, 5):
-            		pos_i = (self.creeper[i].pos_x,
-                   			 self.creeper[i].pos_y,
-                   			 self.creeper[i].pos_z)
-            		pos_j = (self.creeper[j].pos_x,
-                   			 self.creeper[j].pos_y,
-                   			 self.creeper[j].pos_z)
-            		dist = 0.0
-            		for k in range(0, 3):
-            			dist += (pos_j[k] - pos_i[k])**2
-            		dist = math.sqrt(dist)
-            		if dist < 5:
-            			self.creeper[j] = AI_class.Creeper(self.model.world)
-            			j -= 1
         self.creeper_temp = pyglet.resource.image("mob_dot.png")
         self.creeper_icon = []
         for i in xrange(0, 5):
             self.creeper_icon.append(pyglet.sprite.Sprite(self.creeper_temp,
-                            self.width - 85 + 137*(self.creeper[i].pos_x/160),
-                            self.height - 85 - 137*(self.creeper[i].pos_z/160)))
+                            self.width - 85 + 137*(self.model.creeper[i].pos_x/160),
+                            self.height - 85 - 137*(self.model.creeper[i].pos_z/160)))
             self.creeper_icon[i].scale = 0.025
-        self.creeper_count = 0
+
+    def on_close(self):
+        """ Called when the window is closed.
+
+        """
+        self.renderer.close()
+        self.model.close()
+        super(Window, self).on_close()
+
+    def autosave(self, dt):
+        """ Called by the pyglet clock every AUTOSAVE_INTERVAL seconds.
+
+        """
+        self.model.autosave()
 
     def set_exclusive_mouse(self, exclusive):
         """ If `exclusive` is True, the game will capture the mouse, if False
@@ -973,20 +739,28 @@ class Window(pyglet.window.Window):
             The change in time since the last call.
 
         """
-        self.model.process_queue()
+        self.renderer.set_focus(sectorize(self.position), self.get_sight_vector())
+        self.renderer.process_queue()
         sector = sectorize(self.position)
         if sector != self.sector:
-            self.model.change_sectors(self.sector, sector)
+            self.renderer.change_sectors(self.sector, sector)
+            self.model.page_out(sector, sectors_around(
+                sector, self.renderer.view_radius))
             if self.sector is None:
-                self.model.process_entire_queue()
+                self.renderer.process_entire_queue()
             self.sector = sector
+        # only judge the frame time once the queue has settled, sectors that
+        # are still being built make every frame slow.
+        if not self.renderer.queue_depth and not self.renderer.pending and \
+                not self.renderer.generating and self.view.update(dt):
+            self.renderer.change_view_radius(self.sector, self.view.radius)
         m = 8
         dt = min(dt, 0.2)
         for _ in xrange(m):
             self._update(dt / m)
 
-        #self.model.process_mob()
-        self.move_mob()
+        # the mob, the creepers and the sensors.
+        self.position = self.model.tick(self.position)
 
     def _update(self, dt):
         """ Private implementation of the `update()` method. This is where most
@@ -1005,7 +779,7 @@ class Window(pyglet.window.Window):
         # New position in space, before accounting for gravity.
         dx, dy, dz = dx * d, dy * d, dz * d
         # gravity
-        if not self.flying:
+        if not self.flying and self.model.is_made(self.position):
             # Update your vertical speed: if you are falling, speed up until you
             # hit terminal velocity; if you are jumping, slow down until you
             # start falling.
@@ -1034,34 +808,12 @@ class Window(pyglet.window.Window):
             The new position of the player taking into account collisions.
 
         """
-        # How much overlap with a dimension of a surrounding block you need to
-        # have to count as a collision. If 0, touching terrain at all counts as
-        # a collision. If .49, you sink into the ground, as if walking through
-        # tall grass. If >= .5, you'll fall through the ground.
-        pad = 0.25
-        p = list(position)
-        np = normalize(position)
-        for face in FACES:  # check all surrounding blocks
-            for i in xrange(3):  # check each dimension independently
-                if not face[i]:
-                    continue
-                # How much overlap you have with this dimension.
-                d = (p[i] - np[i]) * face[i]
-                if d < pad:
-                    continue
-                for dy in xrange(height):  # check each height
-                    op = list(np)
-                    op[1] -= dy
-                    op[i] += face[i]
-                    if tuple(op) not in self.model.world:
-                        continue
-                    p[i] -= (d - pad) * face[i]
-                    if face == (0, -1, 0) or face == (0, 1, 0):
-                        # You are colliding with the ground or ceiling, so stop
-                        # falling / rising.
-                        self.dy = 0
-                    break
-        return tuple(p)
+        position, vertical = self.model.collide(position, height)
+        if vertical:
+            # You are colliding with the ground or ceiling, so stop falling /
+            # rising.
+            self.dy = 0
+        return position
 
     def on_mouse_press(self, x, y, button, modifiers):
         """ Called when a mouse button is pressed. See pyglet docs for button
@@ -1087,33 +839,10 @@ class Window(pyglet.window.Window):
                     ((button == mouse.LEFT) and (modifiers & key.MOD_CTRL)):
                 # ON OSX, control + left click = right click.
                 if previous:
-                    if self.block != ELECH or not self.model.added_elech:
-                        if self.block == ELECH:
-                            self.model.added_elech = True
-                            for i in self.model.sensors:
-                                i.status = False
-                                self.model.add_block(i.location, SENSOR_RED)
-                        self.model.add_block(previous, self.block)
+                    self.model.place(previous, self.block)
             elif button == pyglet.window.mouse.LEFT and block:
-                texture = self.model.world[block]
-                if texture == HEART_1:
-                    self.health_value += 0.5
-                    h = self.health_value
-                    self.update_health(h)
-                    del self.model.health_map_icons[block]
-                elif texture == HEART_2:
-                    self.health_value += 1.0
-                    h = self.health_value
-                    self.update_health(h)
-                    del self.model.health_map_icons[block]
-                if texture not in [STONE, MOB_STATE1, MOB_STATE2,
-                SAT_PIECE, SENSOR_ACTIVE, SENSOR_RED] and texture not in COMPOSITE and texture not in CREEPER:
-                    self.model.remove_block(block)
-                if texture == ELECH:
-                    self.model.added_elech = False
-                    for i in self.model.sensors:
-                        i.activated = False
-                        self.model.add_block(i.location, SENSOR_RED)
+                if self.model.dig(block) in [HEART_1, HEART_2]:
+                    del self.health_map_icons[block]
         else:
             self.set_exclusive_mouse(True)
 
@@ -1169,54 +898,25 @@ class Window(pyglet.window.Window):
         elif symbol == key.F:
             if not self.model.mob_loaded:
                 self.set_exclusive_mouse(True)
-                self.model.mob_x_position = -5
-                self.model.mob_z_position = -5
-                self.model.mob_y_position = -1
-                pos = (self.model.mob_x_position,
-                       self.model.mob_y_position,
-                       self.model.mob_z_position)
-                while pos in self.model.world:
-                    self.model.mob_y_position += 1
-                    pos = (self.model.mob_x_position,
-                       self.model.mob_y_position,
-                       self.model.mob_z_position)
-                self.model.load_mob()
-                self.model.ai.mode = "follow"
-                self.model.ai.status = True
-                self.model.mob_loaded = True
-        elif symbol == key.T and self.count_sat == 6 and not self.model.trapped:
+                self.model.start_mob()
+        elif symbol == key.T and self.model.count_sat == 6 and not self.model.trapped:
             self.draw_trap()
         elif symbol == key.N and self.model.rocket_loaded:
             self.neut_creeper()
         elif symbol == key.L and self.model.trapped and not self.model.rocket_loaded:
             self.model.load_txt()
             for i in xrange(0, 3):
-                self.load_creeper()
+                self.model.load_creeper(self.position)
         elif symbol == key.C:
             self.model.circuit_change()
+        elif symbol == key.O:
+            self.model.autosave()
 
     def neut_creeper(self):
         vector = self.get_sight_vector()
         block = self.model.hit_test(self.position, vector)[0]
         if block:
-            x, y, z = block
-            pos = (-5, -5, -5)
-            if self.model.world[block] in [CR_HEAD, CREEPER_HEAD]:
-                # have head selected
-                pos = (x, y - 1, z)
-            elif self.model.world[block] in CREEPER:
-                # have body selected
-                pos = (x, y, z)
-            if pos != (-5, -5, -5):
-                for i in self.creeper:
-                    p = (i.pos_x, i.pos_y, i.pos_z)
-                    if pos == p:
-                        i.status = False
-                        self.model.add_block(pos, NC_BODY)
-                        pos = (pos[0], pos[1] + 1, pos[2])
-                        self.model.add_block(pos, NC_HEAD)
-                        self.load_creeper()
-
+            self.model.neutralize(block, self.position)
 
     def on_key_release(self, symbol, modifiers):
         """ Called when the player releases a key. See pyglet docs for key
@@ -1276,7 +976,7 @@ class Window(pyglet.window.Window):
         glViewport(0, 0, width, height)
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
-        gluPerspective(65.0, width / float(height), 0.1, 60.0)
+        gluPerspective(65.0, width / float(height), 0.1, self.view.far)
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
         x, y = self.rotation
@@ -1284,6 +984,18 @@ class Window(pyglet.window.Window):
         glRotatef(-y, math.cos(math.radians(x)), 0, math.sin(math.radians(x)))
         x, y, z = self.position
         glTranslatef(-x, -y, -z)
+        # the fog ends at the far plane, so it grows with the view distance.
+        glFogf(GL_FOG_START, self.view.fog_start)
+        glFogf(GL_FOG_END, self.view.far)
+
+    def get_frustum(self):
+        """ Return the planes of the view frustum set up by `set_3d()`.
+
+        """
+        width, height = self.get_size()
+        return frustum.planes(self.rotation, self.position,
+                              width / float(height), 65.0, 0.1,
+                              self.view.far)
 
     def draw_map(self):
         temp = (self.width - 150, self.height - 150)
@@ -1299,36 +1011,24 @@ class Window(pyglet.window.Window):
             self.mob_dot.y = int(self.height - 85 - 137*(self.model.mob_z_position/
                                                          160))
             self.mob_dot.draw()
-            self.collect_sat()
 
+        # pieces collected by the model are gone from the end of the list.
+        del self.sat_pieces[len(self.model.sat_pieces):]
         for i in xrange(0, len(self.sat_pieces)):
             self.sat_pieces[i].position = (self.width - 85 + 137*(self.model.sat_pieces[i][0]/160),
                            self.height - 85 - 137*(self.model.sat_pieces[i][2]/160))
             self.sat_pieces[i].draw()
 
         if self.model.trapped:
-            for i in self.model.health_map_icons:
-                self.model.health_map_icons[i].draw()
+            for i in self.health_map_icons:
+                self.health_map_icons[i].draw()
 
         for i in xrange(0, 5):
-            if self.creeper[i].status:
-                self.creeper_icon[i].x = self.width - 85 + 137*(self.creeper[i].pos_x/160)
-                self.creeper_icon[i].y = self.height - 85 - 137*(self.creeper[i].pos_z/160)
+            if self.model.creeper[i].status:
+                self.creeper_icon[i].x = self.width - 85 + 137*(self.model.creeper[i].pos_x/160)
+                self.creeper_icon[i].y = self.height - 85 - 137*(self.model.creeper[i].pos_z/160)
                 self.creeper_icon[i].draw()
 
-    def collect_sat(self):
-        # make satellite piece dispear from map and from world
-        index = 0
-        for i in self.model.sat_pieces:
-            dist = (self.position[0] - i[0])**2 + (self.position[1] - i[1])**2 + (self.position[2] - i[2])**2
-            if dist < 1.56:
-                self.model.remove_block(i)
-                del self.model.sat_pieces[index]
-                del self.sat_pieces[index]
-                self.count_sat += 1
-                self.model.mob_frames -= 3
-            index += 1
-
     def check_height(self):
         if abs(self.dy) > 12:
             self.fell_height = True
@@ -1341,16 +1041,14 @@ class Window(pyglet.window.Window):
         for i in xrange(0, full):
             self.health.append(pyglet.resource.image("heart_2.png"))
 
-        #border case: could be empty, half, or full
-        if float(h - full) < 0.35:
+        #border case: could be empty, half, or full, see Model.set_health()
+        if h == full:
             self.health.append(pyglet.resource.image("heart_0.png"))
-            self.health_value = float(full)
-        elif float(h - full) < 0.65:
+        elif h == full + 0.5:
             self.health.append(pyglet.resource.image("heart_1.png"))
-            self.health_value = float(full) + 0.5
         else:
             self.health.append(pyglet.resource.image("heart_2.png"))
-            self.health_value = float(full) + 1.0
+        self.health_value = h
 
         #remaining hearts are empty
         for i in xrange(full + 1, 10):
@@ -1363,13 +1061,12 @@ class Window(pyglet.window.Window):
         if self.fell_height == True and self.dy == 0:
             # get new health value and reset variables
             self.fell_height = False
-            self.health_value = max(0, self.health_value - (self.max_vel/9.0))
+            self.model.set_health(max(0, self.model.health - (self.max_vel/9.0)))
             self.max_vel = 0
-            # update displayed health
-            self.update_health(self.health_value)
 
-        #check for injury due to mob
-        self.check_mob_dist()
+        # update displayed health, the mob and the creepers hurt in the model
+        if self.health_value != self.model.health:
+            self.update_health(self.model.health)
 
         # draw the health bar
         for i in xrange(0,10):
@@ -1378,204 +1075,26 @@ class Window(pyglet.window.Window):
             heart.draw()
 
         if self.model.trapped:
-            for icon in self.model.health_map_icons:
+            for icon in self.health_map_icons:
                 temp_x, temp_y = icon[0], icon[2]
                 temp_x = int(self.width - 85 + 137*(temp_x/160))
                 temp_y = int(self.height - 85 - 137*(temp_y/160))
-                self.model.health_map_icons[icon].position = (temp_x, temp_y)
+                self.health_map_icons[icon].position = (temp_x, temp_y)
 
         # rocket has health once it's loaded
         if self.model.rocket_loaded:
-            self.model.rocket_health_red.scale_x = 0.5 * self.model.rocket_health
-            self.model.rocket_health_red.draw()
-            self.model.rocket_health_outline.draw()
+            self.rocket_health_red.scale_x = 0.5 * self.model.rocket_health
+            self.rocket_health_red.draw()
+            self.rocket_health_outline.draw()
 
     def check_game_over(self):
-        if self.health_value == 0 or self.model.rocket_health == 0:
+        if self.model.health == 0 or self.model.rocket_health == 0:
             message = pyglet.text.Label('GAME OVER', font_name='Arial', font_size=75,
             x=self.width/2, y=self.height/2, anchor_x='center', anchor_y='center',
             color=(255, 0, 0, 255))
             message.draw()
             self.set_exclusive_mouse(False)
 
-    def check_mob_dist(self):
-        if self.model.mob_loaded and not self.model.trapped:
-            dist = [abs(self.position[0] - self.model.mob_x_position),
-                abs(self.position[2] - self.model.mob_z_position),
-                abs(self.position[1] - self.model.mob_y_position)]
-            if not any(d > 1.25 for d in dist):
-                s = dist[0]**2 + dist[1]**2 + dist[2]**2
-                if s < 2.25 and self.count_injure > 90:
-                    self.health_value = max(0, self.health_value - 2)
-                    self.update_health(self.health_value)
-                    self.count_injure = 0
-                elif s > 2.25:
-                    self.count_injure = 91
-                else:
-                    self.count_injure += 1
-
-    # returns whether or not a position is available
-    # returns true if available, false if not
-    def check_avail(self, pos):
-        if pos in self.model.world and self.model.world[pos] in ALL_TEXTURE:
-            return False
-        return True
-
-    def move_mob(self):
-        moved_up = False
-        if self.model.ai.status and self.model.ai.count >= self.model.mob_frames:
-            # forward backward left right
-            if self.model.ai.mode == "follow":
-                out = self.model.ai.follow(self.model.mob_x_position,
-                                           self.model.mob_z_position,
-                                           self.position[0],
-                                           self.position[2])
-            elif self.model.ai.mode == "run":
-                out = self.model.ai.run_away(self.model.mob_x_position,
-                                           self.model.mob_z_position,
-                                           self.position[0],
-                                           self.position[2])
-            if out[0]:
-                pos = (self.model.mob_x_position,
-                       self.model.mob_y_position,
-                       self.model.mob_z_position+1)
-                # check if square in front not available
-                if not self.check_avail(pos):
-                    # check if one square up avaiable
-                    pos = (pos[0], pos[1]+1, pos[2])
-                    # if yes
-                        # go there
-                    if self.check_avail(pos):
-                        self.model.mob_move_up()
-                        self.model.mob_move_forward()
-                        moved_up = True
-                    # else
-                        # don't move
-                else:
-                    self.model.mob_move_forward()
-            elif out[1]:
-                pos = (self.model.mob_x_position,
-                       self.model.mob_y_position,
-                       self.model.mob_z_position-1)
-                if not self.check_avail(pos):
-                    pos = (pos[0], pos[1]+1, pos[2])
-                    if self.check_avail(pos):
-                        self.model.mob_move_up()
-                        self.model.mob_move_backward()
-                        moved_up = True
-                else:
-                    self.model.mob_move_backward()
-            if out[2]:
-                pos = (self.model.mob_x_position-1,
-                       self.model.mob_y_position,
-                       self.model.mob_z_position)
-                if not self.check_avail(pos):
-                    pos = (pos[0], pos[1]+1, pos[2])
-                    if self.check_avail(pos):
-                        self.model.mob_move_up()
-                        self.model.mob_move_left()
-                        moved_up = True
-                else:
-                    self.model.mob_move_left()
-            elif out[3]:
-                pos = (self.model.mob_x_position+1,
-                       self.model.mob_y_position,
-                       self.model.mob_z_position)
-                if not self.check_avail(pos):
-                    pos = (pos[0], pos[1]+1, pos[2])
-                    if self.check_avail(pos):
-                        self.model.mob_move_up()
-                        self.model.mob_move_right()
-                        moved_up = True
-                else:
-                    self.model.mob_move_right()
-
-            # make sure mob isn't floating
-            pos = (self.model.mob_x_position,
-                       self.model.mob_y_position-1,
-                       self.model.mob_z_position)
-
-            while (self.check_avail(pos) and pos[1] >= -2 and not moved_up):
-                self.model.mob_move_down()
-                pos = (self.model.mob_x_position,
-                       self.model.mob_y_position-1,
-                       self.model.mob_z_position)
-
-            self.model.ai.count = 0
-        else:
-            self.model.ai.count += 1
-
-    def draw_creeper(self, creeper):
-        at_target = False
-        dist = (creeper.pos_x - creeper.target[0])**2 + \
-        (creeper.pos_z - creeper.target[2])**2
-        if dist <= 3.125:
-            at_target = True
-        if creeper.count >= creeper.frames and creeper.status \
-        and not at_target:
-            # if at target position then need to continue or start countdown
-            # remove from previous position
-            pos_body = (copy.copy(creeper.pos_x),
-                        copy.copy(creeper.pos_y),
-                        copy.copy(creeper.pos_z))
-            pos_head = (pos_body[0], pos_body[1] + 1, pos_body[2])
-
-            # add to new position
-            creeper.follow(self.model.world)
-            pos = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
-            # if the creeper moved
-            if pos != pos_body:
-                # remove blocks from previous position
-                self.model.remove_block(pos_body)
-                self.model.remove_block(pos_head)
-                # add blocks to new position
-                self.model.add_block(pos, CREEPER_BODY)
-                pos = (pos[0], pos[1] + 1, pos[2])
-                self.model.add_block(pos, CREEPER_HEAD)
-            creeper.count = 0
-        else:
-            creeper.count += 1
-
-        #check for explosion
-        if at_target:
-            type = creeper.explode()
-            pos = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
-            pos_head = (pos[0], pos[1] + 1, pos[2])
-            if type == "boom":
-                print(type)
-                self.model.rocket_health = round(self.model.rocket_health - 0.2, 1)
-                self.model.rocket_health = max(0, self.model.rocket_health)
-                pos = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
-                self.model.remove_block(pos)
-                self.model.remove_block((pos[0], pos[1] + 1, pos[2]))
-                creeper.status = False
-                if self.creeper_count < 5:
-                    self.creeper[self.creeper_count].status = True
-                    pos = (self.creeper[self.creeper_count].pos_x,
-                           self.creeper[self.creeper_count].pos_y,
-                           self.creeper[self.creeper_count].pos_z)
-                    self.creeper_count += 1
-                    self.model.add_block(pos, CREEPER_BODY)
-                    pos = (pos[0], pos[1] + 1, pos[2])
-                    self.model.add_block(pos, CREEPER_HEAD)
-                dist = (self.position[0] - creeper.pos_x)**2 + (self.position[1]
-                        - creeper.pos_y)**2 + (self.position[2] - creeper.pos_z)**2
-                if dist < 25:
-                    self.health_value -= 3
-                    self.health_value = max(0, self.health_value)
-                    self.update_health(self.health_value)
-            elif type == "5":
-                self.model.add_block(pos, CR_5)
-                self.model.add_block(pos_head, CR_HEAD)
-            elif type == "4":
-                self.model.add_block(pos, CR_4)
-            elif type == "3":
-                self.model.add_block(pos, CR_3)
-            elif type == "2":
-                self.model.add_block(pos, CR_2)
-            elif type == "1":
-                self.model.add_block(pos, CR_1)
-
     def on_draw(self):
         """ Called by pyglet to draw the canvas.
 
@@ -1584,7 +1103,7 @@ class Window(pyglet.window.Window):
         self.clear()
         self.set_3d()
         glColor3d(1, 1, 1)
-        self.model.batch.draw()
+        self.renderer.draw(self.get_frustum())
         self.draw_focused_block()
         self.set_2d()
         self.draw_label()
@@ -1600,9 +1119,6 @@ class Window(pyglet.window.Window):
             color=(255, 255, 255, 255))
             label.text = "PRESS F TO LAUNCH MOB AND BEGIN"
             label.draw()
-        for i in self.creeper:
-            if i.status:
-                self.draw_creeper(i)
 
     def draw_focused_block(self):
         """ Draw black edges around the block that is currently under the
@@ -1624,133 +1140,67 @@ class Window(pyglet.window.Window):
 
         """
         # determines the current block selected
-        if (self.block == BRICK):
-            blockSelectedString = "Brick"
-        elif (self.block == GRASS):
-            blockSelectedString = "Grass"
-        elif (self.block == SAND):
-            blockSelectedString = "Sand"
-        elif (self.block == ELECH):
-            blockSelectedString = "ELECH"
-        elif (self.block == ELECT):
-            blockSelectedString = "ELECT"
-        elif (self.block == CABLE):
-            blockSelectedString = "Cable"
+        blockSelectedString = blocks.name(self.block)
 
         x, y, z = self.position
-        self.label.text = '%02d (%.2f, %.2f, %.2f) %d / %d Block: %s' % (
+        self.label.text = '%02d (%.2f, %.2f, %.2f) %d / %d (%d culled) Block: %s' % (
             pyglet.clock.get_fps(), x, y, z,
-            len(self.model._shown), len(self.model.world),
+            len(self.renderer._shown), len(self.model.world), self.renderer.culled,
             blockSelectedString)
         self.label.draw()
 
         # text for satellite
-        #self.count_sat = 6 #TODO TESTING
-        if self.count_sat < 6:
+        if self.model.count_sat < 6:
             self.sat_label.text = 'Satellite Pieces Collected: %01d' % (
-                self.count_sat)
-        elif self.count_sat >= 6 and not self.model.trapped:
+                self.model.count_sat)
+        elif self.model.count_sat >= 6 and not self.model.trapped:
             self.sat_label.text = "Trap the Mob! 'T' builds trap."
         elif self.model.trapped and not self.model.rocket_loaded:
             self.sat_label.text = "Mob Trapped! Load Rocket (L)"
-        elif self.model.rocket_loaded and self.creeper_count != 5:
+        elif self.model.rocket_loaded and self.model.creeper_count != 5:
             self.sat_label.text = "Neutralize Creepers (N)"
-            #self.creeper_count = 5 # TODO TESTING
-        elif self.creeper_count == 5:
-            safe = True
-            for i in self.creeper:
-                if i.status:
-                    safe = False
-                    #safe = True # TODO TESTING
-            if safe:
-                self.sat_label.text = "Activate Sensors to Launch"
-                if len(self.model.sensors) < 4:
-                    self.model.sensors.append(sensors.Sensor((10, -1, -6)))
-                    self.model.add_block((10, -1, -6), SENSOR_RED)
-                    self.model.sensors.append(sensors.Sensor((18, -1, 2)))
-                    self.model.add_block((18, -1, 2), SENSOR_RED)
-                    self.model.sensors.append(sensors.Sensor((10, -1, 10)))
-                    self.model.add_block((10, -1, 10), SENSOR_RED)
-                    self.model.sensors.append(sensors.Sensor((2, -1, 2)))
-                    self.model.add_block((2, -1, 2), SENSOR_RED)
-                count_active = 0
-                for i in self.model.sensors:
-                    i.check_status(self.model.circuit, ELECH)
-                    if i.activated:
-                        count_active += 1
-                        if self.model.world[i.location] != SENSOR_ACTIVE:
-                            self.model.add_block(i.location, SENSOR_ACTIVE)
-                    if count_active == 4:
-                        self.launch_rocket()
-                if self.model.rocket_launched:
-                    self.sat_label.text = "Launching Rocket"
-                    message = pyglet.text.Label('SUCCESS', font_name='Arial', font_size=75,
-                    x=self.width/2, y=self.height/2, anchor_x='center', anchor_y='center',
-                    color=(0, 255, 0, 255))
-                    message.draw()
-                    self.set_exclusive_mouse(False)
+        elif self.model.creepers_safe():
+            # the model puts the sensors out and launches the rocket.
+            self.sat_label.text = "Activate Sensors to Launch"
+            if self.model.rocket_launched:
+                self.sat_label.text = "Launching Rocket"
+                message = pyglet.text.Label('SUCCESS', font_name='Arial', font_size=75,
+                x=self.width/2, y=self.height/2, anchor_x='center', anchor_y='center',
+                color=(0, 255, 0, 255))
+                message.draw()
+                self.set_exclusive_mouse(False)
         self.sat_label.draw()
 
-    def launch_rocket(self):
-        if not self.model.rocket_launched:
-            self.model.rocket_launched = True
-            # place steve at top of rocket
-        if self.model.rocket_count > 8:
-            self.model.rocket_count = 0
-            self.move_rocket_up()
-            self.position = (10, self.model.rocket_altitude + 19, 2)
-        self.model.rocket_count += 1
-
-    def move_rocket_up(self):
-        """
-            0) find all the composite blocks and add to composite_world
-            dictionary.  At the same time erase all the composite blocks from the world
-            1) loop through composite_world dictionary and add blocks with y + 1
-            to add each block to the world.
-        """
-        #self.position = (position(0), position(1)+1, position(2))
-        composite_world = {}
-        for world_key, world_value in list(self.model.world.items()):
-            if world_value in COMPOSITE:
-                composite_world[world_key] = world_value
-                self.model.remove_block(world_key, True)
-
-        for composite_key, composite_value in composite_world.items():
-             if composite_value in COMPOSITE:
-                new_x = composite_key[0]
-                new_y = composite_key[1] + 1
-                new_z = composite_key[2]
-                self.model.add_block((new_x, new_y, new_z), composite_value)
-        self.model.rocket_altitude += 1
-
     def draw_trap(self):
         vector = self.get_sight_vector()
         block = self.model.hit_test(self.position, vector)[0]
         if block:
             x, y, z = block # coordinates of currently selected block
-            for i in range(-3, 4): # x coordinate loop
-                for j in range(-3, 4): # z coordinate loop
-                    if (i == -3 or i == 3 or j == -3 or j == 3): # if i or j is +/- 3
-                        for k in range(-1, y + 3): # y loop
-                            if (x + i, k, z + j) not in self.model.world:
-                            # add block if nothing there
-                                "TODO"
-                                # coordinates in call to add_block
-                                # X = x + i
-                                # Y = k
-                                # Z = z + j
-                                # block type: SAND
-                    # add roof
-                    "TODO"
-                    # coordinates in call to add_block
-                    # X = x + i
-                    # Y = y + 3
-                    # Z = z + j
-                    # block type: SAND
+            # blocks added inside bulk_edit() are drawn together at the end
+            with self.model.bulk_edit():
+                for i in range(-3, 4): # x coordinate loop
+                    for j in range(-3, 4): # z coordinate loop
+                        if (i == -3 or i == 3 or j == -3 or j == 3): # if i or j is +/- 3
+                            for k in range(-1, y + 3): # y loop
+                                if (x + i, k, z + j) not in self.model.world:
+                                # add block if nothing there
+                                    "TODO"
+                                    # coordinates in call to add_block
+                                    # X = x + i
+                                    # Y = k
+                                    # Z = z + j
+                                    # block type: SAND
+                        # add roof
+                        "TODO"
+                        # coordinates in call to add_block
+                        # X = x + i
+                        # Y = y + 3
+                        # Z = z + j
+                        # block type: SAND
         # make this true to acknowledge you edited the code
         drew_trap = False
 
-        "recall call form: self.model.add_block((X, Y, Z), texture)"
+        "recall call form: self.model.add_block((X, Y, Z), block)"
 
         # --------------------------- #
         # DO NOT EDIT BELOW THIS LINE #
@@ -1774,40 +1224,18 @@ class Window(pyglet.window.Window):
                                      self.model.mob_z_position))
             self.place_health()
 
-    def load_creeper(self):
-        if self.creeper_count < 5:
-            self.creeper[self.creeper_count].status = True
-            pos = (self.creeper[self.creeper_count].pos_x,
-                   self.creeper[self.creeper_count].pos_y,
-                   self.creeper[self.creeper_count].pos_z)
-            self.model.add_block(pos, CREEPER_BODY)
-            pos = (pos[0], pos[1] + 1, pos[2])
-            self.model.add_block(pos, CREEPER_HEAD)
-            self.creeper_count += 1
-            self.draw_creeper(self.creeper[self.creeper_count - 1])
-
     def place_health(self):
-        for i in xrange(3):
-            x = random.randint(-60, 60)
-            z = random.randint(-60, 60)
-            y = -1
-            while (x, y, z) in self.model.world:
-                y += 1
-            temp = str(random.randint(1, 2))
-            if temp == "1":
-                block_type = HEART_1
-            else:
-                block_type = HEART_2
-            self.model.add_block((x, y, z), block_type)
-            self.model.health_map_icons[(x, y, z)] = pyglet.resource.image(
+        for (x, y, z), block_type in self.model.place_health():
+            temp = "1" if block_type == HEART_1 else "2"
+            self.health_map_icons[(x, y, z)] = pyglet.resource.image(
                 "heart_" + temp + ".png")
-            self.model.health_map_icons[(x, y, z)] = pyglet.sprite.Sprite(
-                self.model.health_map_icons[(x, y, z)], self.width - 85,
+            self.health_map_icons[(x, y, z)] = pyglet.sprite.Sprite(
+                self.health_map_icons[(x, y, z)], self.width - 85,
                 self.height - 85)
-            self.model.health_map_icons[(x, y, z)].scale = 0.02
-            self.model.health_map_icons[(x, y, z)].x = int(self.width - 
+            self.health_map_icons[(x, y, z)].scale = 0.02
+            self.health_map_icons[(x, y, z)].x = int(self.width - 
                                                        85 + 137*(x/160))
-            self.model.health_map_icons[(x, y, z)].y = int(self.height - 
+            self.health_map_icons[(x, y, z)].y = int(self.height - 
                                                        85 - 137*(z/160))
 
     def draw_reticle(self):
@@ -1832,7 +1260,8 @@ def setup_fog():
     # Specify the equation used to compute the blending factor.
     glFogi(GL_FOG_MODE, GL_LINEAR)
     # How close and far away fog starts and ends. The closer the start and end,
-    # the denser the fog in the fog range.
+    # the denser the fog in the fog range. Window.set_3d() moves both with the
+    # view distance.
     glFogf(GL_FOG_START, 20.0)
     glFogf(GL_FOG_END, 60.0)
 
@@ -1857,7 +1286,13 @@ def setup():
 
 
 def main():
-    window = Window(width=800, height=600, caption='Sensor Craft', resizable=True)
+    # worker processes must not inherit the GL context, so they are started
+    # before the window.
+    workers = None
+    if MESH_WORKERS:
+        workers = mesher.start_workers(MESH_WORKERS, blocks.TEXTURES)
+    window = Window(width=800, height=600, caption='Sensor Craft', resizable=True,
+                    workers=workers)
     try:
         # Hide the mouse cursor and prevent the mouse from leaving the window.
         window.set_exclusive_mouse(True)
@@ -3,6 +3,10 @@ from __future__ import division
 import random
 import time
 
+# lowest height a mob can stand at, just above the stone under the floor;
+# sectors the world has not made yet are empty and would let it fall forever
+LOWEST = -2
+
 class AI:
     def __init__(self):
 
@@ -114,7 +118,8 @@ class Creeper(AI):
                 self.pos_x = pos[0]
                 self.pos_y = pos[1]
                 move = True
-        while (self.pos_x, self.pos_y - 1, self.pos_z) not in world:
+        while self.pos_y > LOWEST and \
+                (self.pos_x, self.pos_y - 1, self.pos_z) not in world:
             self.pos_y -= 1
             move = True
 
@@ -126,7 +131,8 @@ class Creeper(AI):
                 self.pos_x = pos[0]
                 self.pos_y = pos[1]
                 self.pos_z = pos[2]
-                while (self.pos_x, self.pos_y - 1, self.pos_z) not in world:
+                while self.pos_y > LOWEST and \
+                        (self.pos_x, self.pos_y - 1, self.pos_z) not in world:
                     self.pos_y -= 1
 
     # if can move that direction, returns new position
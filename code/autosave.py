@@ -0,0 +1,115 @@
+"""
+
+background saving
+
+`Autosave` writes snapshots of changed sectors to a region store (see
+`worldfile.write_region()`) on a thread of its own, so the game loop only pays
+for taking the snapshot.
+
+"""
+
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import worldfile
+
+
+class Autosave(object):
+    """ Saves snapshots handed to `submit()` to the region store `directory`
+    in the background, one at a time and in order.
+
+    Parameters
+    ----------
+    directory : str
+        The region store to save to. Created when missing.
+    sector_size : int
+        The size of a sector in blocks.
+    names : list of str
+        The name of each block id.
+    compress : bool
+        Whether to zlib compress the saved chunks.
+
+    """
+
+    def __init__(self, directory, sector_size, names, compress=True):
+        self.directory = directory
+        self.sector_size = sector_size
+        self.names = names
+        self.compress = compress
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Number of snapshots saved, bytes written by the last one, and the
+        # exception that stopped the last save, if any.
+        self.saves = 0
+        self.last_size = 0
+        self.error = None
+
+        # Sectors of the snapshots that failed to save, see `failed()`.
+        self._failed = set()
+        self._lock = threading.Lock()
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, snapshot):
+        """ Save `snapshot`, a list of (sector, y0, blocks) chunks where
+        `blocks` is None for sectors without blocks. The arrays must not
+        change until the save is done.
+
+        """
+        if snapshot:
+            self.queue.put(snapshot)
+
+    def pending(self):
+        """ Return the number of snapshots still waiting to be saved.
+
+        """
+        return self.queue.unfinished_tasks
+
+    def failed(self):
+        """ Return the sectors of the snapshots that failed to save since
+        the last call, which have to be saved again. A failed snapshot
+        leaves the store as it was, see `worldfile.write_region()`.
+
+        """
+        with self._lock:
+            failed, self._failed = self._failed, set()
+        return failed
+
+    def _run(self):
+        while True:
+            snapshot = self.queue.get()
+            try:
+                if snapshot is None:
+                    return
+                self.last_size = worldfile.write_region(
+                    self.directory, self.sector_size, snapshot, self.names,
+                    self.compress)
+                self.saves += 1
+            except Exception as e:
+                self.error = e
+                with self._lock:
+                    self._failed.update(sector for sector, _, _ in snapshot)
+            finally:
+                self.queue.task_done()
+
+    def wait(self):
+        """ Wait until every submitted snapshot is saved.
+
+        """
+        self.queue.join()
+
+    def close(self):
+        """ Save what is left and stop the thread.
+
+        """
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,494 @@
+"""
+
+benchmarks of the core world operations
+
+Times the `model.Model` operations the game spends its ticks in, without a
+window: adding and removing blocks, face masks, sector crossings, line of
+sight, collisions, circuits, loading structures and building the world.
+
+Run this file to print a table of the results. With --json the results are
+also written as JSON, together with a description of the machine they were
+taken on. With --baseline they are compared with the results of an earlier
+run, and the exit status is 1 when any benchmark got slower by more than
+--threshold. Benchmarks are compared by their median repeat.
+
+    python benchmark.py --json results.json
+    python benchmark.py --save-baseline
+    python benchmark.py --baseline benchmark_baseline.json
+
+"""
+
+from __future__ import division
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import blocks
+import chunks
+import mesher
+import model
+
+# The directory of this file, which also holds the structures loaded.
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Where --save-baseline writes and --baseline reads by default.
+BASELINE_PATH = os.path.join(HERE, 'benchmark_baseline.json')
+
+# Change in the median time per operation below which a benchmark does not
+# count as slower or faster.
+THRESHOLD = 0.1
+
+# Seed of every world built, so each run times the same world.
+SEED = 1
+
+# The PLAYER_HEIGHT of the game.
+PLAYER_HEIGHT = 2
+
+# Bumped when benchmarks change in a way that makes older results
+# incomparable.
+VERSION = 4
+
+# Mapping from benchmark name to a function taking its parameters and
+# returning the (run, ops) of one repeat, see `benchmark()`.
+BENCHMARKS = {}
+
+# The parameters each benchmark is run with, in order.
+CASES = []
+
+
+def benchmark(name, *cases):
+    """ Register the decorated function as benchmark `name`, run once for
+    each dict of parameters in `cases`.
+
+    The function does the setup of one repeat and returns `run`, a function
+    doing the timed work, and `ops`, how many operations `run` does.
+
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        for params in cases or ({},):
+            CASES.append((name, params))
+        return func
+    return register
+
+
+class Listener(object):
+    """ Stands in for the renderer: keeps the set of sectors it would
+    rebuild, out of the `shown` ones.
+
+    """
+
+    def __init__(self, shown=()):
+        self.shown = set(shown)
+        self.dirty = set()
+
+    def blocks_changed(self, sectors):
+        if sectors is None:
+            self.dirty.update(self.shown)
+            return
+        for sector in sectors:
+            if sector in self.shown:
+                self.dirty.add(sector)
+
+    def structure_added(self, structure):
+        pass
+
+    def structure_removed(self, structure):
+        pass
+
+
+def _model(size=80):
+    """ Return a new model watched by a `Listener` showing the sectors
+    around the origin.
+
+    """
+    m = model.Model(seed=SEED, size=size)
+    m.subscribe(Listener(model.sectors_around((0, 0, 0), 4)))
+    return m
+
+
+def _cube(side, y=6):
+    """ Return the positions of a cube of `side` blocks over the origin,
+    higher than any hill.
+
+    """
+    return [(x, y + dy, z) for x in range(-side // 2, side - side // 2)
+            for dy in range(side) for z in range(-side // 2, side - side // 2)]
+
+
+def _rays(n, seed=0):
+    """ Return `n` seeded (position, vector) pairs, from about head height
+    above the floor in any direction.
+
+    """
+    rng = random.Random(seed)
+    result = []
+    for _ in range(n):
+        position = (rng.uniform(-60, 60), rng.uniform(0, 3),
+                    rng.uniform(-60, 60))
+        vector = [rng.gauss(0, 1) for _ in range(3)]
+        m = sum(v * v for v in vector) ** 0.5
+        result.append((position, tuple(v / m for v in vector)))
+    return result
+
+
+@benchmark('add_block', {'mode': 'immediate'}, {'mode': 'deferred'},
+           {'mode': 'bulk_edit'})
+def add_block(mode):
+    m = _model()
+    positions = _cube(10)
+
+    def run():
+        if mode == 'bulk_edit':
+            with m.bulk_edit():
+                for position in positions:
+                    m.add_block(position, model.BRICK)
+        else:
+            immediate = mode == 'immediate'
+            for position in positions:
+                m.add_block(position, model.BRICK, immediate)
+    return run, len(positions)
+
+
+@benchmark('remove_block', {'mode': 'immediate'}, {'mode': 'deferred'},
+           {'mode': 'bulk_edit'})
+def remove_block(mode):
+    m = _model()
+    positions = _cube(10)
+    with m.bulk_edit():
+        for position in positions:
+            m.add_block(position, model.BRICK)
+
+    def run():
+        if mode == 'bulk_edit':
+            with m.bulk_edit():
+                for position in positions:
+                    m.remove_block(position)
+        else:
+            immediate = mode == 'immediate'
+            for position in positions:
+                m.remove_block(position, immediate)
+    return run, len(positions)
+
+
+@benchmark('exposed')
+def exposed():
+    m = _model()
+    positions = []
+    for sector in sorted(model.sectors_around((0, 0, 0), 2)):
+        positions.extend(m.sectors.get(sector, ()))
+
+    def run():
+        for position in positions:
+            m.exposed(position)
+    return run, len(positions)
+
+
+@benchmark('check_neighbors')
+def check_neighbors():
+    m = _model()
+    positions = _cube(10)
+
+    def run():
+        for position in positions:
+            m.check_neighbors(position)
+    return run, len(positions)
+
+
+@benchmark('change_sectors', {'radius': 2}, {'radius': 4})
+def change_sectors(radius, crossings=8):
+    """ Walk `crossings` sectors along x through the middle of a world big
+    enough that every sector in view has blocks, doing the work the renderer
+    does for each crossing without the upload: build the meshes of the
+    sectors coming into view, let go of the ones leaving it and page out.
+
+    """
+    m = _model(size=160)
+    start = -crossings // 2
+
+    def run():
+        shown = model.sectors_around((start, 0, 0), radius)
+        for x in range(start + 1, start + crossings + 1):
+            after = model.sectors_around((x, 0, 0), radius)
+            for sector in sorted(after - shown):
+                if m.needs(sector):
+                    m.make(sector)
+                mesher.build(*m.snapshot(sector), textures=blocks.TEXTURES)
+            for sector in sorted(shown - after):
+                m.release(sector)
+            m.page_out((x, 0, 0), after)
+            shown = after
+    return run, crossings
+
+
+@benchmark('hit_test')
+def hit_test():
+    m = _model()
+    rays = _rays(2000)
+
+    def run():
+        for position, vector in rays:
+            m.hit_test(position, vector)
+    return run, len(rays)
+
+
+@benchmark('collide')
+def collide():
+    m = _model()
+    rng = random.Random(1)
+    positions = [(rng.uniform(-60, 60), rng.uniform(-1, 2),
+                  rng.uniform(-60, 60)) for _ in range(5000)]
+
+    def run():
+        for position in positions:
+            m.collide(position, PLAYER_HEIGHT)
+    return run, len(positions)
+
+
+@benchmark('circuit_change', {'cables': 50}, {'cables': 200}, {'cables': 800})
+def circuit_change(cables, steps=20):
+    """ Pulse electrons along lines of 50 cables, each line starting with an
+    electron head and tail, for `steps` generations.
+
+    """
+    m = _model()
+    with m.bulk_edit():
+        for line in range(cables // 50):
+            z = line * 2 - 40
+            m.add_block((-26, 10, z), model.ELECT)
+            m.add_block((-25, 10, z), model.ELECH)
+            for x in range(-24, 26):
+                m.add_block((x, 10, z), model.CABLE)
+
+    def run():
+        for _ in range(steps):
+            m.circuit_change()
+    return run, steps
+
+
+@benchmark('load_txt', {'path': 'rocket.txt'}, {'path': 'nmusaf.txt'})
+def load_txt(path):
+    """ `Model.load_txt()` for rocket.txt and `Model.add_txt()`, the same
+    path without clearing the launch pad, for other files. A file with an
+    index that is not a composite block fails the benchmark.
+
+    """
+    m = _model()
+    path = os.path.join(HERE, path)
+    if os.path.basename(path) == 'rocket.txt':
+        return lambda: m.load_txt(path), 1
+
+    def run():
+        m.add_txt(path)
+    return run, 1
+
+
+@benchmark('initialize', {'size': 20}, {'size': 40}, {'size': 80},
+           {'size': 160})
+def initialize(size):
+    """ Build a new world `size` blocks from the origin to each edge.
+
+    """
+    def run():
+        model.Model(seed=SEED, size=size).close()
+    return run, 1
+
+
+def run_case(name, params, repeat):
+    """ Run benchmark `name` with `params` `repeat` times and return the
+    result as a dict. Each repeat gets a fresh setup, and a first untimed
+    one warms up caches.
+
+    """
+    times = []
+    for _ in range(repeat + 1):
+        run, ops = BENCHMARKS[name](**params)
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    times = sorted(times[1:])
+    return {
+        'name': name,
+        'params': params,
+        'ops': ops,
+        'repeat': repeat,
+        'min': times[0],
+        'median': times[len(times) // 2],
+        'max': times[-1],
+        'per_op': times[len(times) // 2] / ops,
+    }
+
+
+def key(result):
+    """ Return the name of `result` with its parameters, unique within a
+    run.
+
+    """
+    params = ' '.join('%s=%s' % item for item in sorted(
+        result['params'].items()))
+    return ('%s %s' % (result['name'], params)).strip()
+
+
+def _git_commit():
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=here,
+                                       stderr=subprocess.DEVNULL
+                                       ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine():
+    """ Return a description of the machine and the settings the results
+    depend on.
+
+    """
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'numpy': getattr(chunks.numpy, '__version__', None),
+        'chunks': model.USE_CHUNKS,
+        'sector_size': model.SECTOR_SIZE,
+        'commit': _git_commit(),
+    }
+
+
+def run_all(names=None, repeat=7):
+    """ Run the benchmarks called one of `names`, all of them by default,
+    in a scratch directory for the paged out chunks.
+    Returns the results with the machine description.
+
+    """
+    scratch = tempfile.mkdtemp(prefix='benchmark-')
+    saved = model.PAGE_PATH
+    model.PAGE_PATH = os.path.join(scratch, 'pages')
+    results = []
+    try:
+        for name, params in CASES:
+            if names and name not in names:
+                continue
+            result = run_case(name, params, repeat)
+            print("%-40s %12.3f us/op %10.1f ops/s" % (
+                key(result), result['per_op'] * 1e6, 1 / result['per_op']),
+                file=sys.stderr)
+            results.append(result)
+    finally:
+        model.PAGE_PATH = saved
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        'version': VERSION,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'machine': machine(),
+        'results': results,
+    }
+
+
+def noise(result):
+    """ Return how much slower the median repeat of `result` was than the
+    fastest one, 0.1 for 10%.
+
+    """
+    return result['median'] / result['min'] - 1
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    """ Print how the median time per operation of each benchmark in
+    `report` changed since `baseline`, with the `noise()` of both runs.
+    Returns the keys of the benchmarks that got slower by more than
+    `threshold` (0.1 is 10%).
+
+    """
+    if baseline.get('version') != report['version']:
+        print("baseline is from benchmark version %s, not %s" % (
+            baseline.get('version'), report['version']))
+    for field in ('platform', 'processor', 'cpu_count', 'python', 'numpy',
+                  'chunks'):
+        if baseline['machine'].get(field) != report['machine'][field]:
+            print("baseline %s differs: %s, now %s" % (
+                field, baseline['machine'].get(field),
+                report['machine'][field]))
+    before = dict((key(result), result) for result in baseline['results'])
+    slower = []
+    print("%-40s %12s %12s %8s %9s" % ("", "baseline us", "now us", "change",
+                                        "noise"))
+    for result in report['results']:
+        name = key(result)
+        old = before.get(name)
+        if old is None:
+            print("%-40s %12s %12.3f" % (name, "-", result['per_op'] * 1e6))
+            continue
+        change = result['per_op'] / old['per_op'] - 1
+        flag = ''
+        if change > threshold:
+            slower.append(name)
+            flag = ' slower'
+        elif change < -threshold:
+            flag = ' faster'
+        print("%-40s %12.3f %12.3f %+7.1f%% %8.0f%%%s" % (
+            name, old['per_op'] * 1e6, result['per_op'] * 1e6, change * 100,
+            max(noise(old), noise(result)) * 100, flag))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        '\n')[0])
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help="benchmarks to run, out of %s; all by default" %
+                        ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--repeat', type=int, default=7,
+                        help="times to run each benchmark, the median "
+                        "counts (default 7)")
+    parser.add_argument('--json', metavar='PATH',
+                        help="write the results as JSON to PATH, - for "
+                        "standard output")
+    parser.add_argument('--baseline', metavar='PATH', nargs='?',
+                        const=BASELINE_PATH,
+                        help="compare with the results in PATH (default "
+                        "benchmark_baseline.json)")
+    parser.add_argument('--save-baseline', metavar='PATH', nargs='?',
+                        const=BASELINE_PATH,
+                        help="write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="least slowdown of the median that counts as a "
+                        "regression (default %s)" % THRESHOLD)
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark %s" % name)
+
+    report = run_all(args.names, args.repeat)
+    for path in (args.json, args.save_baseline):
+        if path == '-':
+            json.dump(report, sys.stdout, indent=1)
+            print()
+        elif path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(report, baseline, args.threshold)
+        if slower:
+            print("%d slower than the baseline: %s" % (len(slower),
+                                                      ', '.join(slower)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+
+registry of block types
+
+Every block type gets a small integer id when it is registered. The world
+stores these ids, and everything else about a type (its name, texture
+coordinates and property flags) is looked up here by id.
+
+"""
+
+# property flags, combine with |
+BREAKABLE = 1  # the player can remove it
+COMPOSITE = 2  # part of a composite structure like the rocket
+CREEPER = 4  # part of a creeper
+CIRCUIT = 8  # wireworld circuit block
+SENSOR = 16  # sensor block
+PICKUP = 32  # gives the player something when removed
+SOLID = 64  # the mob can not walk through it
+
+# Id 0 means "no block", so the first registered type gets id 1.
+NAMES = ["Air"]
+TEXTURES = [None]
+FLAGS = [0]
+
+# Mapping from name to id.
+IDS = {}
+
+
+def register(name, texture, flags=0):
+    """ Register a new block type and return its id. Registering the same
+    type again returns the id it already has.
+
+    Parameters
+    ----------
+    name : str
+        Unique name of the block type.
+    texture : list of floats
+        The coordinates of the texture squares. Use `tex_coords()` to
+        generate.
+    flags : int
+        Property flags of the block type, e.g. `BREAKABLE | SOLID`.
+
+    """
+    texture = tuple(texture)
+    if name in IDS:
+        block = IDS[name]
+        if TEXTURES[block] != texture or FLAGS[block] != flags:
+            raise ValueError("block type %r is already registered" % name)
+        return block
+    block = len(NAMES)
+    NAMES.append(name)
+    TEXTURES.append(texture)
+    FLAGS.append(flags)
+    IDS[name] = block
+    return block
+
+
+def has(block, flag):
+    """ Returns True if the block type `block` has any of the given `flag`s.
+
+    """
+    return FLAGS[block] & flag != 0
+
+
+def having(flag):
+    """ Return the ids of all block types with any of the given `flag`s.
+
+    """
+    return [block for block in range(1, len(FLAGS)) if FLAGS[block] & flag]
+
+
+def name(block):
+    return NAMES[block]
+
+
+def texture(block):
+    return TEXTURES[block]
+
+
+def by_name(name):
+    return IDS[name]
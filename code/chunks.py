@@ -0,0 +1,479 @@
+"""
+
+chunked block storage for the world
+
+Block ids are kept in one small NumPy array per sector instead of one dict
+entry per position. `ChunkWorld` behaves like the plain `world` dict, so code
+that does `position in world` or `world[position]` keeps working.
+
+"""
+
+from collections.abc import Mapping, MutableMapping
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Columns are allocated and grown this many layers at a time.
+STEP = 8
+
+
+class Chunk(object):
+    """ A column of blocks `size` wide, `size` deep and as tall as it needs to
+    be. Blocks are stored as their ids, 0 means no block. `faces` holds the
+    visible face mask of each block.
+
+    """
+
+    def __init__(self, size, y0=0, height=STEP):
+        self.size = size
+        # world y of the bottom layer of `blocks`
+        self.y0 = y0
+        self.blocks = numpy.zeros((size, height, size), dtype=numpy.uint8)
+        self.faces = numpy.zeros((size, height, size), dtype=numpy.uint8)
+
+    def get(self, x, y, z):
+        y -= self.y0
+        if y < 0 or y >= self.blocks.shape[1]:
+            return 0
+        return self.blocks[x, y, z]
+
+    def set(self, x, y, z, block):
+        self.grow(y, y)
+        self.thaw()
+        self.blocks[x, y - self.y0, z] = block
+
+    def freeze(self):
+        """ Make the block array read only and return it, so it can be
+        saved in the background while the game goes on. The next change to
+        the chunk works on a copy.
+
+        """
+        self.blocks.flags.writeable = False
+        return self.blocks
+
+    def thaw(self):
+        """ Make sure the block array can be written, copying it if it was
+        frozen.
+
+        """
+        if not self.blocks.flags.writeable:
+            self.blocks = self.blocks.copy()
+
+    def get_faces(self, x, y, z):
+        y -= self.y0
+        if y < 0 or y >= self.faces.shape[1]:
+            return 0
+        return self.faces[x, y, z]
+
+    def set_faces(self, x, y, z, mask):
+        self.grow(y, y)
+        self.faces[x, y - self.y0, z] = mask
+
+    def grow(self, low, high):
+        """ Make sure world heights `low` to `high` fit in the column. The
+        column grows in steps of `STEP` layers.
+
+        """
+        y0, height = self.y0, self.blocks.shape[1]
+        if low >= y0 and high < y0 + height:
+            return
+        low = min(low, y0) // STEP * STEP
+        high = (max(high, y0 + height - 1) // STEP + 1) * STEP
+        shape = (self.size, high - low, self.size)
+        blocks = numpy.zeros(shape, dtype=numpy.uint8)
+        blocks[:, y0 - low:y0 - low + height, :] = self.blocks
+        faces = numpy.zeros(shape, dtype=numpy.uint8)
+        faces[:, y0 - low:y0 - low + height, :] = self.faces
+        self.blocks, self.faces = blocks, faces
+        self.y0 = low
+
+    def solid(self, low, high):
+        """ Return a boolean array of which positions hold a block, for world
+        heights `low` up to but not including `high`.
+
+        """
+        out = numpy.zeros((self.size, high - low, self.size), dtype=bool)
+        a, b = max(low, self.y0), min(high, self.y0 + self.blocks.shape[1])
+        if a < b:
+            out[:, a - low:b - low, :] = self.blocks[:, a - self.y0:b - self.y0]
+        return out
+
+    def positions(self, x0, z0, exposed=False):
+        """ Return the world positions of all blocks in the column, or only
+        the ones with a visible face if `exposed` is True. `x0`, `z0` are the
+        world coordinates of the column's corner.
+
+        """
+        xs, ys, zs = numpy.nonzero(self.faces if exposed else self.blocks)
+        return list(zip((xs + x0).tolist(), (ys + self.y0).tolist(),
+                        (zs + z0).tolist()))
+
+
+class ChunkWorld(MutableMapping):
+    """ Mapping from (x, y, z) position to block id, stored as one `Chunk`
+    per sector.
+
+    """
+
+    def __init__(self, sector_size, faces):
+        self.size = sector_size
+
+        # The six face directions. Bit i of a face mask is set when the
+        # neighbour in direction `faces[i]` is empty.
+        self.directions = faces
+
+        # Mapping from sector to the `Chunk` holding its blocks.
+        self.chunks = {}
+
+        self.count = 0
+
+        # Same shape as the `sectors` dict the Model keeps without chunks.
+        self.sectors = SectorView(self)
+
+        # Mapping from position to the visible face mask of its block.
+        self.faces = FaceView(self)
+
+        # Called as pager(sector, chunk) on every lookup of a chunk, with
+        # `chunk` None when it is not in memory, and returns the chunk to
+        # use. Its peek(sector) returns the (y0, blocks) of a chunk that is
+        # not in memory without bringing it back, or None. See
+        # `residency.Residency`.
+        self.pager = None
+
+    def chunk(self, sector):
+        """ Return the chunk of `sector`, or None if it has no blocks.
+
+        """
+        chunk = self.chunks.get(sector)
+        if self.pager is not None:
+            chunk = self.pager(sector, chunk)
+        return chunk
+
+    def _beside(self, sector):
+        """ Return the chunk of `sector` for reading the blocks next to it,
+        a copy read by the pager if it is not in memory, or None if it has no
+        blocks. Does not bring paged out chunks back.
+
+        """
+        chunk = self.chunks.get(sector)
+        if chunk is None and self.pager is not None:
+            data = self.pager.peek(sector)
+            if data is not None:
+                y0, blocks = data
+                chunk = Chunk(self.size, y0, blocks.shape[1])
+                chunk.blocks = blocks
+        return chunk
+
+    def _chunk(self, x, z, y=None):
+        """ Return the chunk holding column `x`, `z`. If `y` is given the
+        chunk is created, starting around that height, when missing.
+
+        """
+        s = self.size
+        sector = (x // s, 0, z // s)
+        chunk = self.chunks.get(sector)
+        if self.pager is not None:
+            chunk = self.pager(sector, chunk)
+        if chunk is None and y is not None:
+            chunk = self.chunks[sector] = Chunk(s, y // STEP * STEP)
+        return chunk
+
+    def __contains__(self, position):
+        x, y, z = position
+        chunk = self._chunk(x, z)
+        return chunk is not None and chunk.get(x % self.size, y,
+                                               z % self.size) != 0
+
+    def __getitem__(self, position):
+        x, y, z = position
+        chunk = self._chunk(x, z)
+        block = chunk.get(x % self.size, y, z % self.size) if chunk else 0
+        if not block:
+            raise KeyError(position)
+        return int(block)
+
+    def __setitem__(self, position, block):
+        x, y, z = position
+        chunk = self._chunk(x, z, y)
+        s = self.size
+        if not chunk.get(x % s, y, z % s):
+            self.count += 1
+        chunk.set(x % s, y, z % s, block)
+
+    def __delitem__(self, position):
+        x, y, z = position
+        chunk = self._chunk(x, z)
+        s = self.size
+        if chunk is None or not chunk.get(x % s, y, z % s):
+            raise KeyError(position)
+        chunk.set(x % s, y, z % s, 0)
+        chunk.set_faces(x % s, y, z % s, 0)
+        self.count -= 1
+
+    def __iter__(self):
+        for sector in list(self.chunks):
+            for position in self.sectors.get(sector, []):
+                yield position
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.chunks = {}
+        self.count = 0
+
+    def put_chunk(self, sector, y0, blocks):
+        """ Use the array `blocks` as the block ids of `sector`, with its
+        bottom layer at height `y0`. Face masks are left empty, see
+        `refresh_faces()`.
+
+        """
+        old = self.chunks.get(sector)
+        if old is not None:
+            self.count -= int(numpy.count_nonzero(old.blocks))
+        chunk = self.chunks[sector] = Chunk(self.size, y0, blocks.shape[1])
+        chunk.blocks = blocks
+        self.count += int(numpy.count_nonzero(blocks))
+
+    def drop_chunk(self, sector):
+        """ Forget the blocks of `sector`. Face masks of the neighbouring
+        chunks are left as they were, see `refresh_faces()`.
+
+        """
+        chunk = self.chunks.pop(sector, None)
+        if chunk is not None:
+            self.count -= int(numpy.count_nonzero(chunk.blocks))
+        return chunk
+
+    def counts(self, sectors=None):
+        """ Return a dict from block id to how many blocks of that type are
+        in the world, or in the given `sectors`, counted one array pass per
+        chunk.
+
+        """
+        if sectors is None:
+            sectors = self.chunks
+        total = numpy.zeros(256, dtype=numpy.int64)
+        for sector in sectors:
+            chunk = self.chunks.get(sector)
+            if chunk is None:
+                continue
+            total += numpy.bincount(chunk.blocks.ravel(), minlength=256)
+        return {block: int(n) for block, n in enumerate(total) if block and n}
+
+    def positions_of(self, block, sectors=None):
+        """ Return the positions of all blocks of type `block`, or only of
+        the ones in the given `sectors`.
+
+        """
+        if sectors is None:
+            sectors = list(self.chunks)
+        s = self.size
+        result = []
+        for x, _, z in sectors:
+            chunk = self.chunks.get((x, 0, z))
+            if chunk is None:
+                continue
+            xs, ys, zs = numpy.nonzero(chunk.blocks == block)
+            result.extend(zip((xs + x * s).tolist(), (ys + chunk.y0).tolist(),
+                              (zs + z * s).tolist()))
+        return result
+
+    def set_many(self, positions, ids):
+        """ Set the blocks at `positions`, an (N, 3) array, to the block
+        ids in `ids`, one array assignment per chunk. A position given more
+        than once gets the last of its ids. Face masks are left as they
+        were, see `refresh_faces()`.
+
+        Returns
+        -------
+        kept : array
+            The index in `positions` of each position set, the last one
+            where a position repeats, in the order given.
+        old : array
+            The ids that were at `positions[kept]` before, 0 where there was
+            no block.
+
+        """
+        positions = numpy.asarray(positions, dtype=numpy.int64).reshape(-1, 3)
+        ids = numpy.asarray(ids, dtype=numpy.uint8)
+        kept = numpy.arange(len(positions))
+        if len(positions):
+            # one number per position within the bounding box; the first of
+            # each in reverse is the last one given.
+            low = positions.min(axis=0)
+            key = numpy.ravel_multi_index((positions - low).T,
+                                          positions.max(axis=0) - low + 1)
+            _, last = numpy.unique(key[::-1], return_index=True)
+            kept = numpy.sort(len(positions) - 1 - last)
+        positions, ids = positions[kept], ids[kept]
+        s = self.size
+        old = numpy.zeros(len(ids), dtype=numpy.uint8)
+        sectors, inverse = numpy.unique(positions[:, [0, 2]] // s, axis=0,
+                                        return_inverse=True)
+        inverse = inverse.ravel()
+        for k, (cx, cz) in enumerate(sectors.tolist()):
+            rows = numpy.nonzero(inverse == k)[0]
+            xs, ys, zs = positions[rows].T
+            low, high = int(ys.min()), int(ys.max())
+            chunk = self._chunk(cx * s, cz * s, low)
+            chunk.grow(low, high)
+            chunk.thaw()
+            index = (xs - cx * s, ys - chunk.y0, zs - cz * s)
+            old[rows] = chunk.blocks[index]
+            chunk.blocks[index] = ids[rows]
+        self.count += int(numpy.count_nonzero(ids)) - \
+            int(numpy.count_nonzero(old))
+        return kept, old
+
+    def positions_in(self, low, high):
+        """ Return the positions of the blocks in the box from `low` to
+        `high` (inclusive).
+
+        """
+        s = self.size
+        (x0, y0, z0), (x1, y1, z1) = low, high
+        result = []
+        for cx in range(x0 // s, x1 // s + 1):
+            for cz in range(z0 // s, z1 // s + 1):
+                chunk = self.chunk((cx, 0, cz))
+                if chunk is None:
+                    continue
+                bx, bz = cx * s, cz * s
+                xa, xb = max(x0, bx) - bx, min(x1, bx + s - 1) - bx
+                za, zb = max(z0, bz) - bz, min(z1, bz + s - 1) - bz
+                ya = max(y0 - chunk.y0, 0)
+                yb = min(y1 - chunk.y0, chunk.blocks.shape[1] - 1)
+                if ya > yb:
+                    continue
+                box = chunk.blocks[xa:xb + 1, ya:yb + 1, za:zb + 1]
+                xs, ys, zs = numpy.nonzero(box)
+                result.extend(zip((xs + bx + xa).tolist(),
+                                  (ys + chunk.y0 + ya).tolist(),
+                                  (zs + bz + za).tolist()))
+        return result
+
+    def exposed_positions(self, sector):
+        """ Return the positions in `sector` with at least one visible face.
+
+        """
+        chunk = self.chunk(sector)
+        if chunk is None:
+            return []
+        s = self.size
+        return chunk.positions(sector[0] * s, sector[2] * s, exposed=True)
+
+    def snapshot(self, sector):
+        """ Return copies of the positions, face masks and block ids of the
+        exposed blocks in `sector`, as NumPy arrays.
+
+        """
+        chunk = self.chunk(sector)
+        if chunk is None:
+            empty = numpy.zeros(0, dtype=numpy.uint8)
+            return numpy.zeros((0, 3), dtype=int), empty, empty
+        s = self.size
+        xs, ys, zs = numpy.nonzero(chunk.faces)
+        positions = numpy.stack((xs + sector[0] * s, ys + chunk.y0,
+                                 zs + sector[2] * s), axis=1)
+        return positions, chunk.faces[xs, ys, zs], chunk.blocks[xs, ys, zs]
+
+    def refresh_faces(self, sectors):
+        """ Recompute the face masks of every block in the given `sectors`
+        from scratch, one array operation per face direction. Blocks of
+        paged out neighbours count, without bringing them back.
+
+        """
+        s = self.size
+        for sector in sectors:
+            # chunks that are paged out get theirs when they come back.
+            chunk = self.chunks.get(sector)
+            if chunk is None:
+                continue
+            low = chunk.y0 - 1
+            high = chunk.y0 + chunk.blocks.shape[1] + 1
+            # solid blocks of the chunk plus a one block border taken from
+            # the neighbouring chunks.
+            solid = numpy.zeros((s + 2, high - low, s + 2), dtype=bool)
+            solid[1:-1, :, 1:-1] = chunk.solid(low, high)
+            x, _, z = sector
+            other = self._beside((x - 1, 0, z))
+            if other is not None:
+                solid[0, :, 1:-1] = other.solid(low, high)[-1, :, :]
+            other = self._beside((x + 1, 0, z))
+            if other is not None:
+                solid[-1, :, 1:-1] = other.solid(low, high)[0, :, :]
+            other = self._beside((x, 0, z - 1))
+            if other is not None:
+                solid[1:-1, :, 0] = other.solid(low, high)[:, :, -1]
+            other = self._beside((x, 0, z + 1))
+            if other is not None:
+                solid[1:-1, :, -1] = other.solid(low, high)[:, :, 0]
+            inner = solid[1:-1, 1:-1, 1:-1]
+            height = inner.shape[1]
+            mask = numpy.zeros(inner.shape, dtype=numpy.uint8)
+            for i, (dx, dy, dz) in enumerate(self.directions):
+                beside = solid[1 + dx:1 + dx + s, 1 + dy:1 + dy + height,
+                               1 + dz:1 + dz + s]
+                mask |= (inner & ~beside).astype(numpy.uint8) << i
+            chunk.faces = mask
+
+
+class FaceView(MutableMapping):
+    """ Mapping from position to the visible face mask of the block there,
+    stored next to the block ids in each chunk.
+
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+    def __getitem__(self, position):
+        x, y, z = position
+        chunk = self.world._chunk(x, z)
+        if chunk is None:
+            raise KeyError(position)
+        s = self.world.size
+        return int(chunk.get_faces(x % s, y, z % s))
+
+    def __setitem__(self, position, mask):
+        x, y, z = position
+        s = self.world.size
+        self.world._chunk(x, z, y).set_faces(x % s, y, z % s, mask)
+
+    def __delitem__(self, position):
+        self[position] = 0
+
+    def __iter__(self):
+        for sector in list(self.world.chunks):
+            for position in self.world.exposed_positions(sector):
+                yield position
+
+    def __len__(self):
+        return sum(int(numpy.count_nonzero(chunk.faces))
+                   for chunk in self.world.chunks.values())
+
+
+class SectorView(Mapping):
+    """ Read only mapping from sector to the list of block positions in it,
+    computed from the chunks on demand.
+
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+    def __getitem__(self, sector):
+        chunk = self.world.chunk(sector)
+        if chunk is None:
+            raise KeyError(sector)
+        s = self.world.size
+        return chunk.positions(sector[0] * s, sector[2] * s)
+
+    def __iter__(self):
+        return iter(self.world.chunks)
+
+    def __len__(self):
+        return len(self.world.chunks)
@@ -0,0 +1,185 @@
+"""
+
+converting the lesson worlds
+
+The early lessons saved worlds with pickle, as a dict from position to the
+list of 48 texture coordinates of the block, so every block carries a list
+of its own. Structures were saved as .txt files of "x y z index" lines.
+`convert()` turns either into a world file (see `worldfile`), which stores
+each block as a one byte id and the name of each id once.
+
+Run this file to convert the shipped .pkl and .txt files and compare how
+long they take to load, and how much memory, before and after.
+
+"""
+
+import os
+import pickle
+import subprocess
+import sys
+
+import worldfile
+
+# Block names by the (top, bottom, side) texture squares they have in the
+# 4 x 4 texture atlases of the lessons, composite_textures.png and
+# nmusaf_textures.png.
+LEGACY_NAMES = {
+    ((1, 0), (0, 1), (0, 0)): "Grass",
+    ((1, 1), (1, 1), (1, 1)): "Sand",
+    ((2, 0), (2, 0), (2, 0)): "Brick",
+    ((2, 1), (2, 1), (2, 1)): "Stone",
+    ((3, 1), (3, 1), (3, 1)): "Composite Red",
+    ((3, 0), (3, 0), (3, 0)): "Composite Blue",
+    ((0, 2), (0, 2), (0, 2)): "Composite Black",
+    ((1, 2), (1, 2), (1, 2)): "Composite Grey",
+    ((2, 2), (2, 2), (2, 2)): "Composite Green",
+    ((3, 2), (3, 2), (3, 2)): "EPR Brick",
+    ((0, 3), (0, 3), (0, 3)): "Composite Yellow",
+}
+
+# The blocks the indices of the .txt files stand for, COMPOSITE of lesson 7
+# and NMUSAF of lesson 8.
+TXT_NAMES = ["Composite Red", "Composite Blue", "Composite Black",
+             "Composite Grey", "Composite Green", "EPR Brick",
+             "Composite Yellow"]
+
+
+def squares(texture, n=4):
+    """ Return the (top, bottom, side) texture squares of a list of texture
+    coordinates made by `tex_coords()` for an `n` x `n` atlas.
+
+    """
+    return tuple((int(round(texture[i] * n)), int(round(texture[i + 1] * n)))
+                 for i in (0, 8, 16))
+
+
+def read_pkl(path, n=4):
+    """ Read a world pickled by the lessons.
+
+    Each distinct texture list is looked up in `LEGACY_NAMES` once and every
+    block that has it gets the same id.
+
+    Returns
+    -------
+    world : dict
+        Mapping from position to block id.
+    names : list of str
+        The name of each block id, `names[0]` is "no block".
+
+    """
+    with open(path, 'rb') as f:
+        textures = pickle.load(f)
+    names = ["Air"]
+    ids = {}
+    world = {}
+    for position, texture in textures.items():
+        key = tuple(texture)
+        block = ids.get(key)
+        if block is None:
+            square = squares(texture, n)
+            if square not in LEGACY_NAMES:
+                raise ValueError("%s has a block with unknown texture "
+                                 "squares %s" % (path, square))
+            block = ids[key] = len(names)
+            names.append(LEGACY_NAMES[square])
+        world[position] = block
+    return world, names
+
+
+def read_txt(path):
+    """ Read a .txt structure file. Returns the same as `read_pkl()`, with
+    only the names of the blocks the file uses.
+
+    """
+    positions, indices = worldfile.read_txt(path)
+    if worldfile.numpy is not None:
+        positions = positions.tolist()
+        indices = indices.tolist()
+    used = sorted(set(indices))
+    if used and (used[0] < 0 or used[-1] >= len(TXT_NAMES)):
+        raise ValueError("%s has unknown block index %d" % (
+            path, used[0] if used[0] < 0 else used[-1]))
+    ids = dict((index, i + 1) for i, index in enumerate(used))
+    world = dict(zip(map(tuple, positions), [ids[i] for i in indices]))
+    return world, ["Air"] + [TXT_NAMES[index] for index in used]
+
+
+def convert(path, out=None, sector_size=16, compress=True):
+    """ Convert the .pkl or .txt file `path` to a world file `out`, by
+    default `path` + '.world'. Returns the path written.
+
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == '.pkl':
+        world, names = read_pkl(path)
+    elif ext == '.txt':
+        world, names = read_txt(path)
+    else:
+        raise ValueError("can not convert %s" % path)
+    if out is None:
+        out = path + '.world'
+    worldfile.write(out, sector_size, worldfile.to_chunks(world, sector_size),
+                    names, compress)
+    return out
+
+
+# Loads a file in a fresh interpreter and prints the seconds it took and the
+# KiB it added to the resident set size, read from /proc on Linux and from
+# the peak size elsewhere.
+_MEASURE = """
+import os, resource, sys, time
+sys.path.insert(0, %(here)r)
+import pickle, worldfile
+def rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start_rss = rss()
+start = time.perf_counter()
+%(load)s
+elapsed = time.perf_counter() - start
+print(elapsed, rss() - start_rss)
+"""
+
+_LOAD_PKL = """
+with open(%(path)r, 'rb') as f:
+    world = pickle.load(f)
+"""
+
+_LOAD_TXT = """
+world = {}
+with open(%(path)r) as f:
+    for line in f:
+        x, y, z, index = line.split()
+        world[int(x), int(y), int(z)] = int(index)
+"""
+
+_LOAD_WORLD = """
+data = worldfile.WorldFile(%(path)r)
+chunks = [data.chunk(sector) for sector in data]
+"""
+
+
+def _measure(load, path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = _MEASURE % {'here': here, 'load': load % {'path': path}}
+    output = subprocess.check_output([sys.executable, '-c', code])
+    elapsed, rss = output.split()
+    return float(elapsed), int(rss)
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or ['composite_world.pkl', 'rocket.pkl',
+                             'nmusaf.pkl', 'rocket.txt', 'nmusaf.txt']
+    print("%-20s %9s %9s %9s  %9s %9s %9s" % (
+        "", "bytes", "load s", "RSS KiB", "bytes", "load s", "RSS KiB"))
+    for path in paths:
+        out = convert(path)
+        before = _measure(_LOAD_PKL if path.endswith('.pkl') else _LOAD_TXT,
+                          path)
+        after = _measure(_LOAD_WORLD, out)
+        print("%-20s %9d %9.4f %9d  %9d %9.4f %9d" % (
+            (path, os.path.getsize(path)) + before +
+            (os.path.getsize(out),) + after))
@@ -3,14 +3,15 @@ def draw_trap(self):
         block = self.model.hit_test(self.position, vector)[0]
         if block:
             x, y, z = block
-            for i in xrange(-3, 4):
-                for j in xrange(-3, 4):
-                    if (i == -3 or i == 3 or j == -3 or j == 3):
-                        for k in xrange(-2, y + 3):
-                            if (x + i, k, z + j) not in self.model.world:
-                                self.model.add_block((x + i, k , z + j), SAND)
-                    if (x + i, y + 3, z + j) not in self.model.world:
-                        self.model.add_block((x + i, y + 3, z + j), SAND)
+            with self.model.bulk_edit():
+                for i in xrange(-3, 4):
+                    for j in xrange(-3, 4):
+                        if (i == -3 or i == 3 or j == -3 or j == 3):
+                            for k in xrange(-2, y + 3):
+                                if (x + i, k, z + j) not in self.model.world:
+                                    self.model.add_block((x + i, k , z + j), SAND)
+                        if (x + i, y + 3, z + j) not in self.model.world:
+                            self.model.add_block((x + i, y + 3, z + j), SAND)
             # check mob inside trap
             in_x, in_y, in_z = False, False, False
             if self.model.mob_x_position in xrange(x-3, x+4):
@@ -0,0 +1,86 @@
+"""
+
+view frustum culling
+
+Builds the same projection and camera transform that Window.set_3d() gives
+OpenGL, and tests boxes against the six planes of the resulting view
+frustum. Matrices are lists of 4 rows.
+
+"""
+
+import math
+
+
+def multiply(a, b):
+    return [[sum(a[i][k] * b[k][j] for k in range(4)) for j in range(4)]
+            for i in range(4)]
+
+
+def perspective(fovy, aspect, near, far):
+    """ The matrix made by gluPerspective().
+
+    """
+    f = 1.0 / math.tan(math.radians(fovy) / 2)
+    return [
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ]
+
+
+def rotation(angle, x, y, z):
+    """ The matrix made by glRotatef() for a unit axis `x`, `y`, `z`.
+
+    """
+    c = math.cos(math.radians(angle))
+    s = math.sin(math.radians(angle))
+    t = 1 - c
+    return [
+        [x * x * t + c, x * y * t - z * s, x * z * t + y * s, 0],
+        [y * x * t + z * s, y * y * t + c, y * z * t - x * s, 0],
+        [x * z * t - y * s, y * z * t + x * s, z * z * t + c, 0],
+        [0, 0, 0, 1],
+    ]
+
+
+def translation(x, y, z):
+    """ The matrix made by glTranslatef().
+
+    """
+    return [[1, 0, 0, x], [0, 1, 0, y], [0, 0, 1, z], [0, 0, 0, 1]]
+
+
+def planes(rotation_, position, aspect, fovy=65.0, near=0.1, far=60.0):
+    """ Return the six planes (a, b, c, d) of the view frustum of a player at
+    `position` looking along `rotation_`, set up like Window.set_3d(). A
+    point is inside a plane when a * x + b * y + c * z + d >= 0.
+
+    """
+    x, y = rotation_
+    m = multiply(perspective(fovy, aspect, near, far), rotation(x, 0, 1, 0))
+    m = multiply(m, rotation(-y, math.cos(math.radians(x)), 0,
+                             math.sin(math.radians(x))))
+    px, py, pz = position
+    m = multiply(m, translation(-px, -py, -pz))
+    w = m[3]
+    result = []
+    for row in m[:3]:
+        result.append([w[k] + row[k] for k in range(4)])
+        result.append([w[k] - row[k] for k in range(4)])
+    return result
+
+
+def box_visible(planes_, low, high):
+    """ Returns False if the box from `low` to `high` is completely outside
+    one of the frustum `planes_`, True otherwise.
+
+    """
+    for a, b, c, d in planes_:
+        # the corner of the box furthest along the plane's normal.
+        x = high[0] if a >= 0 else low[0]
+        y = high[1] if b >= 0 else low[1]
+        z = high[2] if c >= 0 else low[2]
+        if a * x + b * y + c * z + d < 0:
+            return False
+    return True
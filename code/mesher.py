@@ -0,0 +1,340 @@
+"""
+
+builds the vertex data used to draw blocks
+
+Only the faces of a block that can be seen are emitted. A face can be seen
+when the neighbouring position on that side is empty, which is what the bits
+of a block's face mask record.
+
+Sector meshes can be built in a pool of worker processes with `build()`,
+which only needs a plain snapshot of the sector's exposed blocks.
+
+"""
+
+import multiprocessing
+import sys
+from array import array
+from multiprocessing.pool import ThreadPool
+
+# The corners of each face of a cube, as offsets from its center, in the same
+# order as FACES (top, bottom, left, right, front, back) and with the same
+# winding as cube_vertices().
+FACE_CORNERS = [
+    ((-1, 1, -1), (-1, 1, 1), (1, 1, 1), (1, 1, -1)),  # top
+    ((-1, -1, -1), (1, -1, -1), (1, -1, 1), (-1, -1, 1)),  # bottom
+    ((-1, -1, -1), (-1, -1, 1), (-1, 1, 1), (-1, 1, -1)),  # left
+    ((1, -1, 1), (1, -1, -1), (1, 1, -1), (1, 1, 1)),  # right
+    ((-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1)),  # front
+    ((1, -1, -1), (-1, -1, -1), (-1, 1, -1), (1, 1, -1)),  # back
+]
+
+
+def block_faces(position, mask, texture, n=0.5):
+    """ Return the vertices and texture coordinates of the visible faces of
+    the block at `position`, as GL_QUADS data.
+
+    Parameters
+    ----------
+    position : tuple of len 3
+        The (x, y, z) position of the block.
+    mask : int
+        The visible face mask of the block. Bit i is set when face i can be
+        seen.
+    texture : list of floats
+        The texture coordinates of all six faces, as made by `tex_coords()`.
+    n : float
+        Half the size of the cube.
+
+    Returns
+    -------
+    vertices, tex_coords : lists of floats
+
+    """
+    x, y, z = position
+    vertices = []
+    tex_coords = []
+    for i, corners in enumerate(FACE_CORNERS):
+        if not mask & (1 << i):
+            continue
+        for dx, dy, dz in corners:
+            vertices.extend((x + dx * n, y + dy * n, z + dz * n))
+        tex_coords.extend(texture[i * 8:i * 8 + 8])
+    return vertices, tex_coords
+
+
+def sector_faces(faces, n=0.5):
+    """ Return the vertices and texture coordinates of all visible faces in a
+    sector, merged into one list each.
+
+    Parameters
+    ----------
+    faces : list of (position, mask, texture) tuples
+        The exposed blocks of the sector.
+
+    """
+    vertices = []
+    tex_coords = []
+    for position, mask, texture in faces:
+        v, t = block_faces(position, mask, texture, n)
+        vertices.extend(v)
+        tex_coords.extend(t)
+    return vertices, tex_coords
+
+
+def _axes(i):
+    """ Return the axis along which face `i` points, and the axes its texture
+    u and v coordinates run along with their directions.
+
+    """
+    c0, c1, c2 = FACE_CORNERS[i][:3]
+    normal = [k for k in range(3) if c0[k] == c1[k] == c2[k]][0]
+    u = [k for k in range(3) if c0[k] != c1[k]][0]
+    v = [k for k in range(3) if c1[k] != c2[k]][0]
+    # corners are +-1, so these are the directions +-1.
+    return normal, (u, (c1[u] - c0[u]) // 2), (v, (c2[v] - c1[v]) // 2)
+
+
+def tile(texture, i):
+    """ Return the lower left corner of the texture square used by face `i`.
+
+    """
+    return texture[i * 8], texture[i * 8 + 1]
+
+
+def greedy_faces(faces, n=0.5):
+    """ Return the visible faces of a sector with neighbouring faces that
+    point the same way and use the same texture square merged into larger
+    quads.
+
+    The texture coordinates count whole texture squares and follow the world
+    grid, so each merged quad must be drawn with its square as a repeating
+    texture of its own.
+
+    Parameters
+    ----------
+    faces : list of (position, mask, texture) tuples
+        The exposed blocks of the sector.
+
+    Returns
+    -------
+    meshes : dict
+        Mapping from texture square (see `tile()`) to a (vertices,
+        tex_coords) pair of GL_QUADS data.
+
+    """
+    meshes = {}
+    for i, corners in enumerate(FACE_CORNERS):
+        normal, (ua, us), (va, vs) = _axes(i)
+        a, b = [k for k in range(3) if k != normal]
+        # Mapping from slice along the normal to {(a, b): texture square}.
+        planes = {}
+        for position, mask, texture in faces:
+            if mask & (1 << i):
+                cells = planes.setdefault(position[normal], {})
+                cells[position[a], position[b]] = tile(texture, i)
+        for depth, cells in planes.items():
+            for a0, b0 in sorted(cells):
+                square = cells.get((a0, b0))
+                if square is None:
+                    continue
+                # grow the quad along a, then along b while whole rows match.
+                a1 = a0
+                while cells.get((a1 + 1, b0)) == square:
+                    a1 += 1
+                b1 = b0
+                while all(cells.get((k, b1 + 1)) == square
+                          for k in range(a0, a1 + 1)):
+                    b1 += 1
+                for k in range(a0, a1 + 1):
+                    for j in range(b0, b1 + 1):
+                        del cells[k, j]
+                low, high = [0, 0, 0], [0, 0, 0]
+                low[normal] = high[normal] = depth
+                low[a], high[a], low[b], high[b] = a0, a1, b0, b1
+                vertices, tex_coords = meshes.setdefault(square, ([], []))
+                for corner in corners:
+                    point = [low[k] - n if corner[k] < 0 else high[k] + n
+                             for k in range(3)]
+                    vertices.extend(point)
+                    tex_coords.extend((us * (point[ua] + n),
+                                       vs * (point[va] + n)))
+    return meshes
+
+
+def count_vertices(faces):
+    """ Return how many vertices the whole cubes, the visible faces, the
+    greedy merged faces and the indexed greedy merged faces of `faces` need.
+
+    """
+    cubes = 24 * len(faces)
+    visible = len(sector_faces(faces)[0]) // 3
+    meshes = greedy_faces(faces).values()
+    greedy = sum(len(v) // 3 for v, _ in meshes)
+    indexed = sum(len(index_quads(v, t)[0]) // 3 for v, t in meshes)
+    return cubes, visible, greedy, indexed
+
+
+# Texture coordinates by block id, set in each worker by `init_worker()`.
+_textures = None
+
+
+def init_worker(textures):
+    global _textures
+    _textures = textures
+
+
+def start_workers(workers, textures):
+    """ Return a pool of `workers` processes ready to run `build()`. They
+    are forked on Linux and spawned elsewhere, as forking is unsafe on macOS
+    once the system frameworks are loaded. Falls back to threads where
+    processes can not be started. Start the pool before any GL context.
+
+    """
+    method = 'fork' if sys.platform.startswith('linux') else 'spawn'
+    if method in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context(method)
+        return context.Pool(workers, init_worker, (textures,))
+    return ThreadPool(workers, init_worker, (textures,))
+
+
+def index_quads(vertices, tex_coords):
+    """ Turn GL_QUADS data into indexed GL_TRIANGLES data. Corners with the
+    same position and texture coordinates are stored once and shared by
+    every quad that uses them.
+
+    Returns
+    -------
+    vertices, tex_coords, indices : lists
+
+    """
+    corners = {}
+    out_vertices = []
+    out_tex_coords = []
+    indices = []
+    quad = []
+    for i in range(len(vertices) // 3):
+        key = (tuple(vertices[i * 3:i * 3 + 3]) +
+               tuple(tex_coords[i * 2:i * 2 + 2]))
+        k = corners.get(key)
+        if k is None:
+            k = corners[key] = len(corners)
+            out_vertices.extend(key[:3])
+            out_tex_coords.extend(key[3:])
+        quad.append(k)
+        if len(quad) == 4:
+            # two triangles with the winding of the quad.
+            a, b, c, d = quad
+            indices.extend((a, b, c, a, c, d))
+            quad = []
+    return out_vertices, out_tex_coords, indices
+
+
+def build(positions, masks, ids, greedy=False, indexed=False, textures=None):
+    """ Build the mesh of one sector from a snapshot of its exposed blocks.
+
+    Parameters
+    ----------
+    positions, masks, ids : sequences of equal length
+        The (x, y, z) position, visible face mask and block id of each
+        exposed block. NumPy arrays are accepted.
+    greedy : bool
+        Whether to merge faces with `greedy_faces()`.
+    indexed : bool
+        Whether to return indexed triangles made by `index_quads()` instead of
+        quads.
+    textures : list
+        Texture coordinates by block id. Defaults to the table given to
+        `init_worker()`.
+
+    Returns
+    -------
+    meshes : dict
+        Mapping from texture square (None for the whole texture atlas) to a
+        (vertices, tex_coords, indices) tuple of arrays. `indices` is None
+        for quads.
+
+    """
+    if textures is None:
+        textures = _textures
+    if hasattr(positions, 'tolist'):
+        positions = positions.tolist()
+        masks, ids = masks.tolist(), ids.tolist()
+    faces = [(tuple(position), mask, textures[block])
+             for position, mask, block in zip(positions, masks, ids)]
+    if greedy:
+        meshes = greedy_faces(faces)
+    else:
+        meshes = {None: sector_faces(faces)}
+    result = {}
+    for square, (vertices, tex_coords) in meshes.items():
+        indices = None
+        if indexed:
+            vertices, tex_coords, indices = index_quads(vertices, tex_coords)
+            indices = array('I', indices)
+        result[square] = (array('f', vertices), array('f', tex_coords),
+                          indices)
+    return result
+
+
+def _exposed(world):
+    """ Return (position, mask, texture) for every exposed block of `world`,
+    a mapping from position to texture.
+
+    """
+    faces = []
+    for (x, y, z), texture in world.items():
+        mask = 0
+        for i, corners in enumerate(FACE_CORNERS):
+            # the neighbour the face points at.
+            normal = _axes(i)[0]
+            d = [0, 0, 0]
+            d[normal] = corners[0][normal]
+            if (x + d[0], y + d[1], z + d[2]) not in world:
+                mask |= 1 << i
+        if mask:
+            faces.append(((x, y, z), mask, texture))
+    return faces
+
+
+def _square(x, y):
+    return (x, y) + (0,) * 6
+
+
+def _report(name, world, sector_size=16):
+    sectors = {}
+    for face in _exposed(world):
+        x, _, z = face[0]
+        sector = (x // sector_size, z // sector_size)
+        sectors.setdefault(sector, []).append(face)
+    totals = [0, 0, 0, 0]
+    for faces in sectors.values():
+        for k, count in enumerate(count_vertices(faces)):
+            totals[k] += count
+    print("%-24s %9d %9d %9d %9d" % tuple([name] + totals))
+
+
+if __name__ == '__main__':
+    # Vertex counts of the shipped worlds with whole cubes, visible faces
+    # only, greedy merged faces, and greedy merged faces as indexed triangles.
+    print("%-24s %9s %9s %9s %9s" % ("world", "cubes", "visible", "greedy",
+                                     "indexed"))
+    for path in ['rocket.txt', 'nmusaf.txt']:
+        world = {}
+        with open(path) as f:
+            for line in f:
+                x, y, z, index = [int(v) for v in line.split()]
+                world[x, y, z] = _square(index, 0) * 6
+        _report(path, world)
+    # the floor and outer walls built by Model._initialize().
+    grass = _square(1, 0) + _square(0, 1) + _square(0, 0) * 4
+    stone = _square(2, 1) * 6
+    world = {}
+    n = 80
+    for x in range(-n, n + 1):
+        for z in range(-n, n + 1):
+            world[x, -2, z] = grass
+            world[x, -3, z] = stone
+            if x in (-n, n) or z in (-n, n):
+                for y in range(-2, 3):
+                    world[x, y, z] = stone
+    _report("floor and walls", world)
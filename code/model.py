@@ -0,0 +1,1762 @@
+"""
+
+the world of the story game
+
+`Model` holds everything that happens in the world: the blocks, the sectors
+they are in, the circuits, the sensors, the mob and the rocket. It does not
+import pyglet, so the game can be run without a window, for example to test
+it or to time many ticks of it.
+
+Drawing is left to listeners added with `Model.subscribe()`. They are told
+which sectors changed after every edit, and when structures are lifted out of
+the world or put back, and rebuild their meshes from `Model.snapshot()`.
+
+"""
+
+from __future__ import division
+import sys, os
+import math
+import random
+import collections
+import contextlib
+
+# custom classes in other files
+# -----------------------------
+import AI_class
+import autosave
+import blocks
+import chunks
+import residency
+import sensors
+import structures
+import terrain
+import worldfile
+# -----------------------------
+
+
+# Size of sectors used to ease block loading.
+SECTOR_SIZE = 16
+
+# Store the world in NumPy chunks (one small array per sector) instead of a
+# plain dict. Needs NumPy.
+USE_CHUNKS = chunks.numpy is not None
+
+# Changed sectors are saved to the region store AUTOSAVE_PATH in the
+# background by `Model.autosave()`.
+AUTOSAVE_PATH = 'autosave'
+
+# With INFINITE_WORLD the world has no edge and each sector is made by a
+# terrain.NoiseTerrain the first time it is shown. Needs NumPy.
+INFINITE_WORLD = False
+
+# Chunks further than PAGE_RADIUS sectors from the player, and the least
+# recently used ones once more than PAGE_BUDGET bytes of chunks are in memory,
+# are paged out to a directory of each Model's own made in PAGE_PATH, or in
+# the system's temporary directory when it is None, and read back when they
+# are used again. None turns a limit off.
+PAGE_PATH = None
+PAGE_RADIUS = None
+PAGE_BUDGET = None
+
+# Seed of the generated terrain, None for a new world every start.
+WORLD_SEED = None
+
+if sys.version_info[0] >= 3:
+    xrange = range
+
+
+# changed n=4 to n=8 to allow for more textures
+def tex_coord(x, y, n=8):
+    """ Return the bounding vertices of the texture square.
+
+    """
+    m = 1.0 / n
+    dx = x * m
+    dy = y * m
+    return dx, dy, dx + m, dy, dx + m, dy + m, dx, dy + m
+
+
+def tex_coords(top, bottom, side):
+    """ Return a list of the texture squares for the top, bottom and side.
+
+    """
+    top = tex_coord(*top)
+    bottom = tex_coord(*bottom)
+    side = tex_coord(*side)
+    result = []
+    result.extend(top)
+    result.extend(bottom)
+    result.extend(side * 4)
+    return result
+
+
+# Each block type is registered once and gets a small integer id. The world
+# stores these ids; `blocks` has the name, texture and flags for each id.
+BASIC = blocks.BREAKABLE | blocks.SOLID
+
+#                                   top,   bottom,  side
+# basic blocks
+GRASS = blocks.register("Grass", tex_coords((1, 0), (0, 1), (0, 0)), BASIC)
+SAND = blocks.register("Sand", tex_coords((1, 1), (1, 1), (1, 1)), BASIC)
+BRICK = blocks.register("Brick", tex_coords((2, 0), (2, 0), (2, 0)), BASIC)
+STONE = blocks.register("Stone", tex_coords((2, 1), (2, 1), (2, 1)),
+                        blocks.SOLID)
+MOB_STATE1 = blocks.register("Mob 1", tex_coords((2, 1), (2, 1), (0, 3)),
+                             blocks.SOLID)
+MOB_STATE2 = blocks.register("Mob 2", tex_coords((2, 1), (2, 1), (1, 3)),
+                             blocks.SOLID)
+SAT_PIECE = blocks.register("Satellite Piece",
+                            tex_coords((2, 1), (2, 1), (2, 3)), blocks.SOLID)
+HEART_1 = blocks.register("Half Heart", tex_coords((2,1), (2,1), (3,2)),
+                          BASIC | blocks.PICKUP)
+HEART_2 = blocks.register("Heart", tex_coords((2,1), (2,1), (3,3)),
+                          BASIC | blocks.PICKUP)
+
+# composite blocks
+COMPOSITE_FLAGS = blocks.COMPOSITE | blocks.SOLID
+COMPOSITE_RED = blocks.register("Composite Red",
+    tex_coords((3, 1), (3, 1), (3, 1)), COMPOSITE_FLAGS)
+COMPOSITE_BLUE = blocks.register("Composite Blue",
+    tex_coords((3, 0), (3, 0), (3, 0)), COMPOSITE_FLAGS)
+COMPOSITE_BLACK = blocks.register("Composite Black",
+    tex_coords((0, 2), (0, 2), (0, 2)), COMPOSITE_FLAGS)
+COMPOSITE_GREY = blocks.register("Composite Grey",
+    tex_coords((1, 2), (1, 2), (1, 2)), COMPOSITE_FLAGS)
+COMPOSITE_GREEN = blocks.register("Composite Green",
+    tex_coords((2, 2), (2, 2), (2, 2)), COMPOSITE_FLAGS)
+# used by nmusaf.txt. The story textures have no squares of their own for
+# these, they are drawn with the brick and the yellow ELECH squares.
+EPR_BRICK = blocks.register("EPR Brick",
+    tex_coords((2, 0), (2, 0), (2, 0)), COMPOSITE_FLAGS)
+COMPOSITE_YELLOW = blocks.register("Composite Yellow",
+    tex_coords((2, 5), (2, 5), (2, 5)), COMPOSITE_FLAGS)
+
+# green creeper blocks
+CREEPER_FLAGS = blocks.CREEPER | blocks.SOLID
+CREEPER_HEAD = blocks.register("Creeper Head",
+    tex_coords((4, 1), (4, 1), (4, 0)), CREEPER_FLAGS)
+CREEPER_BODY = blocks.register("Creeper Body",
+    tex_coords((4, 1), (4, 1), (4, 1)), CREEPER_FLAGS)
+
+# red creeper coutdown blocks
+CR_HEAD = blocks.register("Countdown Head",
+    tex_coords((4, 4), (4, 4), (4, 2)), CREEPER_FLAGS)
+CR_1 = blocks.register("Countdown 1", tex_coords((4, 4), (4, 4), (0, 4)),
+                       CREEPER_FLAGS)
+CR_2 = blocks.register("Countdown 2", tex_coords((4, 4), (4, 4), (1, 4)),
+                       CREEPER_FLAGS)
+CR_3 = blocks.register("Countdown 3", tex_coords((4, 4), (4, 4), (2, 4)),
+                       CREEPER_FLAGS)
+CR_4 = blocks.register("Countdown 4", tex_coords((4, 4), (4, 4), (3, 4)),
+                       CREEPER_FLAGS)
+CR_5 = blocks.register("Countdown 5", tex_coords((4, 4), (4, 4), (4, 3)),
+                       CREEPER_FLAGS)
+
+# neutralized creeper blocks, the mob can walk through these
+NC_HEAD = blocks.register("Neutralized Head",
+    tex_coords((5, 1), (5, 1), (5, 0)), blocks.CREEPER)
+NC_BODY = blocks.register("Neutralized Body",
+    tex_coords((5, 1), (5, 1), (5, 1)), blocks.CREEPER)
+
+# circuit blocks
+CIRCUIT_FLAGS = blocks.CIRCUIT | BASIC
+CABLE = blocks.register("Cable", tex_coords((1, 5), (1, 5), (1, 5)),
+                        CIRCUIT_FLAGS)
+ELECH = blocks.register("ELECH", tex_coords((2, 5), (2, 5), (2, 5)),
+                        CIRCUIT_FLAGS)
+ELECT = blocks.register("ELECT", tex_coords((0, 5), (0, 5), (0, 5)),
+                        CIRCUIT_FLAGS)
+
+# sensor blocks
+SENSOR_ACTIVE = blocks.register("Sensor Active",
+    tex_coords((4, 5), (4, 5), (4, 5)), blocks.SENSOR | blocks.SOLID)
+SENSOR_RED = blocks.register("Sensor Red",
+    tex_coords((3, 5), (3, 5), (3, 5)), blocks.SENSOR | blocks.SOLID)
+
+# all composite blocks, in the order used by the .txt structure files
+COMPOSITE = [COMPOSITE_RED, COMPOSITE_BLUE, COMPOSITE_BLACK, COMPOSITE_GREY, COMPOSITE_GREEN,
+             EPR_BRICK, COMPOSITE_YELLOW]
+
+FACES = [
+    ( 0, 1, 0),
+    ( 0,-1, 0),
+    (-1, 0, 0),
+    ( 1, 0, 0),
+    ( 0, 0, 1),
+    ( 0, 0,-1),
+]
+
+# Block types with any of these flags are few and far between, so the Model
+# keeps the positions of each of them in an index.
+INDEXED_FLAGS = (blocks.COMPOSITE | blocks.CIRCUIT | blocks.SENSOR |
+                 blocks.PICKUP | blocks.CREEPER)
+
+# OPPOSITE_BIT[i] is the face mask bit of the face opposite FACES[i].
+OPPOSITE_BIT = [1 << (i ^ 1) for i in xrange(len(FACES))]
+
+
+def normalize(position):
+    """ Accepts `position` of arbitrary precision and returns the block
+    containing that position.
+
+    Parameters
+    ----------
+    position : tuple of len 3
+
+    Returns
+    -------
+    block_position : tuple of ints of len 3
+
+    """
+    x, y, z = position
+    x, y, z = (int(round(x)), int(round(y)), int(round(z)))
+    return (x, y, z)
+
+
+def sectorize(position):
+    """ Returns a tuple representing the sector for the given `position`.
+
+    Parameters
+    ----------
+    position : tuple of len 3
+
+    Returns
+    -------
+    sector : tuple of len 3
+
+    """
+    x, y, z = normalize(position)
+    x, y, z = x // SECTOR_SIZE, y // SECTOR_SIZE, z // SECTOR_SIZE
+    return (x, 0, z)
+
+
+def sectors_around(sector, pad):
+    """ Return the set of sectors within `pad` sectors of `sector`.
+
+    """
+    result = set()
+    if not sector:
+        return result
+    x, y, z = sector
+    for dx in xrange(-pad, pad + 1):
+        for dy in [0]:  # xrange(-pad, pad + 1):
+            for dz in xrange(-pad, pad + 1):
+                if dx ** 2 + dy ** 2 + dz ** 2 > (pad + 1) ** 2:
+                    continue
+                result.add((x + dx, y + dy, z + dz))
+    return result
+
+
+class Model(object):
+
+    def __init__(self, seed=None, size=80):
+        # seed of the terrain, WORLD_SEED when None.
+        if seed is None:
+            seed = WORLD_SEED
+
+        # Objects told about changes to the world, see `subscribe()`.
+        self.listeners = []
+
+        # A mapping from position to the id of the block at that position.
+        # This defines all the blocks that are currently in the world.
+        self.chunked = USE_CHUNKS
+        if self.chunked:
+            self.world = chunks.ChunkWorld(SECTOR_SIZE, FACES)
+        else:
+            self.world = {}
+
+        # Mapping from position to a 6 bit mask of the visible faces of the
+        # block there. Bit i is set when the neighbour at FACES[i] is empty.
+        if self.chunked:
+            self.faces = self.world.faces
+        else:
+            self.faces = {}
+
+        # Pages chunks out to disk and back in, see `page_out()`.
+        self.residency = None
+        if self.chunked and (PAGE_RADIUS is not None or
+                             PAGE_BUDGET is not None):
+            self.residency = residency.Residency(
+                self.world, PAGE_PATH, blocks.NAMES, blocks.IDS, PAGE_RADIUS,
+                PAGE_BUDGET, self._changed)
+
+        # Mapping from the id of each block type with one of INDEXED_FLAGS to
+        # the set of positions holding it.
+        self.index = {}
+
+        # How many blocks of each type are in the world, by id.
+        self.type_counts = collections.Counter()
+
+        self.sensors = []
+
+        self.added_elech = False
+
+        # Mapping from the directory of each region store saved to, by
+        # `save_region()` or `autosave()`, to the set of sectors whose blocks
+        # changed since the last save there.
+        self.unsaved = {}
+
+        # Saves snapshots in the background, see `autosave()`.
+        self.saver = None
+
+        # How many `bulk_edit()` blocks are open, and the positions changed
+        # inside them whose faces still have to be updated.
+        self._bulk = 0
+        self._edited = set()
+
+        # Mapping from sector to the set of positions inside that sector.
+        if self.chunked:
+            self.sectors = self.world.sectors
+        else:
+            self.sectors = {}
+
+        self.rocket_loaded = False
+        self.rocket_health = 1
+
+        # Blocks lifted out of the world to move as one, see `lift()`.
+        self.structures = []
+
+        # The structure holding the rocket once it is launched.
+        self.rocket = None
+
+        self.mob_loaded = False
+
+        self.mob_mode = "1"
+
+        self.mob_x_position = 0
+
+        self.mob_z_position = 0
+
+        #need for when jumping
+        self.mob_y_position = -1
+
+        self.mob_update_count = 0
+
+        self.mob_frames = 33
+
+        # AI for running or following
+        self.ai = AI_class.AI()
+
+        # satellite pieces
+        self.sat_pieces = []
+
+        self.trapped = False
+
+        self.rocket_launched = False
+        self.rocket_count = 0
+        self.rocket_altitude = 0
+
+        # Health of the player, from 0 to 10 in halves, see `set_health()`,
+        # and the ticks since the mob last hurt the player.
+        self.health = 10.0
+        self.count_injure = 91
+
+        # How many satellite pieces the player collected.
+        self.count_sat = 0
+
+        # The floor, outer walls and hills of the world.
+        # `size` is half its width and depth.
+        self.terrain = terrain.Terrain(seed, GRASS, STONE,
+                                       [GRASS, SAND, BRICK], n=size)
+
+        # Makes the chunk of a sector the first time it is needed when the
+        # world has no edge, see `needs()`.
+        self.generator = None
+        if INFINITE_WORLD and self.chunked:
+            self.generator = terrain.NoiseTerrain(seed, GRASS, STONE,
+                                                  [GRASS, SAND, BRICK])
+
+        # Sectors holding the generator's blocks unchanged. They are
+        # forgotten when hidden and made again when next shown.
+        self.untouched = set()
+
+        self._initialize()
+
+        # creepers, brought out one at a time by `load_creeper()`.
+        self.creeper = [AI_class.Creeper(self.world),
+                        AI_class.Creeper(self.world),
+                        AI_class.Creeper(self.world),
+                        AI_class.Creeper(self.world),
+                        AI_class.Creeper(self.world)]
+        for i in range(0, 5):
+            for j in range(i + 1, 5):
+                pos_i = (self.creeper[i].pos_x,
+                         self.creeper[i].pos_y,
+                         self.creeper[i].pos_z)
+                pos_j = (self.creeper[j].pos_x,
+                         self.creeper[j].pos_y,
+                         self.creeper[j].pos_z)
+                dist = 0.0
+                for k in range(0, 3):
+                    dist += (pos_j[k] - pos_i[k])**2
+                dist = math.sqrt(dist)
+                if dist < 5:
+                    self.creeper[j] = AI_class.Creeper(self.world)
+                    j -= 1
+        self.creeper_count = 0
+
+    def _initialize(self):
+        """ Initialize the world by placing all the blocks.
+
+        """
+        with self.bulk_edit():
+            if self.generator is not None:
+                # sectors are made as they are shown, but the ones the
+                # satellite pieces land on are needed now.
+                rng = self._satellite_random()
+                for i in xrange(6):
+                    sector = sectorize((rng.randint(-75, 75), 0,
+                                        rng.randint(-75, 75)))
+                    if self.needs(sector):
+                        self.make(sector)
+            elif self.chunked:
+                self._load_chunks(self.terrain.chunks(SECTOR_SIZE))
+            else:
+                for position, block in self.terrain.generate().items():
+                    self.add_block(position, block, immediate=False)
+
+            # randomly place pieces of satellite around map
+            rng = self._satellite_random()
+            for i in xrange(6):
+                x = rng.randint(-75, 75)
+                z = rng.randint(-75, 75)
+                y = -1
+                pos = (x, y, z)
+                while pos in self.world:
+                    y += 1
+                    pos = (x, y, z)
+                self.add_block(pos, SAT_PIECE, immediate=False)
+                self.sat_pieces.append(pos)
+
+    def _satellite_random(self):
+        """ Return the random number generator placing the satellite pieces,
+        the same for the same seed but apart from the terrain's.
+
+        """
+        return random.Random('satellite %d' % (self.generator or
+                                               self.terrain).seed)
+
+    def subscribe(self, listener):
+        """ Tell `listener` about changes to the world from now on. It needs
+        these methods:
+
+            blocks_changed(sectors)
+                The blocks of `sectors`, or of every sector when None, or
+                which of their faces can be seen, changed.
+            structure_added(structure)
+                `structure` was lifted out of the world by `lift()`.
+            structure_removed(structure)
+                `structure` was put back into the world by `settle()`.
+
+        """
+        self.listeners.append(listener)
+
+    def _changed(self, sectors):
+        """ Tell the listeners the blocks of `sectors` changed.
+
+        """
+        for listener in self.listeners:
+            listener.blocks_changed(sectors)
+
+    def mob_move_right(self):
+        """ Function to move the mob right
+        """
+        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
+        self.mob_x_position += 1
+
+        if self.mob_mode == "1":
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+        else:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+
+    def mob_move_left(self):
+        """ Function to move the mob left
+        """
+        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
+        self.mob_x_position -= 1
+
+        if self.mob_mode == "1":
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+        else:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+
+    def mob_move_forward(self):
+        """ Function to move the mob forward
+        """
+        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
+        self.mob_z_position += 1
+
+        if self.mob_mode == "1":
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+        else:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+
+    def mob_move_backward(self):
+        """ Function to move the mob backward
+        """
+        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
+        self.mob_z_position -= 1
+
+        if self.mob_mode == "1":
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+        else:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+
+    #jump functions
+    def mob_move_up(self):
+        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
+        self.mob_y_position += 1
+
+        if self.mob_mode == "1":
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+        else:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+
+    def mob_move_down(self):
+        self.remove_block((self.mob_x_position, self.mob_y_position, self.mob_z_position))
+        self.mob_y_position -= 1
+
+        if self.mob_mode == "1":
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+        else:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE2)
+
+    def load_mob(self):
+        if not self.mob_loaded:
+            self.add_block((self.mob_x_position, self.mob_y_position, self.mob_z_position), MOB_STATE1)
+
+    def launch_mob(self):
+        if not self.mob_loaded:
+            self.add_block((self.mob_x_position, -1, self.mob_z_position), MOB_STATE1)
+            self.mob_loaded = True
+
+    def stop_mob(self):
+        if self.mob_loaded:
+            self.mob_loaded = False
+
+    def process_mob(self):
+        """
+            This function will process the mob and decide if it should
+            move left, right, forward, or backward
+        """
+
+        if self.mob_loaded and self.mob_update_count >= 128:
+            # adjust the mob
+            if self.mob_mode == "1":
+                self.mob_mode = "2"
+            elif self.mob_mode == "2":
+                self.mob_mode = "1"
+            self.mob_move_left()
+
+            self.mob_update_count = 0
+        else:
+            self.mob_update_count += 1
+
+        if self.mob_loaded and self.mob_update_count >= 128:
+            # adjust the mob
+            if self.mob_mode == "1":
+                self.mob_mode = "2"
+            elif self.mob_mode == "2":
+                self.mob_mode = "1"
+            self.mob_move_backward()
+
+            self.mob_update_count = 0
+        else:
+            self.mob_update_count += 1
+
+        if self.mob_loaded and self.mob_update_count >= 128:
+            # adjust the mob
+            if self.mob_mode == "1":
+                self.mob_mode = "2"
+            elif self.mob_mode == "2":
+                self.mob_mode = "1"
+            self.mob_move_right()
+
+            self.mob_update_count = 0
+        else:
+            self.mob_update_count += 1
+
+        if self.mob_loaded and self.mob_update_count >= 128:
+            # adjust the mob
+            if self.mob_mode == "1":
+                self.mob_mode = "2"
+            elif self.mob_mode == "2":
+                self.mob_mode = "1"
+            self.mob_move_forward()
+
+            self.mob_update_count = 0
+        else:
+            self.mob_update_count += 1
+
+    def tick(self, position):
+        """ Run one tick of the mob, the creepers and the sensors for a
+        player at `position`. Called TICKS_PER_SEC times a second by the
+        game, the AI counts its moves in ticks.
+
+        Returns
+        -------
+        position : tuple of len 3
+            The position of the player, carried up with the rocket once it
+            is launched.
+
+        """
+        self.move_mob(position)
+        self.check_mob_dist(position)
+        if self.ai.status:
+            self.collect_sat(position)
+        if self.check_sensors():
+            position = (10, self.rocket_altitude + 19, 2)
+        for creeper in self.creeper:
+            if creeper.status:
+                self.move_creeper(creeper, position)
+        return position
+
+    def set_health(self, h):
+        """ Set the health of the player to `h`, rounded to half a heart.
+
+        """
+        full = int(math.floor(h))
+        if float(h - full) < 0.35:
+            self.health = float(full)
+        elif float(h - full) < 0.65:
+            self.health = float(full) + 0.5
+        else:
+            self.health = float(full) + 1.0
+
+    def place(self, position, block):
+        """ Add `block` at `position` for the player. There can only be one
+        ELECH, and adding it turns the sensors red again.
+
+        """
+        if block != ELECH or not self.added_elech:
+            if block == ELECH:
+                self.added_elech = True
+                for i in self.sensors:
+                    i.status = False
+                    self.add_block(i.location, SENSOR_RED)
+            self.add_block(position, block)
+
+    def dig(self, position):
+        """ Remove the block at `position` for the player if it can be
+        broken. Hearts heal the player, and removing the ELECH turns the
+        sensors red again. Returns the type of the block.
+
+        """
+        block_type = self.block_at(position)
+        if block_type == HEART_1:
+            self.set_health(self.health + 0.5)
+        elif block_type == HEART_2:
+            self.set_health(self.health + 1.0)
+        if blocks.has(block_type, blocks.BREAKABLE):
+            self.remove_block(position)
+        if block_type == ELECH:
+            self.added_elech = False
+            for i in self.sensors:
+                i.activated = False
+                self.add_block(i.location, SENSOR_RED)
+        return block_type
+
+    def start_mob(self):
+        """ Put the mob into the world and have it follow the player.
+
+        """
+        if not self.mob_loaded:
+            self.mob_x_position = -5
+            self.mob_z_position = -5
+            self.mob_y_position = -1
+            pos = (self.mob_x_position,
+                   self.mob_y_position,
+                   self.mob_z_position)
+            while pos in self.world:
+                self.mob_y_position += 1
+                pos = (self.mob_x_position,
+                       self.mob_y_position,
+                       self.mob_z_position)
+            self.load_mob()
+            self.ai.mode = "follow"
+            self.ai.status = True
+            self.mob_loaded = True
+
+    def check_mob_dist(self, position):
+        if self.mob_loaded and not self.trapped:
+            dist = [abs(position[0] - self.mob_x_position),
+                abs(position[2] - self.mob_z_position),
+                abs(position[1] - self.mob_y_position)]
+            if not any(d > 1.25 for d in dist):
+                s = dist[0]**2 + dist[1]**2 + dist[2]**2
+                if s < 2.25 and self.count_injure > 90:
+                    self.set_health(max(0, self.health - 2))
+                    self.count_injure = 0
+                elif s > 2.25:
+                    self.count_injure = 91
+                else:
+                    self.count_injure += 1
+
+    def collect_sat(self, position):
+        # make satellite piece dispear from map and from world
+        index = 0
+        for i in self.sat_pieces:
+            dist = (position[0] - i[0])**2 + (position[1] - i[1])**2 + (position[2] - i[2])**2
+            if dist < 1.56:
+                self.remove_block(i)
+                del self.sat_pieces[index]
+                self.count_sat += 1
+                self.mob_frames -= 3
+            index += 1
+
+    # returns whether or not a position is available
+    # returns true if available, false if not
+    def check_avail(self, pos):
+        return not blocks.has(self.block_at(pos, 0), blocks.SOLID)
+
+    def move_mob(self, position):
+        moved_up = False
+        if self.ai.status and self.ai.count >= self.mob_frames:
+            # forward backward left right
+            if self.ai.mode == "follow":
+                out = self.ai.follow(self.mob_x_position,
+                                     self.mob_z_position,
+                                     position[0],
+                                     position[2])
+            elif self.ai.mode == "run":
+                out = self.ai.run_away(self.mob_x_position,
+                                       self.mob_z_position,
+                                       position[0],
+                                       position[2])
+            if out[0]:
+                pos = (self.mob_x_position,
+                       self.mob_y_position,
+                       self.mob_z_position+1)
+                # check if square in front not available
+                if not self.check_avail(pos):
+                    # check if one square up avaiable
+                    pos = (pos[0], pos[1]+1, pos[2])
+                    # if yes
+                        # go there
+                    if self.check_avail(pos):
+                        self.mob_move_up()
+                        self.mob_move_forward()
+                        moved_up = True
+                    # else
+                        # don't move
+                else:
+                    self.mob_move_forward()
+            elif out[1]:
+                pos = (self.mob_x_position,
+                       self.mob_y_position,
+                       self.mob_z_position-1)
+                if not self.check_avail(pos):
+                    pos = (pos[0], pos[1]+1, pos[2])
+                    if self.check_avail(pos):
+                        self.mob_move_up()
+                        self.mob_move_backward()
+                        moved_up = True
+                else:
+                    self.mob_move_backward()
+            if out[2]:
+                pos = (self.mob_x_position-1,
+                       self.mob_y_position,
+                       self.mob_z_position)
+                if not self.check_avail(pos):
+                    pos = (pos[0], pos[1]+1, pos[2])
+                    if self.check_avail(pos):
+                        self.mob_move_up()
+                        self.mob_move_left()
+                        moved_up = True
+                else:
+                    self.mob_move_left()
+            elif out[3]:
+                pos = (self.mob_x_position+1,
+                       self.mob_y_position,
+                       self.mob_z_position)
+                if not self.check_avail(pos):
+                    pos = (pos[0], pos[1]+1, pos[2])
+                    if self.check_avail(pos):
+                        self.mob_move_up()
+                        self.mob_move_right()
+                        moved_up = True
+                else:
+                    self.mob_move_right()
+
+            # make sure mob isn't floating
+            pos = (self.mob_x_position,
+                       self.mob_y_position-1,
+                       self.mob_z_position)
+
+            while (self.check_avail(pos) and pos[1] >= -2 and not moved_up):
+                self.mob_move_down()
+                pos = (self.mob_x_position,
+                       self.mob_y_position-1,
+                       self.mob_z_position)
+
+            self.ai.count = 0
+        else:
+            self.ai.count += 1
+
+    def move_creeper(self, creeper, position):
+        """ Move `creeper` towards the rocket, or count it down and blow it
+        up there, hurting a player at `position` close by.
+
+        """
+        at_target = False
+        dist = (creeper.pos_x - creeper.target[0])**2 + \
+        (creeper.pos_z - creeper.target[2])**2
+        if dist <= 3.125:
+            at_target = True
+        if creeper.count >= creeper.frames and creeper.status \
+        and not at_target:
+            # if at target position then need to continue or start countdown
+            # remove from previous position
+            pos_body = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
+            pos_head = (pos_body[0], pos_body[1] + 1, pos_body[2])
+
+            # add to new position
+            creeper.follow(self.world)
+            pos = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
+            # if the creeper moved
+            if pos != pos_body:
+                # remove blocks from previous position
+                self.remove_block(pos_body)
+                self.remove_block(pos_head)
+                # add blocks to new position
+                self.add_block(pos, CREEPER_BODY)
+                pos = (pos[0], pos[1] + 1, pos[2])
+                self.add_block(pos, CREEPER_HEAD)
+            creeper.count = 0
+        else:
+            creeper.count += 1
+
+        #check for explosion
+        if at_target:
+            type = creeper.explode()
+            pos = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
+            pos_head = (pos[0], pos[1] + 1, pos[2])
+            if type == "boom":
+                print(type)
+                self.rocket_health = round(self.rocket_health - 0.2, 1)
+                self.rocket_health = max(0, self.rocket_health)
+                pos = (creeper.pos_x, creeper.pos_y, creeper.pos_z)
+                self.remove_block(pos)
+                self.remove_block((pos[0], pos[1] + 1, pos[2]))
+                creeper.status = False
+                if self.creeper_count < 5:
+                    self.creeper[self.creeper_count].status = True
+                    pos = (self.creeper[self.creeper_count].pos_x,
+                           self.creeper[self.creeper_count].pos_y,
+                           self.creeper[self.creeper_count].pos_z)
+                    self.creeper_count += 1
+                    self.add_block(pos, CREEPER_BODY)
+                    pos = (pos[0], pos[1] + 1, pos[2])
+                    self.add_block(pos, CREEPER_HEAD)
+                dist = (position[0] - creeper.pos_x)**2 + (position[1]
+                        - creeper.pos_y)**2 + (position[2] - creeper.pos_z)**2
+                if dist < 25:
+                    self.set_health(max(0, self.health - 3))
+            elif type == "5":
+                self.add_block(pos, CR_5)
+                self.add_block(pos_head, CR_HEAD)
+            elif type == "4":
+                self.add_block(pos, CR_4)
+            elif type == "3":
+                self.add_block(pos, CR_3)
+            elif type == "2":
+                self.add_block(pos, CR_2)
+            elif type == "1":
+                self.add_block(pos, CR_1)
+
+    def load_creeper(self, position):
+        """ Bring out the next creeper, for a player at `position`.
+
+        """
+        if self.creeper_count < 5:
+            self.creeper[self.creeper_count].status = True
+            pos = (self.creeper[self.creeper_count].pos_x,
+                   self.creeper[self.creeper_count].pos_y,
+                   self.creeper[self.creeper_count].pos_z)
+            self.add_block(pos, CREEPER_BODY)
+            pos = (pos[0], pos[1] + 1, pos[2])
+            self.add_block(pos, CREEPER_HEAD)
+            self.creeper_count += 1
+            self.move_creeper(self.creeper[self.creeper_count - 1], position)
+
+    def neutralize(self, block, position):
+        """ Neutralize the creeper whose head or body is at `block`, and
+        bring out the next one, for a player at `position`.
+
+        """
+        x, y, z = block
+        pos = (-5, -5, -5)
+        if self.block_at(block) in [CR_HEAD, CREEPER_HEAD]:
+            # have head selected
+            pos = (x, y - 1, z)
+        elif blocks.has(self.block_at(block), blocks.CREEPER):
+            # have body selected
+            pos = (x, y, z)
+        if pos != (-5, -5, -5):
+            for i in self.creeper:
+                p = (i.pos_x, i.pos_y, i.pos_z)
+                if pos == p:
+                    i.status = False
+                    self.add_block(pos, NC_BODY)
+                    pos = (pos[0], pos[1] + 1, pos[2])
+                    self.add_block(pos, NC_HEAD)
+                    self.load_creeper(position)
+
+    def creepers_safe(self):
+        """ Returns True once every creeper was brought out and none is
+        left.
+
+        """
+        return self.creeper_count == 5 and \
+            not any(i.status for i in self.creeper)
+
+    def check_sensors(self):
+        """ Once the creepers are safe, put the sensors around the rocket
+        and launch it when all of them are activated. Returns True when the
+        rocket moved up.
+
+        """
+        moved = False
+        if not self.creepers_safe():
+            return moved
+        if len(self.sensors) < 4:
+            self.sensors.append(sensors.Sensor((10, -1, -6)))
+            self.add_block((10, -1, -6), SENSOR_RED)
+            self.sensors.append(sensors.Sensor((18, -1, 2)))
+            self.add_block((18, -1, 2), SENSOR_RED)
+            self.sensors.append(sensors.Sensor((10, -1, 10)))
+            self.add_block((10, -1, 10), SENSOR_RED)
+            self.sensors.append(sensors.Sensor((2, -1, 2)))
+            self.add_block((2, -1, 2), SENSOR_RED)
+        count_active = 0
+        for i in self.sensors:
+            i.check_status(self.world, ELECH)
+            if i.activated:
+                count_active += 1
+                if self.world[i.location] != SENSOR_ACTIVE:
+                    self.add_block(i.location, SENSOR_ACTIVE)
+            if count_active == 4:
+                moved = self.launch_rocket()
+        return moved
+
+    def launch_rocket(self):
+        """ Launch the rocket, and move it up every few ticks. Returns True
+        when it moved.
+
+        """
+        moved = False
+        if not self.rocket_launched:
+            self.rocket_launched = True
+            # place steve at top of rocket
+        if self.rocket_count > 8:
+            self.rocket_count = 0
+            self.move_rocket_up()
+            moved = True
+        self.rocket_count += 1
+        return moved
+
+    def move_rocket_up(self):
+        """
+            0) the first time, lift all the composite blocks out of the world
+            into a structure with a mesh of its own.
+            1) move the structure up by one block, which only changes the
+            offset it is drawn at.
+        """
+        if self.rocket is None:
+            composite = self.positions_with(blocks.COMPOSITE)
+            self.rocket = self.lift(composite)
+        self.move_structure(self.rocket, 0, 1, 0)
+        self.rocket_altitude += 1
+
+    def place_health(self):
+        """ Put three hearts at random places on the floor. Returns the
+        position and type of each.
+
+        """
+        placed = []
+        for i in xrange(3):
+            x = random.randint(-60, 60)
+            z = random.randint(-60, 60)
+            y = -1
+            while (x, y, z) in self.world:
+                y += 1
+            if random.randint(1, 2) == 1:
+                block_type = HEART_1
+            else:
+                block_type = HEART_2
+            self.add_block((x, y, z), block_type)
+            placed.append(((x, y, z), block_type))
+        return placed
+
+    def hit_test(self, position, vector, max_distance=8):
+        """ Line of sight search from current position. If a block is
+        intersected it is returned, along with the block previously in the line
+        of sight. If no block is found, return None, None.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position to check visibility from.
+        vector : tuple of len 3
+            The line of sight vector.
+        max_distance : int
+            How many blocks away to search for a hit.
+
+        """
+        m = 8
+        x, y, z = position
+        dx, dy, dz = vector
+        previous = None
+        for _ in xrange(max_distance * m):
+            key = normalize((x, y, z))
+            if key != previous and self.occupied(key):
+                return key, previous
+            previous = key
+            x, y, z = x + dx / m, y + dy / m, z + dz / m
+        return None, None
+
+    def neighbor(self, position):
+        x, y, z = position
+        local = set()
+        for dx in [-1, 0, 1]:  #if (dx is within [-1,0,1]) is true
+            for dy in [-1, 0, 1]:
+                for dz in [-1, 0, 1]:  #if (dz is within [-1,0,1]) is true then key = (x+dx,y,z+dz)
+                    key = (x + dx, y + dy, z + dz)
+                    local.add(key)
+        return(local)
+
+    def add_blocks(self, positions, block_types):
+        """ Add many blocks at once, inside one `bulk_edit()`. With NumPy
+        chunks the blocks go into each chunk with one array assignment.
+
+        Parameters
+        ----------
+        positions : (N, 3) array or list of tuples
+            The (x, y, z) positions of the blocks to add.
+        block_types : (N,) array or list
+            The id of the block type to add at each position.
+
+        """
+        with self.bulk_edit():
+            if not self.chunked:
+                if hasattr(positions, 'tolist'):
+                    positions = positions.tolist()
+                    block_types = block_types.tolist()
+                for position, block in zip(positions, block_types):
+                    self.add_block(tuple(position), block)
+                return
+            numpy = chunks.numpy
+            kept, old = self.world.set_many(positions, block_types)
+            # a repeated position only counts once, with its last type.
+            block_types = numpy.asarray(block_types, dtype=numpy.uint8)[kept]
+            positions = numpy.asarray(positions).reshape(-1, 3)[kept]
+            positions = [tuple(position) for position in positions.tolist()]
+            self._edited.update(positions)
+            self.type_counts.update(block_types.tolist())
+            self.type_counts.subtract(old[old != 0].tolist())
+            # replaced blocks leave the index before the new ones go in.
+            flags = numpy.array(blocks.FLAGS)
+            for i in numpy.nonzero(flags[old] & INDEXED_FLAGS)[0].tolist():
+                self.index[int(old[i])].discard(positions[i])
+            for i in numpy.nonzero(flags[block_types] &
+                                   INDEXED_FLAGS)[0].tolist():
+                self.index.setdefault(int(block_types[i]), set()).add(
+                    positions[i])
+
+    def positions_in(self, low, high):
+        """ Return the positions of the blocks in the box from `low` to
+        `high` (inclusive).
+
+        """
+        if self.chunked:
+            return self.world.positions_in(low, high)
+        (x0, y0, z0), (x1, y1, z1) = low, high
+        return [(x, y, z) for x in xrange(x0, x1 + 1)
+                for y in xrange(y0, y1 + 1) for z in xrange(z0, z1 + 1)
+                if (x, y, z) in self.world]
+
+    @property
+    def circuit(self):
+        """ Mapping from position to block id of all circuit blocks, built
+        from the index.
+
+        """
+        return dict((position, block)
+                    for block in blocks.having(blocks.CIRCUIT)
+                    for position in self.index.get(block, ()))
+
+    def positions_of(self, block):
+        """ Return the positions of all blocks of type `block`. Costs as
+        much as the number of matches for types with one of INDEXED_FLAGS,
+        and one pass over the world (an array pass per chunk with NumPy
+        chunks) for the others.
+
+        """
+        if blocks.has(block, INDEXED_FLAGS):
+            return list(self.index.get(block, ()))
+        if self.chunked:
+            return self.world.positions_of(block)
+        return [position for position, other in self.world.items()
+                if other == block]
+
+    def positions_with(self, flag):
+        """ Return the positions of all blocks whose type has `flag`.
+
+        """
+        result = []
+        for block in blocks.having(flag):
+            result.extend(self.positions_of(block))
+        return result
+
+    def count_of(self, block):
+        """ Return how many blocks of type `block` are in the world.
+
+        """
+        return self.type_counts[block]
+
+    def circuit_change(self):
+        circuit = self.circuit
+        count_h = {}
+        to_cable = set()
+        to_elect = set()
+        to_elech = set()
+        elech_safe = set()
+        check_elech = False
+        for position in circuit:
+            if circuit[position] == ELECH:
+                check_elech = True
+            if position not in count_h:
+                count_h[position] = 0
+            if circuit[position] == ELECT:
+                to_cable.add(position)
+            elif circuit[position] == ELECH:
+                local = self.neighbor(position)
+                for pos in local:
+                    if pos in circuit and circuit[pos] == CABLE:
+                        if pos not in count_h:
+                            count_h[pos] = 0
+                        count_h[pos] += 1
+                        if count_h[pos] <= 2:
+                            to_elech.add(pos)
+                        elif pos in to_elech:
+                            to_elech.remove(pos)
+                to_elect.add(position)
+        for position in to_elect:
+            self.add_block(position, ELECT)
+        for position in to_elech:
+                self.add_block(position, ELECH)
+        for position in to_cable:
+            self.add_block(position, CABLE)
+
+        if not check_elech:
+            self.added_elech = False
+
+    def exposed(self, position):
+        """ Returns False is given `position` is surrounded on all 6 sides by
+        blocks, True otherwise.
+
+        """
+        return self.faces.get(position, 0) != 0
+
+    def _exposed_in(self, sector):
+        """ Returns the positions in `sector` with at least one visible face.
+
+        """
+        if self.chunked:
+            return self.world.exposed_positions(sector)
+        return [position for position in self.sectors.get(sector, [])
+                if self.faces[position]]
+
+    def add_block(self, position, block, immediate=True):
+        """ Add a block of type `block` at the given `position` to the world.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position of the block to add.
+        block : int
+            The id of the block type. Use `blocks.register()` to create.
+        immediate : bool
+            Whether or not to draw the block immediately.
+
+        """
+        if position in self.world:
+            self.remove_block(position, immediate)
+        self.world[position] = block
+        if not self.chunked:
+            self.sectors.setdefault(sectorize(position), set()).add(position)
+        if self._bulk:
+            self._edited.add(position)
+        else:
+            # a new block hides the touching face of each neighbour.
+            x, y, z = position
+            mask = 0
+            for i, (dx, dy, dz) in enumerate(FACES):
+                key = (x + dx, y + dy, z + dz)
+                if key in self.world:
+                    self.faces[key] &= ~OPPOSITE_BIT[i]
+                else:
+                    mask |= 1 << i
+            self.faces[position] = mask
+            self._touch(sectorize(position))
+            if immediate:
+                self.check_neighbors(position)
+        self.type_counts[block] += 1
+        if blocks.has(block, INDEXED_FLAGS):
+            self.index.setdefault(block, set()).add(position)
+
+    def remove_block(self, position, immediate=True):
+        """ Remove the block at the given `position`.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position of the block to remove.
+        immediate : bool
+            Whether or not to immediately remove block from canvas.
+
+        """
+        block = self.world[position]
+        del self.world[position]
+        # blocks added inside bulk_edit() have no mask yet.
+        self.faces.pop(position, None)
+        if not self.chunked:
+            self.sectors[sectorize(position)].discard(position)
+        if self._bulk:
+            self._edited.add(position)
+        else:
+            # the neighbours' faces touching this block are visible again.
+            x, y, z = position
+            for i, (dx, dy, dz) in enumerate(FACES):
+                key = (x + dx, y + dy, z + dz)
+                if key in self.world:
+                    self.faces[key] |= OPPOSITE_BIT[i]
+            self._touch(sectorize(position))
+            if immediate:
+                self.check_neighbors(position)
+        self.type_counts[block] -= 1
+        if block in self.index:
+            self.index[block].discard(position)
+
+    @contextlib.contextmanager
+    def bulk_edit(self):
+        """ Context manager for changing many blocks at once. Inside it
+        add_block() and remove_block() only update the world, and the face
+        masks around all the changed positions are recomputed in one pass
+        when the outermost block ends. Each sector touched is then rebuilt
+        once.
+
+            with model.bulk_edit():
+                for position in positions:
+                    model.add_block(position, SAND)
+
+        """
+        self._bulk += 1
+        try:
+            yield self
+        finally:
+            self._bulk -= 1
+            if not self._bulk:
+                self._commit_edits()
+
+    def _touch(self, sector):
+        """ Note that the blocks of `sector` changed.
+
+        """
+        for unsaved in self.unsaved.values():
+            unsaved.add(sector)
+        self.untouched.discard(sector)
+
+    def _commit_edits(self):
+        """ Update the face masks around the positions changed inside
+        `bulk_edit()` and tell the listeners about their sectors.
+
+        """
+        edited, self._edited = self._edited, set()
+        sectors = set()
+        for x, y, z in edited:
+            self._touch((x // SECTOR_SIZE, 0, z // SECTOR_SIZE))
+            for dx, dz in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+                sectors.add(((x + dx) // SECTOR_SIZE, 0,
+                             (z + dz) // SECTOR_SIZE))
+        if self.chunked:
+            # one array pass per sector beats a lookup per neighbour.
+            self.world.refresh_faces(sectors)
+        else:
+            around = set(edited)
+            for x, y, z in edited:
+                for dx, dy, dz in FACES:
+                    around.add((x + dx, y + dy, z + dz))
+            for position in around:
+                if position in self.world:
+                    self.faces[position] = self._mask(position)
+        if sectors:
+            self._changed(sectors)
+
+    def _mask(self, position):
+        """ Return the visible face mask of a block at `position`.
+
+        """
+        x, y, z = position
+        mask = 0
+        for i, (dx, dy, dz) in enumerate(FACES):
+            if (x + dx, y + dy, z + dz) not in self.world:
+                mask |= 1 << i
+        return mask
+
+    def check_neighbors(self, position):
+        """ Tell the listeners the sectors containing `position` and the
+        blocks surrounding it changed, so their meshes are rebuilt with the
+        faces that can now be seen. Usually used after a block is added or
+        removed.
+
+        """
+        x, y, z = position
+        self._changed(set(((x + dx) // SECTOR_SIZE, 0, (z + dz) // SECTOR_SIZE)
+                          for dx, dz in ((0, 0), (-1, 0), (1, 0), (0, -1),
+                                         (0, 1))))
+
+    def snapshot(self, sector):
+        """ Return the positions, face masks and block ids of the exposed
+        blocks in `sector`.
+
+        """
+        if self.chunked:
+            return self.world.snapshot(sector)
+        positions = self._exposed_in(sector)
+        return (positions, [self.faces[p] for p in positions],
+                [self.world[p] for p in positions])
+
+    def needs(self, sector):
+        """ Returns True when the world has no edge and the chunk of `sector`
+        is still to be made by the generator, see `make()` and
+        `add_chunk()`.
+
+        """
+        return self.generator is not None and \
+            self.world.chunk(sector) is None
+
+    def make(self, sector):
+        """ Make the chunk of `sector` with the generator now.
+
+        """
+        self.add_chunk(sector, *self.generator.chunk(sector, SECTOR_SIZE))
+
+    def add_chunk(self, sector, y0, ids):
+        """ Put the generated chunk `ids` with its bottom layer at height
+        `y0` into the world as the blocks of `sector`. The chunk can be made
+        elsewhere, for example on a worker, with
+        `generator.chunk(sector, SECTOR_SIZE)`. Raises ValueError if the
+        sector already has blocks; check `needs(sector)` first.
+
+        """
+        if self.world.chunk(sector) is not None:
+            raise ValueError("sector %r is already made" % (sector,))
+        self.world.put_chunk(sector, y0, ids)
+        self._count_chunk(sector, 1)
+        self.untouched.add(sector)
+        self._refresh_around(sector)
+
+    def release(self, sector):
+        """ Forget the chunk of `sector` if it still holds the generator's
+        blocks unchanged, as it can be made again. Called when the sector is
+        no longer shown.
+
+        """
+        if sector in self.untouched:
+            self._drop_chunk(sector)
+
+    def _drop_chunk(self, sector):
+        """ Forget the blocks of `sector`.
+
+        """
+        self._count_chunk(sector, -1)
+        self.world.drop_chunk(sector)
+        if self.residency is not None:
+            self.residency.forget(sector)
+        self.untouched.discard(sector)
+        self._refresh_around(sector)
+
+    def _count_chunk(self, sector, sign):
+        """ Add (`sign` 1) or remove (`sign` -1) the blocks of the chunk of
+        `sector` to or from `type_counts` and the index.
+
+        """
+        for block, count in self.world.counts([sector]).items():
+            self.type_counts[block] += sign * count
+            if blocks.has(block, INDEXED_FLAGS):
+                positions = self.world.positions_of(block, [sector])
+                if sign > 0:
+                    self.index.setdefault(block, set()).update(positions)
+                else:
+                    self.index[block].difference_update(positions)
+
+    def _refresh_around(self, sector):
+        """ Recompute the face masks of `sector` and the sectors beside it
+        after its chunk was added or dropped.
+
+        """
+        x, _, z = sector
+        around = [sector, (x - 1, 0, z), (x + 1, 0, z), (x, 0, z - 1),
+                  (x, 0, z + 1)]
+        self.world.refresh_faces(around)
+        self._changed(around[1:])
+
+    def lift(self, positions):
+        """ Take the blocks at `positions` out of the world and return them
+        as a `structures.Structure` that can be moved with
+        `move_structure()`. The listeners are told, so they can give the
+        structure a mesh of its own.
+
+        """
+        with self.bulk_edit():
+            found = {}
+            for position in positions:
+                found[position] = self.world[position]
+                self.remove_block(position)
+        structure = structures.Structure(found)
+        self.structures.append(structure)
+        for listener in self.listeners:
+            listener.structure_added(structure)
+        return structure
+
+    def move_structure(self, structure, dx, dy, dz):
+        """ Move `structure` by `dx`, `dy`, `dz` blocks. Only its offset
+        changes, so this costs the same for any size of structure.
+
+        """
+        structure.move(dx, dy, dz)
+
+    def settle(self, structure):
+        """ Put the blocks of `structure` back into the world where it
+        stands now.
+
+        """
+        self.structures.remove(structure)
+        for listener in self.listeners:
+            listener.structure_removed(structure)
+        with self.bulk_edit():
+            for position, block in structure.items():
+                self.add_block(position, block)
+
+    def block_at(self, position, default=None):
+        """ Return the id of the block at `position` in the world or in one
+        of the structures, or `default`.
+
+        """
+        block = self.world.get(position)
+        if block:
+            return block
+        for structure in self.structures:
+            block = structure.get(position)
+            if block is not None:
+                return block
+        return default
+
+    def occupied(self, position):
+        """ Returns True if there is a block at `position` in the world or
+        in one of the structures.
+
+        """
+        return self.block_at(position) is not None
+
+    def collide(self, position, height):
+        """ Checks to see if a player at the given `position` and `height`
+        is colliding with any blocks in the world.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position to check for collisions at.
+        height : int or float
+            The height of the player.
+
+        Returns
+        -------
+        position : tuple of len 3
+            The new position of the player taking into account collisions.
+        vertical : bool
+            Whether the player hit the ground or the ceiling.
+
+        """
+        # How much overlap with a dimension of a surrounding block you need to
+        # have to count as a collision. If 0, touching terrain at all counts as
+        # a collision. If .49, you sink into the ground, as if walking through
+        # tall grass. If >= .5, you'll fall through the ground.
+        pad = 0.25
+        p = list(position)
+        np = normalize(position)
+        vertical = False
+        for face in FACES:  # check all surrounding blocks
+            for i in xrange(3):  # check each dimension independently
+                if not face[i]:
+                    continue
+                # How much overlap you have with this dimension.
+                d = (p[i] - np[i]) * face[i]
+                if d < pad:
+                    continue
+                for dy in xrange(height):  # check each height
+                    op = list(np)
+                    op[1] -= dy
+                    op[i] += face[i]
+                    if not self.occupied(tuple(op)):
+                        continue
+                    p[i] -= (d - pad) * face[i]
+                    if face == (0, -1, 0) or face == (0, 1, 0):
+                        vertical = True
+                    break
+        return tuple(p), vertical
+
+    def page_out(self, sector, keep=()):
+        """ Page out the chunks the residency picks for a player in
+        `sector`, never the ones of the sectors in `keep`, usually the ones
+        around the player. Unchanged generated chunks are dropped rather
+        than written.
+
+        """
+        if self.residency is None:
+            return
+        for victim in self.residency.victims(sector, keep):
+            if victim in self.untouched:
+                self._drop_chunk(victim)
+            else:
+                self.residency.page_out(victim)
+
+    def is_made(self, position):
+        """ Returns False while the sector holding `position` is still being
+        made by the terrain generator.
+
+        """
+        return self.generator is None or \
+            self.world.chunk(sectorize(position)) is not None
+
+    def close(self):
+        """ Stop the autosave thread, once it has saved what it was given,
+        and remove the paged out chunks.
+
+        """
+        if self.saver is not None:
+            self.saver.close()
+            self.saver = None
+        if self.residency is not None:
+            self.residency.close()
+
+    def code_load(self, num="", type=""):
+        """
+        If given a number (num), returns composite block at that index.
+        If given a composite block type (type), returns the index of that type.
+        """
+        if not isinstance(num, str):
+            return COMPOSITE[int(num)]
+        elif not isinstance(type, str):
+            for i in xrange(0, len(COMPOSITE)):
+                if type == COMPOSITE[i]:
+                    return i
+        print("Invalid Call")
+
+    def save_world(self, path, compress=True):
+        """ Save every block of the world to the binary world file `path`.
+        See `worldfile` for the format.
+
+        """
+        if self.chunked:
+            data = [(sector, chunk.y0, chunk.blocks)
+                    for sector, chunk in self.world.chunks.items()]
+            if self.residency is not None:
+                data.extend((sector,) + self.residency.read(sector)
+                            for sector in self.residency.stored
+                            if sector not in self.world.chunks)
+        else:
+            data = worldfile.to_chunks(self.world, SECTOR_SIZE)
+        return worldfile.write(path, SECTOR_SIZE, data, blocks.NAMES,
+                               compress)
+
+    def load_world(self, path):
+        """ Replace the blocks of the world with the ones saved in `path`
+        by `save_world()`. Shown sectors are rebuilt.
+
+        """
+        data = worldfile.WorldFile(path, blocks.IDS)
+        if data.sector_size != SECTOR_SIZE:
+            raise ValueError("%s was saved with sectors of %d blocks" % (
+                path, data.sector_size))
+        self._load_chunks((sector,) + data.chunk(sector) for sector in data)
+        data.close()
+
+    def save_region(self, directory, compress=True):
+        """ Write the sectors changed since the last `save_region()` or
+        `load_region()` of `directory` to that region store, see
+        `worldfile.write_region()`. Returns the number of bytes written.
+        If the save fails the sectors stay unsaved.
+
+        """
+        snapshot = self.snapshot_unsaved(directory)
+        try:
+            return worldfile.write_region(directory, SECTOR_SIZE, snapshot,
+                                          blocks.NAMES, compress)
+        except Exception:
+            self._unsave(directory, [sector for sector, _, _ in snapshot])
+            raise
+
+    def snapshot_unsaved(self, directory):
+        """ Return (sector, y0, blocks) for each sector changed since the
+        last save to the region store `directory` and count them as saved
+        there. `blocks` is None for sectors without blocks. With NumPy chunks
+        the arrays are frozen rather than copied, and a chunk is only copied
+        if it changes again while the snapshot is still in use.
+
+        A store not saved to before gets every sector of the world, and every
+        sector it has a file for, so files of an earlier world are replaced.
+
+        """
+        key = os.path.abspath(directory)
+        unsaved = self.unsaved.get(key)
+        if unsaved is None:
+            unsaved = self._held()
+            if os.path.isdir(directory):
+                unsaved.update(worldfile.region_sectors(directory))
+        snapshot = [(sector,) + self._sector_blocks(sector)
+                    for sector in sorted(unsaved)]
+        self.unsaved[key] = set()
+        return snapshot
+
+    def _unsave(self, directory, sectors):
+        """ Count `sectors` as unsaved in the region store `directory`
+        again, after a save of them failed.
+
+        """
+        key = os.path.abspath(directory)
+        if key in self.unsaved:
+            self.unsaved[key].update(sectors)
+
+    def _held(self):
+        """ Return the set of sectors holding blocks other than the ones
+        the generator made, in memory or paged out.
+
+        """
+        if self.chunked:
+            held = set(self.world.chunks)
+            if self.residency is not None:
+                held.update(self.residency.stored)
+        else:
+            held = set(self.sectors)
+        return held - self.untouched
+
+    def autosave(self, directory=AUTOSAVE_PATH):
+        """ Save the sectors changed since the last save to the region
+        store `directory` on a background thread. Only taking the snapshot
+        happens here.
+
+        """
+        if self.saver is None:
+            self.saver = autosave.Autosave(directory, SECTOR_SIZE,
+                                           blocks.NAMES)
+        if self.saver.error is not None:
+            print("Autosave failed:", self.saver.error)
+            self.saver.error = None
+        self._unsave(self.saver.directory, self.saver.failed())
+        self.saver.submit(self.snapshot_unsaved(self.saver.directory))
+
+    def load_region(self, directory):
+        """ Replace the blocks of the world with the ones in the region
+        store `directory`. Shown sectors are rebuilt.
+
+        """
+        self._load_chunks(worldfile.read_region(directory, SECTOR_SIZE,
+                                                blocks.IDS))
+        self.unsaved[os.path.abspath(directory)] = set()
+
+    def _sector_blocks(self, sector):
+        """ Return the height of the bottom layer and the block ids of
+        `sector` as a chunk array, or None, None if it has no blocks.
+
+        """
+        if self.chunked:
+            chunk = self.world.chunks.get(sector)
+            if chunk is None and self.residency is not None and \
+                    sector in self.residency.stored:
+                # paged out, the copy on disk is up to date.
+                y0, ids = self.residency.read(sector)
+                return (y0, ids) if ids.any() else (None, None)
+            if chunk is None or not chunk.blocks.any():
+                return None, None
+            return chunk.y0, chunk.freeze()
+        positions = self.sectors.get(sector)
+        if not positions:
+            return None, None
+        found = worldfile.to_chunks(dict((p, self.world[p])
+                                         for p in positions), SECTOR_SIZE)
+        return found[0][1:]
+
+    def _load_chunks(self, data):
+        """ Replace the blocks of the world with the (sector, y0, blocks)
+        chunks in `data` and tell the listeners every sector changed. The
+        sectors of the old and the new world both count as unsaved in every
+        region store.
+
+        """
+        replaced = self._held() if self.unsaved else set()
+        self.index.clear()
+        self.type_counts.clear()
+        self.untouched.clear()
+        self.world.clear()
+        if self.residency is not None:
+            self.residency.clear()
+        if self.chunked:
+            for sector, y0, ids in data:
+                self.world.put_chunk(sector, y0, ids)
+            self.world.refresh_faces(list(self.world.chunks))
+            self.type_counts.update(self.world.counts())
+            for block in blocks.having(INDEXED_FLAGS):
+                if self.type_counts[block]:
+                    self.index[block] = set(self.world.positions_of(block))
+        else:
+            self.faces.clear()
+            self.sectors.clear()
+            s = SECTOR_SIZE
+            with self.bulk_edit():
+                for sector, y0, ids in data:
+                    xs, ys, zs = ids.nonzero()
+                    positions = zip((xs + sector[0] * s).tolist(),
+                                    (ys + y0).tolist(),
+                                    (zs + sector[2] * s).tolist())
+                    for position, block in zip(positions,
+                                               ids[xs, ys, zs].tolist()):
+                        self.add_block(position, block)
+        if self.unsaved:
+            replaced.update(self._held())
+            for unsaved in self.unsaved.values():
+                unsaved.update(replaced)
+        self._changed(None)
+
+    def load_txt(self, path='rocket.txt'):
+        """
+        Load composite blocks from a .txt file
+        """
+        if not self.rocket_loaded:
+            with self.bulk_edit():
+                for pos in self.positions_in((1, -1, -8), (20, 5, 12)):
+                    self.remove_block(pos)
+                self.add_txt(path)
+            self.rocket_loaded = True
+
+    def add_txt(self, path):
+        """ Add the structure in the .txt file `path`, whose "x y z index"
+        lines index into COMPOSITE. Raises ValueError naming the first index
+        that is not a composite block.
+
+        """
+        positions, indices = worldfile.read_txt(path)
+        n = len(COMPOSITE)
+        if worldfile.numpy is not None:
+            unknown = indices[(indices < 0) | (indices >= n)]
+        else:
+            unknown = [i for i in indices if not 0 <= i < n]
+        if len(unknown):
+            raise ValueError("%s has unknown block index %d" % (
+                path, unknown[0]))
+        if worldfile.numpy is not None:
+            block_types = worldfile.numpy.array(COMPOSITE)[indices]
+        else:
+            block_types = [COMPOSITE[i] for i in indices]
+        self.add_blocks(positions, block_types)
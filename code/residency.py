@@ -0,0 +1,236 @@
+"""
+
+sector paging
+
+A `Residency` keeps the chunks of a `chunks.ChunkWorld` that are far from the
+player, or that were not used for the longest time once the chunks in memory
+are over a byte budget, in a directory of world files (see
+`worldfile.write_sector()`) instead of in memory. A chunk that was paged out
+is read back the next time anything looks up a block in it, so the rest of
+the game does not have to know which sectors are in memory.
+
+"""
+
+import collections
+import os
+import shutil
+import tempfile
+
+import worldfile
+
+
+class Residency(object):
+    """ Pages the chunks of `world` out to `directory` and back in.
+
+    Parameters
+    ----------
+    world : chunks.ChunkWorld
+        The world to page. Its `pager` is set to this object.
+    directory : str
+        Where to make the directory of this residency's paged out chunks,
+        removed again by `close()`. The system's temporary directory when
+        None.
+    names : list of str
+        The name of each block id.
+    ids : dict
+        Mapping from block name to id.
+    radius : int
+        Chunks more than `radius` sectors from the player along x or z are
+        paged out. None for no limit.
+    budget : int
+        The most bytes of block and face arrays to keep in memory. None for
+        no limit.
+    changed : callable
+        Called with the list of sectors whose face masks were recomputed
+        after a chunk was paged back in.
+
+    """
+
+    def __init__(self, world, directory, names, ids, radius=None,
+                 budget=None, changed=None):
+        self.world = world
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = tempfile.mkdtemp(prefix='pages-', dir=directory)
+        self.names = names
+        self.ids = ids
+        self.radius = radius
+        self.budget = budget
+        self.changed = changed
+
+        # Sectors in memory from least to most recently used, kept only with
+        # a budget. Chunks added without being looked up since are older
+        # than all of them.
+        self.used = collections.OrderedDict()
+
+        # Sectors whose chunk is in `directory`.
+        self.stored = set()
+
+        # Mapping from sector to the block array read back from disk. Chunks
+        # copy their array before the first change after `freeze()`, so a
+        # chunk still holding it does not need writing again.
+        self.clean = {}
+
+        # Lookups of a chunk in memory, chunks read back from disk, and
+        # chunks paged out.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        world.pager = self
+
+    def __call__(self, sector, chunk):
+        """ Called by the world on every lookup of the chunk of `sector`,
+        `chunk` is None when it is not in memory. Returns the chunk to use.
+
+        """
+        if chunk is not None:
+            self.hits += 1
+            # the order of use only matters to the budget.
+            if self.budget is not None:
+                used = self.used
+                if sector in used:
+                    used.move_to_end(sector)
+                else:
+                    used[sector] = None
+            return chunk
+        if sector not in self.stored:
+            return None
+        self.misses += 1
+        y0, blocks = self.read(sector)
+        world = self.world
+        world.put_chunk(sector, y0, blocks)
+        chunk = world.chunks[sector]
+        self.clean[sector] = chunk.freeze()
+        self.used[sector] = None
+        # neighbours in memory may have been refreshed while this chunk was
+        # away, for example after edits beside it.
+        x, _, z = sector
+        around = [sector] + [other for other in ((x - 1, 0, z), (x + 1, 0, z),
+                                                 (x, 0, z - 1), (x, 0, z + 1))
+                             if other in world.chunks]
+        world.refresh_faces(around)
+        if self.changed is not None:
+            self.changed(around)
+        return chunk
+
+    def peek(self, sector):
+        """ Return the bottom height and block ids of the chunk of `sector`
+        if it is paged out, without paging it in, and None otherwise.
+
+        """
+        if sector in self.world.chunks or sector not in self.stored:
+            return None
+        return self.read(sector)
+
+    def read(self, sector):
+        """ Return the bottom height and block ids of the chunk of `sector`
+        from disk, without paging it in.
+
+        """
+        data = worldfile.WorldFile(worldfile.sector_path(self.directory,
+                                                         sector), self.ids)
+        y0, blocks = data.chunk(sector)
+        data.close()
+        return y0, blocks
+
+    def size(self):
+        """ Return the bytes used by the arrays of the chunks in memory.
+
+        """
+        return sum(chunk.blocks.nbytes + chunk.faces.nbytes
+                   for chunk in self.world.chunks.values())
+
+    def victims(self, center, keep=()):
+        """ Return the sectors to page out, for a player in sector `center`,
+        never one of the sectors in `keep`.
+
+        """
+        chunks = self.world.chunks
+        order = [sector for sector in chunks if sector not in self.used]
+        order.extend(sector for sector in self.used if sector in chunks)
+        result = []
+        if self.radius is not None:
+            x, _, z = center
+            for sector in order:
+                if sector not in keep and \
+                        max(abs(sector[0] - x), abs(sector[2] - z)) > \
+                        self.radius:
+                    result.append(sector)
+        if self.budget is not None:
+            size = self.size()
+            for sector in result:
+                chunk = chunks[sector]
+                size -= chunk.blocks.nbytes + chunk.faces.nbytes
+            picked = set(result)
+            for sector in order:
+                if size <= self.budget:
+                    break
+                if sector in keep or sector in picked:
+                    continue
+                chunk = chunks[sector]
+                size -= chunk.blocks.nbytes + chunk.faces.nbytes
+                result.append(sector)
+        return result
+
+    def page_out(self, sector):
+        """ Write the chunk of `sector` to disk, unless the copy there is
+        still up to date, and drop it from memory.
+
+        """
+        chunk = self.world.chunks[sector]
+        if self.clean.pop(sector, None) is not chunk.blocks:
+            worldfile.write_sector(self.directory, self.world.size, sector,
+                                   chunk.y0, chunk.blocks, self.names,
+                                   sync=False)
+            self.stored.add(sector)
+        self.world.drop_chunk(sector)
+        self.used.pop(sector, None)
+        self.evictions += 1
+
+    def forget(self, sector):
+        """ Drop the copy of `sector` on disk, used when its chunk is
+        removed from the world.
+
+        """
+        if sector in self.stored:
+            self.stored.discard(sector)
+            os.remove(worldfile.sector_path(self.directory, sector))
+        self.clean.pop(sector, None)
+        self.used.pop(sector, None)
+
+    def clear(self):
+        """ Remove every chunk from `directory`.
+
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith('.world'):
+                os.remove(os.path.join(self.directory, name))
+        self.stored.clear()
+        self.clean.clear()
+        self.used.clear()
+
+    def close(self):
+        """ Remove `directory` and every chunk in it. Paged out chunks are
+        lost, so this is for when the world is no longer used.
+
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.stored.clear()
+        self.clean.clear()
+        self.used.clear()
+
+    def stats(self):
+        """ Return the counters and how much of the world is in memory.
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / float(lookups) if lookups else 1.0,
+            'resident': len(self.world.chunks),
+            'stored': len(self.stored),
+            'bytes': self.size(),
+        }
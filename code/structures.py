@@ -0,0 +1,80 @@
+"""
+
+blocks that move together
+
+A `Structure` holds a group of blocks, like the rocket, outside of the world.
+It is drawn from a mesh of its own shifted by `offset`, so moving it does not
+touch the world or any sector mesh.
+
+"""
+
+
+class Structure(object):
+    """ A set of blocks and the offset they are drawn at.
+
+    Parameters
+    ----------
+    blocks : dict
+        Mapping from position to block id, at offset (0, 0, 0).
+
+    """
+
+    def __init__(self, blocks):
+        self.blocks = dict(blocks)
+        self.offset = (0, 0, 0)
+
+        # The (group, mode, `VertexList`) tuples drawing the structure, and
+        # the (low, high) corners of the box around its mesh at offset
+        # (0, 0, 0). Set by the renderer drawing it.
+        self.vertex_lists = []
+        self.bounds = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def move(self, dx, dy, dz):
+        x, y, z = self.offset
+        self.offset = (x + dx, y + dy, z + dz)
+
+    def local(self, position):
+        """ Return `position` relative to the structure's offset.
+
+        """
+        x, y, z = position
+        ox, oy, oz = self.offset
+        return (x - ox, y - oy, z - oz)
+
+    def get(self, position, default=None):
+        """ Return the block at world `position`, or `default`.
+
+        """
+        return self.blocks.get(self.local(position), default)
+
+    def __contains__(self, position):
+        return self.local(position) in self.blocks
+
+    def items(self):
+        """ Iterate over the (world position, block) pairs of the structure.
+
+        """
+        ox, oy, oz = self.offset
+        for (x, y, z), block in self.blocks.items():
+            yield (x + ox, y + oy, z + oz), block
+
+    def faces(self, directions):
+        """ Return the positions, visible face masks and block ids of the
+        blocks of the structure with a visible face, at offset (0, 0, 0).
+        A face is visible unless another block of the structure covers it.
+
+        """
+        positions, masks, ids = [], [], []
+        for (x, y, z), block in self.blocks.items():
+            mask = 0
+            for i, (dx, dy, dz) in enumerate(directions):
+                if (x + dx, y + dy, z + dz) not in self.blocks:
+                    mask |= 1 << i
+            if mask:
+                positions.append((x, y, z))
+                masks.append(mask)
+                ids.append(block)
+        return positions, masks, ids
@@ -0,0 +1,260 @@
+"""
+
+terrain generation
+
+A `Terrain` builds the floor, the outer walls and the hills of the story world
+from a seed, so the same seed and parameters always give the same blocks.
+
+With NumPy `chunks()` fills the whole terrain as one array, a hill layer at a
+time, and cuts it into per-sector chunks. `generate()` places the same blocks
+one position at a time.
+
+A `NoiseTerrain` has no edges. It makes the chunk of any one sector on its
+own from a height map of value noise, so sectors can be made as the player
+reaches them, in any order and on any worker, and thrown away and made again
+later with the same blocks.
+
+"""
+
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Terrain(object):
+    """ Parameters of a generated world.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the random number generator. None picks one at random.
+    grass, stone : int
+        Block ids of the top and bottom layer of the floor. The outer walls
+        are stone.
+    hill_blocks : list of int
+        Block ids the hills are made of, picked at random for each hill.
+    n : int
+        Half the width and depth of the world.
+    hills : int
+        How many hills to make.
+    sizes : (int, int)
+        Smallest and largest half side length of the base of a hill.
+    heights : (int, int)
+        Smallest and largest height of a hill.
+
+    """
+
+    def __init__(self, seed, grass, stone, hill_blocks, n=80, hills=120,
+                 sizes=(4, 8), heights=(1, 6)):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.grass = grass
+        self.stone = stone
+        self.hill_blocks = list(hill_blocks)
+        self.n = n
+        self.hills = hills
+        self.sizes = tuple(sizes)
+        self.heights = tuple(heights)
+
+    def _hills(self, rng):
+        """ Yield the (x, z, height, size, block) of each hill.
+
+        """
+        o = self.n - 10
+        for _ in range(self.hills):
+            a = rng.randint(-o, o)  # x position of the hill
+            b = rng.randint(-o, o)  # z position of the hill
+            h = rng.randint(*self.heights)  # height of the hill
+            s = rng.randint(*self.sizes)  # 2 * s is the side length of the hill
+            t = rng.choice(self.hill_blocks)
+            yield a, b, h, s, t
+
+    def generate(self):
+        """ Return a mapping from position to block id of the terrain.
+
+        """
+        rng = random.Random(self.seed)
+        world = {}
+        n = self.n
+        y = 0  # initial y height
+        for x in range(-n, n + 1):
+            for z in range(-n, n + 1):
+                # create a layer stone an grass everywhere.
+                world[x, y - 2, z] = self.grass
+                world[x, y - 3, z] = self.stone
+                if x in (-n, n) or z in (-n, n):
+                    # create outer walls.
+                    for dy in range(-2, 3):
+                        world[x, y + dy, z] = self.stone
+
+        # generate the hills randomly
+        for a, b, h, s, t in self._hills(rng):
+            c = -1  # base of the hill
+            d = 1  # how quickly to taper off the hills
+            for y in range(c, c + h):
+                for x in range(a - s, a + s + 1):
+                    for z in range(b - s, b + s + 1):
+                        if (x - a) ** 2 + (z - b) ** 2 > (s + 1) ** 2:
+                            continue
+                        if (x - 0) ** 2 + (z - 0) ** 2 < 5 ** 2:
+                            continue
+                        world[x, y, z] = t
+                s -= d  # decrement side lenth so hills taper off
+        return world
+
+    def chunks(self, sector_size):
+        """ Return the terrain as (sector, y0, blocks) chunks, the same
+        blocks as `generate()`. Needs NumPy.
+
+        """
+        rng = random.Random(self.seed)
+        n = self.n
+        s = sector_size
+        # the box holding every block: hills can reach past the walls when
+        # they are wide.
+        reach = max(n, n - 10 + self.sizes[1])
+        x0 = -reach // s * s
+        width = (reach // s + 1) * s - x0
+        y0 = -3
+        top = max(2, self.heights[1] - 2)
+        world = numpy.zeros((width, top - y0 + 1, width), dtype=numpy.uint8)
+        floor = slice(-n - x0, n - x0 + 1)
+        world[floor, -2 - y0, floor] = self.grass
+        world[floor, -3 - y0, floor] = self.stone
+        for edge in (-n - x0, n - x0):
+            world[edge, -2 - y0:3 - y0, floor] = self.stone
+            world[floor, -2 - y0:3 - y0, edge] = self.stone
+
+        # distances from the origin, hills leave a circle of radius 5 free.
+        xs = numpy.arange(x0, x0 + width)
+        near = xs[:, None] ** 2 + xs[None, :] ** 2 < 5 ** 2
+        for a, b, h, size, t in self._hills(rng):
+            for y in range(-1, -1 + h):
+                if size >= 0:
+                    cells = slice(a - size - x0, a + size + 1 - x0)
+                    rows = slice(b - size - x0, b + size + 1 - x0)
+                    d = numpy.arange(-size, size + 1)
+                    mask = d[:, None] ** 2 + d[None, :] ** 2 <= (size + 1) ** 2
+                    mask &= ~near[cells, rows]
+                    world[cells, y - y0, rows][mask] = t
+                size -= 1
+
+        result = []
+        for i in range(width // s):
+            for k in range(width // s):
+                blocks = world[i * s:(i + 1) * s, :, k * s:(k + 1) * s]
+                layers = blocks.any(axis=(0, 2)).nonzero()[0]
+                if not len(layers):
+                    continue
+                low, high = layers[0], layers[-1]
+                sector = (x0 // s + i, 0, x0 // s + k)
+                result.append((sector, y0 + int(low),
+                               blocks[:, low:high + 1].copy()))
+        return result
+
+
+class NoiseTerrain(object):
+    """ Rolling hills without an edge, made a sector at a time. Needs
+    NumPy.
+
+    Every column has stone at the bottom, the grass floor on top of it and,
+    where the height map rises above the floor, a hill of one of
+    `hill_blocks`. Hills flatten out near the origin so the player starts on
+    open ground.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the noise. None picks one at random.
+    grass, stone : int
+        Block ids of the top and bottom layer of the floor.
+    hill_blocks : list of int
+        Block ids the hills are made of. Which one is used changes slowly
+        across the world.
+    height : int
+        The tallest a hill can get.
+    scale : float
+        About how many blocks apart neighbouring hills are.
+    flat : float
+        Radius of the flat area around the origin.
+
+    """
+
+    def __init__(self, seed, grass, stone, hill_blocks, height=6, scale=24.0,
+                 flat=10.0):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.grass = grass
+        self.stone = stone
+        self.hill_blocks = list(hill_blocks)
+        self.height = height
+        self.scale = scale
+        self.flat = flat
+
+    def _lattice(self, xs, zs, salt):
+        """ Return a random value from 0 to 1 for each integer lattice point
+        (`xs`, `zs`), the same every time for the same seed and `salt`.
+
+        """
+        h = (xs.astype(numpy.uint64) * numpy.uint64(0x9E3779B1) +
+             zs.astype(numpy.uint64) * numpy.uint64(0x85EBCA77) +
+             numpy.uint64((self.seed * 0x27D4EB2F + salt) % 2 ** 64))
+        # mix the bits, see the finaliser of MurmurHash3.
+        h ^= h >> numpy.uint64(33)
+        h *= numpy.uint64(0xFF51AFD7ED558CCD)
+        h ^= h >> numpy.uint64(33)
+        h *= numpy.uint64(0xC4CEB9FE1A85EC53)
+        h ^= h >> numpy.uint64(33)
+        return (h & numpy.uint64(0xFFFF)).astype(float) / 0xFFFF
+
+    def noise(self, xs, zs, scale, salt=0):
+        """ Return smooth value noise from 0 to 1 at the points (`xs`, `zs`),
+        with features about `scale` blocks apart.
+
+        """
+        gx, gz = xs / scale, zs / scale
+        x0, z0 = numpy.floor(gx), numpy.floor(gz)
+        fx, fz = gx - x0, gz - z0
+        # ease the blend between lattice points so there are no creases.
+        fx = fx * fx * (3 - 2 * fx)
+        fz = fz * fz * (3 - 2 * fz)
+        x0, z0 = x0.astype(numpy.int64), z0.astype(numpy.int64)
+        a = self._lattice(x0, z0, salt)
+        b = self._lattice(x0 + 1, z0, salt)
+        c = self._lattice(x0, z0 + 1, salt)
+        d = self._lattice(x0 + 1, z0 + 1, salt)
+        return (a * (1 - fx) + b * fx) * (1 - fz) + (c * (1 - fx) + d * fx) * fz
+
+    def chunk(self, sector, sector_size):
+        """ Return the bottom height and the block ids of the chunk of
+        `sector`, see `worldfile.write()`.
+
+        """
+        s = sector_size
+        xs = numpy.arange(s)[:, None] + sector[0] * s + numpy.zeros((1, s))
+        zs = numpy.arange(s)[None, :] + sector[2] * s + numpy.zeros((s, 1))
+        hills = (0.7 * self.noise(xs, zs, self.scale, 1) +
+                 0.3 * self.noise(xs, zs, self.scale / 3, 2))
+        # sharpen the noise into separate hills with flat ground between.
+        hills = numpy.clip(hills * 2 - 0.8, 0, 1)
+        distance = numpy.sqrt(xs ** 2 + zs ** 2)
+        hills *= numpy.clip((distance - self.flat) / self.flat, 0, 1)
+        tops = numpy.floor(hills * (self.height + 1)).astype(int) - 2
+        kind = self.noise(xs, zs, self.scale * 4, 3)
+        kind = numpy.minimum(kind * len(self.hill_blocks),
+                             len(self.hill_blocks) - 1).astype(int)
+
+        y0 = -3
+        ys = numpy.arange(y0, max(self.height - 2, -2) + 1)[None, :, None]
+        blocks = numpy.zeros((s, ys.shape[1], s), dtype=numpy.uint8)
+        blocks[:, 0, :] = self.stone
+        blocks[:, 1, :] = self.grass
+        hill = (ys > -2) & (ys <= tops[:, None, :])
+        fill = numpy.array(self.hill_blocks, dtype=numpy.uint8)[kind]
+        blocks[hill] = numpy.broadcast_to(fill[:, None, :], blocks.shape)[hill]
+        return y0, blocks
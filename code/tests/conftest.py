@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# the game's modules are imported from the code directory.
+CODE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE)
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    """ Run the test in an empty directory, so nothing the Model writes is
+    left in the tree.
+
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
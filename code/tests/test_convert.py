@@ -0,0 +1,46 @@
+import os
+import pickle
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import convert
+import model
+import worldfile
+from conftest import CODE
+
+SOURCES = ['composite_world.pkl', 'rocket.pkl', 'nmusaf.pkl', 'rocket.txt',
+           'nmusaf.txt']
+
+
+def count(path):
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            return len(pickle.load(f))
+    with open(path) as f:
+        return len(f.readlines())
+
+
+@pytest.mark.parametrize('name', SOURCES)
+def test_converted_file_loads(scratch, name):
+    source = os.path.join(CODE, name)
+    out = convert.convert(source, str(scratch / (name + '.world')))
+    m = model.Model(size=20)
+    m.load_world(out)
+    assert len(m.world) == count(source)
+    assert sum(m.type_counts.values()) == count(source)
+    m.close()
+
+
+def test_txt_palette_has_only_used_blocks():
+    world, names = convert.read_txt(os.path.join(CODE, 'rocket.txt'))
+    assert sorted(set(world.values())) == list(range(1, len(names)))
+
+
+def test_unknown_block_is_named(scratch):
+    path = str(scratch / 'odd.world')
+    worldfile.write(path, 16, [((0, 0, 0), 0, model.chunks.numpy.ones(
+        (16, 1, 16), dtype='uint8'))], ['Air', 'Unobtainium'])
+    with pytest.raises(ValueError, match='Unobtainium'):
+        worldfile.WorldFile(path, model.blocks.IDS)
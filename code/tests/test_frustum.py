@@ -0,0 +1,42 @@
+import pytest
+
+import frustum
+
+
+def visible(rotation, position, low, high, **kwargs):
+    planes = frustum.planes(rotation, position, 4.0 / 3, **kwargs)
+    return frustum.box_visible(planes, low, high)
+
+
+@pytest.mark.parametrize('low, high, expected', [
+    ((-1, -1, -10), (1, 1, -8), True),  # straight ahead
+    ((-1, -1, 8), (1, 1, 10), False),  # behind
+    ((-1, -1, -100), (1, 1, -90), False),  # past the far plane
+    ((40, -1, -10), (42, 1, -8), False),  # off to the right
+    ((-42, -1, -10), (-40, 1, -8), False),  # off to the left
+    ((-1, 30, -10), (1, 32, -8), False),  # above
+    ((-1, -1, -1), (1, 1, 1), True),  # around the player
+    ((-100, -1, -30), (100, 1, -28), True),  # wider than the view
+])
+def test_looking_down_the_z_axis(low, high, expected):
+    assert visible((0, 0), (0, 0, 0), low, high) == expected
+
+
+def test_turning_and_moving():
+    ahead = ((8, -1, -1), (10, 1, 1))
+    assert not visible((0, 0), (0, 0, 0), *ahead)
+    # the game looks along +x when turned by 90 degrees.
+    assert visible((90, 0), (0, 0, 0), *ahead)
+    assert not visible((-90, 0), (0, 0, 0), *ahead)
+    # moved past the box, which is now behind.
+    assert not visible((90, 0), (20, 0, 0), *ahead)
+    # looking straight up and straight down.
+    above = ((-1, 8, -1), (1, 10, 1))
+    assert visible((0, 90), (0, 0, 0), *above)
+    assert not visible((0, -90), (0, 0, 0), *above)
+
+
+def test_far_plane():
+    box = ((-1, -1, -50), (1, 1, -48))
+    assert visible((0, 0), (0, 0, 0), *box, far=60.0)
+    assert not visible((0, 0), (0, 0, 0), *box, far=40.0)
@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+import mesher
+
+
+def cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+
+def random_world(rng, n=6, squares=3):
+    """ A mapping from position to texture with a few texture squares, so
+    some neighbouring faces merge and some do not.
+
+    """
+    textures = [mesher._square(k, 0) * 6 for k in range(squares)]
+    return dict(((x, y, z), rng.choice(textures))
+                for x in range(n) for y in range(n) for z in range(n)
+                if rng.random() < 0.6)
+
+
+def naive_cells(faces):
+    """ Mapping from (position, face) to texture square of every visible
+    face, one per block.
+
+    """
+    cells = {}
+    for position, mask, texture in faces:
+        for i in range(6):
+            if mask & (1 << i):
+                cells[position, i] = mesher.tile(texture, i)
+    return cells
+
+
+def greedy_cells(meshes, n=0.5):
+    """ The same mapping as `naive_cells()` for the quads made by
+    `greedy_faces()`, failing if two quads cover the same face.
+
+    """
+    normals = [mesher.FACE_CORNERS[i][0][mesher._axes(i)[0]]
+               for i in range(6)]
+    cells = {}
+    for square, (vertices, tex_coords) in meshes.items():
+        assert len(vertices) % 12 == 0
+        for q in range(0, len(vertices), 12):
+            corners = [vertices[q + k:q + k + 3] for k in range(0, 12, 3)]
+            # the face a quad belongs to follows from its winding.
+            edges = [[b[k] - a[k] for k in range(3)]
+                     for a, b in [corners[:2], corners[1:3]]]
+            out = cross(*edges)
+            i = [i for i in range(6)
+                 if out[mesher._axes(i)[0]] * normals[i] > 0][0]
+            axis = mesher._axes(i)[0]
+            low = [min(c[k] for c in corners) + n for k in range(3)]
+            high = [max(c[k] for c in corners) - n for k in range(3)]
+            low[axis] = high[axis] = corners[0][axis] - normals[i] * n
+            for x in range(int(low[0]), int(high[0]) + 1):
+                for y in range(int(low[1]), int(high[1]) + 1):
+                    for z in range(int(low[2]), int(high[2]) + 1):
+                        assert ((x, y, z), i) not in cells
+                        cells[(x, y, z), i] = square
+    return cells
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_greedy_covers_the_visible_faces(seed):
+    faces = mesher._exposed(random_world(random.Random(seed)))
+    meshes = mesher.greedy_faces(faces)
+    assert greedy_cells(meshes) == naive_cells(faces)
+    greedy = sum(len(v) for v, _ in meshes.values())
+    assert greedy < len(mesher.sector_faces(faces)[0])
+
+
+def test_greedy_merges_a_flat_floor():
+    floor = mesher._square(1, 0) * 6
+    faces = mesher._exposed(dict(((x, 0, z), floor)
+                                 for x in range(16) for z in range(16)))
+    meshes = mesher.greedy_faces(faces)
+    assert list(meshes) == [(1, 0)]
+    # top and bottom as one quad each, and one strip along each side.
+    assert len(meshes[1, 0][0]) == 6 * 12
+
+
+def test_index_quads_shares_corners():
+    # two quads side by side on the floor, with texture coordinates that
+    # follow the grid like the greedy ones.
+    vertices = [0, 0, 0, 0, 0, 1, 1, 0, 1, 1, 0, 0,
+                1, 0, 0, 1, 0, 1, 2, 0, 1, 2, 0, 0]
+    tex_coords = [x for k in range(0, 24, 3)
+                  for x in (vertices[k], vertices[k + 2])]
+    out, out_tex, indices = mesher.index_quads(vertices, tex_coords)
+    assert len(out) == 6 * 3
+    assert len(out_tex) == 6 * 2
+    assert len(indices) == 2 * 6
+    corners = [tuple(out[k * 3:k * 3 + 3]) for k in indices]
+    assert corners[:6] == [(0, 0, 0), (0, 0, 1), (1, 0, 1),
+                           (0, 0, 0), (1, 0, 1), (1, 0, 0)]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_index_quads_counts(seed):
+    faces = mesher._exposed(random_world(random.Random(seed)))
+    for vertices, tex_coords in mesher.greedy_faces(faces).values():
+        out, out_tex, indices = mesher.index_quads(vertices, tex_coords)
+        quads = len(vertices) // 12
+        assert len(indices) == 6 * quads
+        assert len(out) // 3 == len(out_tex) // 2 <= 4 * quads
+        assert sorted(set(indices)) == list(range(len(out) // 3))
+        # every triangle corner is a corner of the quad it came from.
+        for q in range(quads):
+            quad = set(tuple(vertices[k:k + 3])
+                       for k in range(q * 12, q * 12 + 12, 3))
+            for k in indices[q * 6:q * 6 + 6]:
+                assert tuple(out[k * 3:k * 3 + 3]) in quad
@@ -0,0 +1,365 @@
+import collections
+import os
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import blocks
+import model
+import worldfile
+from conftest import CODE
+
+
+@pytest.fixture(autouse=True)
+def seeded(monkeypatch):
+    """ Build the same world in every run. """
+    monkeypatch.setattr(model, 'WORLD_SEED', 1)
+
+
+@pytest.fixture(params=[True, False], ids=['chunks', 'dict'])
+def chunked(request, monkeypatch):
+    monkeypatch.setattr(model, 'USE_CHUNKS', request.param)
+    return request.param
+
+
+@pytest.fixture
+def paged(scratch, monkeypatch):
+    """ Page every chunk more than two sectors from the player out. """
+    monkeypatch.setattr(model, 'PAGE_PATH', str(scratch))
+    monkeypatch.setattr(model, 'PAGE_RADIUS', 2)
+    monkeypatch.setattr(model, 'PAGE_BUDGET', None)
+
+
+def edit(m, rng, sectors, n):
+    """ Add or remove `n` random blocks just above the floor of `sectors`. """
+    s = model.SECTOR_SIZE
+    for _ in range(n):
+        x, _, z = rng.choice(sectors)
+        position = (x * s + rng.randrange(s), rng.randrange(-1, 3),
+                    z * s + rng.randrange(s))
+        if rng.random() < 0.5:
+            m.add_block(position, model.BRICK)
+        elif position in m.world:
+            m.remove_block(position)
+
+
+def wrong_faces(m):
+    return [position for position in m.world
+            if m.faces.get(position, 0) != m._mask(position)]
+
+
+def blocks_of(m):
+    return dict(m.world.items())
+
+
+def test_exposed(chunked):
+    m = model.Model(size=20)
+    m.add_blocks([(x, y, z) for x in range(3, 6) for y in range(10, 13)
+                  for z in range(3, 6)], [model.BRICK] * 27)
+    assert m.exposed((3, 10, 3))
+    assert not m.exposed((4, 11, 4))
+    assert not m.exposed((4, 20, 4))
+    m.close()
+
+
+def test_faces_after_edits(chunked):
+    m = model.Model(size=32)
+    rng = random.Random(1)
+    sectors = list(m.sectors)
+    edit(m, rng, sectors, 300)
+    with m.bulk_edit():
+        edit(m, rng, sectors, 300)
+    assert wrong_faces(m) == []
+    m.close()
+
+
+def test_faces_after_paging(paged):
+    m = model.Model(size=48)
+    sectors = sorted(m.world.chunks)
+    rng = random.Random(3)
+    for x in range(-4, 4):
+        m.page_out((x, 0, 0), model.sectors_around((x, 0, 0), 2))
+        edit(m, rng, sectors, 20)
+    assert m.residency.stats()['stored']
+    for sector in sectors:
+        m.world.chunk(sector)
+    before = dict((sector, chunk.faces.copy())
+                  for sector, chunk in m.world.chunks.items())
+    m.world.refresh_faces(list(m.world.chunks))
+    for sector, chunk in m.world.chunks.items():
+        assert (before[sector] == chunk.faces).all(), sector
+    m.close()
+
+
+def test_budget_pages_out_least_recently_used(scratch, monkeypatch):
+    monkeypatch.setattr(model, 'PAGE_PATH', str(scratch))
+    monkeypatch.setattr(model, 'PAGE_BUDGET', 2 ** 30)
+    m = model.Model(size=48)
+    before = blocks_of(m)
+    budget = m.residency.budget = m.residency.size() // 2
+    m.block_at((0, -2, 0))
+    m.page_out((0, 0, 0), [])
+    assert m.residency.size() <= budget
+    assert (0, 0, 0) in m.world.chunks
+    assert m.residency.stored
+    # paged back in when looked up.
+    assert dict((p, m.world[p]) for p in before) == before
+    m.close()
+
+
+def test_no_pager_by_default():
+    m = model.Model(size=20)
+    assert m.residency is None
+    m.close()
+
+
+def test_models_do_not_share_pages(paged):
+    a = model.Model(size=20)
+    b = model.Model(size=20)
+    assert a.residency.directory != b.residency.directory
+    a.close()
+    assert os.path.isdir(b.residency.directory)
+    b.close()
+
+
+def test_save_and_load_world(scratch, chunked):
+    m = model.Model(size=20)
+    edit(m, random.Random(2), list(m.sectors), 200)
+    m.save_world('saved.world')
+    loaded = model.Model(size=40)
+    loaded.load_world('saved.world')
+    assert blocks_of(loaded) == blocks_of(m)
+    assert +loaded.type_counts == +m.type_counts
+    assert wrong_faces(loaded) == []
+    m.close()
+    loaded.close()
+
+
+def test_type_counts_after_add_chunk(monkeypatch):
+    monkeypatch.setattr(model, 'INFINITE_WORLD', True)
+    m = model.Model()
+    for x in range(-2, 3):
+        sector = (x, 0, 7)
+        assert m.needs(sector)
+        m.make(sector)
+    assert +m.type_counts == +collections.Counter(m.world.values())
+    # a chunk generated for a sector that was edited in the meantime.
+    sector = (0, 0, 9)
+    result = m.generator.chunk(sector, model.SECTOR_SIZE)
+    m.add_block((5, 4, 9 * model.SECTOR_SIZE + 5), model.BRICK)
+    assert not m.needs(sector)
+    with pytest.raises(ValueError):
+        m.add_chunk(sector, *result)
+    assert +m.type_counts == +collections.Counter(m.world.values())
+    m.close()
+
+
+def test_each_store_gets_every_change(scratch, chunked):
+    m = model.Model(size=20)
+    m.save_region('a')
+    m.add_block((3, 4, 3), model.BRICK)
+    m.save_region('b')
+    m.remove_block((0, -2, 0))
+    m.save_region('a')
+    for directory in ['a', 'b']:
+        m.save_region(directory)
+        loaded = model.Model(size=20)
+        loaded.load_region(directory)
+        assert blocks_of(loaded) == blocks_of(m), directory
+    m.close()
+
+
+def test_saving_a_new_world_removes_old_sectors(scratch, chunked):
+    m = model.Model(size=40)
+    m.save_region('store')
+    small = model.Model(size=20)
+    small.save_world('small.world')
+    m.load_world('small.world')
+    m.save_region('store')
+    loaded = model.Model(size=40)
+    loaded.load_region('store')
+    assert blocks_of(loaded) == blocks_of(small)
+    # a new Model saving over the files of the big world.
+    big = model.Model(size=40)
+    big.save_region('store')
+    small.save_region('store')
+    loaded.load_region('store')
+    assert blocks_of(loaded) == blocks_of(small)
+    for each in [m, small, loaded, big]:
+        each.close()
+
+
+def test_add_txt(scratch, chunked):
+    m = model.Model(size=20)
+    m.add_txt(os.path.join(CODE, 'nmusaf.txt'))
+    with open(os.path.join(CODE, 'nmusaf.txt')) as f:
+        assert sum(m.type_counts[block] for block in model.COMPOSITE) == \
+            len(f.readlines())
+    scratch.joinpath('bad.txt').write_text('1 2 3 0\n1 2 4 9\n')
+    with pytest.raises(ValueError, match='index 9'):
+        m.add_txt('bad.txt')
+    m.close()
+
+
+def failing_write(monkeypatch, after):
+    """ Make world file writes fail after `after` more succeed. """
+    write = worldfile.write
+    left = [after]
+
+    def flaky(*args, **kwargs):
+        if left[0] == 0:
+            raise IOError("disk full")
+        left[0] -= 1
+        return write(*args, **kwargs)
+    monkeypatch.setattr(worldfile, 'write', flaky)
+    return lambda: monkeypatch.setattr(worldfile, 'write', write)
+
+
+def test_failed_autosave_is_saved_again(scratch, chunked, monkeypatch):
+    m = model.Model(size=20)
+    m.autosave('store')
+    m.saver.wait()
+    m.add_block((3, 4, 3), model.BRICK)
+    restore = failing_write(monkeypatch, 0)
+    m.autosave('store')
+    m.saver.wait()
+    assert m.saver.error is not None
+    restore()
+    m.autosave('store')
+    m.saver.wait()
+    m.autosave('store')
+    m.saver.wait()
+    loaded = model.Model(size=20)
+    loaded.load_region('store')
+    assert blocks_of(loaded) == blocks_of(m)
+    m.close()
+
+
+def test_interrupted_save_keeps_the_store(scratch, monkeypatch):
+    m = model.Model(size=20)
+    m.save_region('store')
+    before = blocks_of(m)
+    m.add_blocks([(x, 4, z) for x in range(-20, 20, 3)
+                  for z in range(-20, 20, 3)], [model.BRICK] * 196)
+    restore = failing_write(monkeypatch, 3)
+    with pytest.raises(IOError):
+        m.save_region('store')
+    loaded = model.Model(size=20)
+    loaded.load_region('store')
+    assert blocks_of(loaded) == before
+    restore()
+    m.save_region('store')
+    loaded.load_region('store')
+    assert blocks_of(loaded) == blocks_of(m)
+    assert sorted(os.listdir('store')) == sorted(
+        set(worldfile.region_files('store').values()) | {'manifest'})
+    m.close()
+
+
+def test_saving_over_a_loaded_world(scratch, chunked):
+    m = model.Model(size=20)
+    m.save_world('world', compress=False)
+    m.load_world('world')
+    before = blocks_of(m)
+    other = model.Model(size=20)
+    other.add_blocks([(x, 4, 0) for x in range(-10, 10)], [model.BRICK] * 20)
+    other.save_world('world', compress=False)
+    assert blocks_of(m) == before
+    small = model.Model(size=10)
+    small.save_world('world', compress=False)
+    assert blocks_of(m) == before
+    m.save_world('world', compress=False)
+    for each in [m, other, small]:
+        each.close()
+
+
+def test_add_blocks_with_repeated_positions(chunked):
+    m = model.Model(size=20)
+    count = len(m.world)
+    counts = +m.type_counts
+    m.add_blocks([(3, 4, 3), (3, 4, 3), (30, 4, 3), (3, 4, 3)],
+                 [model.BRICK, model.SAND, model.SAND, model.STONE])
+    assert m.world[3, 4, 3] == model.STONE
+    assert len(m.world) == count + 2
+    counts[model.STONE] += 1
+    counts[model.SAND] += 1
+    assert +m.type_counts == counts
+    assert +collections.Counter(m.world.values()) == counts
+    m.close()
+
+
+def test_tick_without_a_window():
+    m = model.Model(size=20)
+    m.start_mob()
+    player = (m.mob_x_position + 1, m.mob_y_position, m.mob_z_position)
+    for _ in range(200):
+        assert m.tick(player) == player
+    assert m.health < 10
+    assert m.health * 2 == int(m.health * 2)
+    m.trapped = True
+    m.ai.status = False
+    for _ in range(5):
+        m.load_creeper(player)
+    assert m.creeper_count == 5
+    for creeper in m.creeper:
+        if creeper.status:
+            m.neutralize((creeper.pos_x, creeper.pos_y + 1, creeper.pos_z),
+                         player)
+    assert m.creepers_safe()
+    m.tick(player)
+    assert len(m.sensors) == 4
+    for sensor in m.sensors:
+        x, y, z = sensor.location
+        m.place((x + 1, y, z), model.ELECH)
+        m.added_elech = False
+    moved = [m.tick(player) for _ in range(20)]
+    assert m.rocket_launched
+    assert (10, m.rocket_altitude + 19, 2) in moved
+    m.close()
+
+
+def test_seed(monkeypatch):
+    a = model.Model(size=20)
+    b = model.Model(seed=1, size=20)
+    assert a.sat_pieces == b.sat_pieces
+    assert blocks_of(a) == blocks_of(b)
+    monkeypatch.setattr(model, 'WORLD_SEED', None)
+    c = model.Model(size=20)
+    assert c.terrain.seed is not None
+    for each in [a, b, c]:
+        each.close()
+
+
+def test_lift_and_settle(chunked):
+    m = model.Model(size=20)
+    m.add_txt(os.path.join(CODE, 'rocket.txt'))
+    before = blocks_of(m)
+    counts = +m.type_counts
+    rocket = m.lift(m.positions_with(blocks.COMPOSITE))
+    assert len(rocket) and not m.positions_with(blocks.COMPOSITE)
+    position, block = next(iter(rocket.items()))
+    assert position not in m.world
+    assert m.block_at(position) == block
+    m.move_structure(rocket, 0, 5, 0)
+    x, y, z = position
+    assert m.block_at((x, y + 5, z)) == block
+    assert m.occupied((x, y + 5, z))
+    # moved back and settled where it started, the world is as before.
+    m.move_structure(rocket, 0, -5, 0)
+    m.settle(rocket)
+    assert m.structures == []
+    assert blocks_of(m) == before
+    assert +m.type_counts == counts
+    assert wrong_faces(m) == []
+    # settled higher up, every block moved with it.
+    rocket = m.lift(m.positions_with(blocks.COMPOSITE))
+    m.move_structure(rocket, 0, 20, 0)
+    m.settle(rocket)
+    moved = dict(((x, y + 20, z), block) for (x, y, z), block
+                 in before.items() if blocks.has(block, blocks.COMPOSITE))
+    assert dict((p, b) for p, b in blocks_of(m).items()
+                if blocks.has(b, blocks.COMPOSITE)) == moved
+    assert wrong_faces(m) == []
+    m.close()
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+
+import pytest
+
+pyglet = pytest.importorskip('pyglet')
+pyglet.options['headless'] = True
+
+import model
+from conftest import CODE
+
+
+@pytest.fixture(scope='module')
+def game():
+    """ The game script, which can not be imported by name. """
+    path = os.path.join(CODE, '16_story_build_launch_sat.py')
+    spec = importlib.util.spec_from_file_location('game', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def renderer(game, monkeypatch):
+    """ A Renderer recording the sectors it shows and hides instead of
+    building their meshes.
+
+    """
+    monkeypatch.chdir(CODE)
+    m = model.Model(size=20)
+    renderer = game.Renderer(m)
+    renderer.calls = []
+    renderer._show_sector = lambda sector: renderer.calls.append(
+        ('show', sector))
+    renderer._hide_sector = lambda sector: renderer.calls.append(
+        ('hide', sector))
+    yield renderer
+    m.close()
+
+
+def test_repeated_calls_coalesce(renderer):
+    renderer.show_sector((1, 0, 1))
+    renderer.show_sector((1, 0, 1))
+    renderer.hide_sector((2, 0, 2))
+    renderer.hide_sector((2, 0, 2))
+    assert renderer.queue_depth == 2
+    assert renderer.cancelled == 0
+    renderer.process_entire_queue()
+    assert sorted(renderer.calls) == [('hide', (2, 0, 2)),
+                                      ('show', (1, 0, 1))]
+
+
+def test_show_and_hide_cancel(renderer):
+    # never shown, so hiding it again leaves nothing to do.
+    renderer.show_sector((1, 0, 1))
+    renderer.hide_sector((1, 0, 1))
+    # still shown, so showing it again keeps it as it is.
+    renderer._shown[3, 0, 3] = []
+    renderer.hide_sector((3, 0, 3))
+    renderer.show_sector((3, 0, 3))
+    assert renderer.queue_depth == 0
+    assert renderer.cancelled == 2
+    renderer.process_entire_queue()
+    assert renderer.calls == []
+
+
+def test_closest_sectors_ahead_come_first(renderer):
+    renderer.set_focus((0, 0, 0), (0, 0, -1))
+    for sector in [(0, 0, 2), (0, 0, -2), (0, 0, 1), (2, 0, 0), (0, 0, -1)]:
+        renderer.show_sector(sector)
+    renderer.process_entire_queue()
+    # beside counts double and behind triple.
+    assert [sector for _, sector in renderer.calls] == [
+        (0, 0, -1), (0, 0, -2), (0, 0, 1), (2, 0, 0), (0, 0, 2)]
+
+
+def test_turning_reorders_the_queue(renderer):
+    renderer.set_focus((0, 0, 0), (0, 0, -1))
+    renderer.show_sector((0, 0, 2))
+    renderer.show_sector((0, 0, -2))
+    renderer.set_focus((0, 0, 0), (0, 0, 1))
+    renderer.process_entire_queue()
+    assert renderer.calls == [('show', (0, 0, 2)), ('show', (0, 0, -2))]
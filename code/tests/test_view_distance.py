@@ -0,0 +1,53 @@
+import view_distance
+
+TARGET = 1.0 / 60
+
+
+def run(view, dt, seconds):
+    """ Feed `seconds` worth of frames `dt` apart, returning how often the
+    radius changed.
+
+    """
+    changes = 0
+    for _ in range(int(seconds / dt)):
+        changes += view.update(dt)
+    return changes
+
+
+def test_shrinks_to_low_when_slow():
+    view = view_distance.ViewDistance(16, radius=4, low=2, high=8)
+    run(view, 3 * TARGET, 30)
+    assert view.radius == 2
+    assert view.far == 1.75 * 16
+
+
+def test_grows_to_high_when_fast():
+    view = view_distance.ViewDistance(16, radius=4, low=2, high=8)
+    run(view, TARGET / 2, 30)
+    assert view.radius == 8
+    assert view.fog_start == view.far / 3
+
+
+def test_stays_inside_the_band():
+    view = view_distance.ViewDistance(16, radius=4, low=2, high=8)
+    assert run(view, 1.3 * TARGET, 30) == 0
+    assert view.radius == 4
+
+
+def test_one_slow_frame_does_not_shrink():
+    view = view_distance.ViewDistance(16, radius=4, low=2, high=8)
+    run(view, 1.3 * TARGET, 1)
+    assert not view.update(0.1)
+    assert run(view, 1.3 * TARGET, 5) == 0
+    assert view.radius == 4
+
+
+def test_one_step_per_patience():
+    view = view_distance.ViewDistance(16, radius=4, low=2, high=8,
+                                      patience=1.0)
+    # the moving average leaves the band within a few frames, then the
+    # radius changes once per second.
+    assert run(view, 3 * TARGET, 1.5) == 1
+    assert view.radius == 3
+    assert run(view, 3 * TARGET, 1.0) == 1
+    assert view.radius == 2
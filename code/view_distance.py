@@ -0,0 +1,89 @@
+"""
+
+adaptive view distance
+
+Picks how many sectors around the player are shown, growing the view when
+frames come in on time and shrinking it when they are late. The far plane of
+the projection and the fog follow the sector radius.
+
+"""
+
+
+class ViewDistance(object):
+    """ Keeps the time between frames near `target` by changing the sector
+    radius between `low` and `high`.
+
+    Parameters
+    ----------
+    sector_size : int
+        The size of a sector in blocks.
+    radius : int
+        The starting radius, in sectors.
+    low, high : int
+        The smallest and largest radius to use.
+    target : float
+        The wanted time between frames in seconds.
+    grow, shrink : float
+        The radius grows when the smoothed frame time is below
+        `grow * target` and shrinks when it is above `shrink * target`. In
+        between it stays put.
+    smoothing : float
+        Weight of each new frame time in the moving average, from 0 to 1.
+    patience : float
+        How many seconds the frame time has to stay outside the band before
+        the radius changes, so a single slow frame does not shrink the view.
+
+    """
+
+    def __init__(self, sector_size, radius=4, low=2, high=8, target=1.0 / 60,
+                 grow=1.1, shrink=1.5, smoothing=0.05, patience=1.0):
+        self.sector_size = sector_size
+        self.radius = radius
+        self.low = low
+        self.high = high
+        self.target = target
+        self.grow = grow
+        self.shrink = shrink
+        self.smoothing = smoothing
+        self.patience = patience
+        # moving average of the time between frames.
+        self.frame_time = target
+        # how long the frame time has been outside the band.
+        self.waited = 0.0
+
+    @property
+    def far(self):
+        """ Distance of the far plane and the end of the fog. 60 for the
+        default radius of 4 sectors of 16 blocks.
+
+        """
+        return (self.radius - 0.25) * self.sector_size
+
+    @property
+    def fog_start(self):
+        return self.far / 3
+
+    def update(self, dt):
+        """ Add the time `dt` since the last frame, as reported by
+        `pyglet.clock`. Returns True if the radius changed.
+
+        """
+        self.frame_time += self.smoothing * (dt - self.frame_time)
+        if self.frame_time > self.shrink * self.target and \
+                self.radius > self.low:
+            step = -1
+        elif self.frame_time < self.grow * self.target and \
+                self.radius < self.high:
+            step = 1
+        else:
+            self.waited = 0.0
+            return False
+        self.waited += dt
+        if self.waited < self.patience:
+            return False
+        self.radius += step
+        self.waited = 0.0
+        # start over from the middle of the band so the next change needs
+        # fresh evidence.
+        self.frame_time = (self.grow + self.shrink) / 2 * self.target
+        return True
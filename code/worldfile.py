@@ -0,0 +1,403 @@
+"""
+
+binary world files
+
+A world file holds the block ids of every chunk of a world:
+
+    header   magic, version, flags, sector size, palette and chunk counts
+    palette  the name of each block id used in the file
+    table    sector, bottom height, height, offset and length of each chunk
+    payload  the blocks of each chunk as a size x height x size uint8 array,
+             zlib compressed when the COMPRESSED flag is set
+
+The file is read through `mmap`. Uncompressed chunks are used straight from
+the mapping and are only copied, a page at a time, when they are changed.
+Compressed chunks are only unpacked when they are asked for.
+
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b'SCWF'
+VERSION = 1
+
+# flags
+COMPRESSED = 1
+
+# The file of a region store naming the world file of each saved sector, see
+# `write_region()`.
+MANIFEST = 'manifest'
+
+HEADER = struct.Struct('<4sHHHHI')
+NAME = struct.Struct('<H')
+ENTRY = struct.Struct('<iiiIQQ')
+
+
+def write(path, sector_size, chunks, names, compress=True, sync=False):
+    """ Write a world file. It is written next to `path` and renamed over
+    it, so the pages of a file already at `path` that chunks are still
+    loaded from never change, and a failed write leaves the old file.
+
+    Parameters
+    ----------
+    path : str
+        Where to write the file.
+    sector_size : int
+        The width and depth of each chunk.
+    chunks : iterable of (sector, y0, blocks)
+        The sector of each chunk, the height of its bottom layer and its
+        block ids as a (sector_size, height, sector_size) uint8 array.
+    names : list of str
+        The name of each block id, `names[0]` is "no block".
+    compress : bool
+        Whether to zlib compress the chunk payloads.
+    sync : bool
+        Whether to wait until the file is on disk.
+
+    Returns
+    -------
+    size : int
+        The number of bytes written.
+
+    """
+    chunks = list(chunks)
+    palette = b''.join(NAME.pack(len(name.encode('utf-8'))) +
+                       name.encode('utf-8') for name in names)
+    offset = HEADER.size + len(palette) + ENTRY.size * len(chunks)
+    table = []
+    payloads = []
+    for (x, _, z), y0, blocks in chunks:
+        data = numpy.ascontiguousarray(blocks, dtype=numpy.uint8).tobytes()
+        if compress:
+            data = zlib.compress(data, 1)
+        table.append(ENTRY.pack(x, z, y0, blocks.shape[1], offset,
+                                len(data)))
+        payloads.append(data)
+        offset += len(data)
+    flags = COMPRESSED if compress else 0
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, sector_size, len(names),
+                            len(chunks)))
+        f.write(palette)
+        f.write(b''.join(table))
+        for data in payloads:
+            f.write(data)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    return offset
+
+
+class WorldFile(object):
+    """ A world file opened for reading.
+
+    Parameters
+    ----------
+    path : str
+        The file to open.
+    ids : dict
+        Mapping from block name to the id to load it as. Defaults to the ids
+        in the file.
+
+    """
+
+    def __init__(self, path, ids=None):
+        with open(path, 'rb') as f:
+            # a private mapping, writes go to copies of the pages touched.
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, self.flags, self.sector_size, count, chunk_count = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a world file" % path)
+        if version != VERSION:
+            raise ValueError("%s has unsupported version %d" % (path, version))
+        offset = HEADER.size
+        self.names = []
+        for _ in range(count):
+            length, = NAME.unpack_from(self.map, offset)
+            offset += NAME.size
+            self.names.append(self.map[offset:offset + length].decode('utf-8'))
+            offset += length
+        # lookup table from file id to loaded id, None when they are equal.
+        self.lookup = None
+        if ids is not None:
+            lookup = [0]
+            for name in self.names[1:]:
+                if name not in ids:
+                    raise ValueError("%s has unknown block %r" % (path, name))
+                lookup.append(ids[name])
+            if lookup != list(range(len(lookup))):
+                self.lookup = numpy.zeros(256, dtype=numpy.uint8)
+                self.lookup[:len(lookup)] = lookup
+        # Mapping from sector to (y0, height, offset, length).
+        self.table = {}
+        for _ in range(chunk_count):
+            x, z, y0, height, start, length = ENTRY.unpack_from(self.map,
+                                                                 offset)
+            offset += ENTRY.size
+            self.table[x, 0, z] = (y0, height, start, length)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def chunk(self, sector):
+        """ Return the bottom height and the block ids of the chunk of
+        `sector`.
+
+        """
+        y0, height, start, length = self.table[sector]
+        s = self.sector_size
+        shape = (s, height, s)
+        if self.flags & COMPRESSED:
+            data = zlib.decompress(self.map[start:start + length])
+            blocks = numpy.frombuffer(data, dtype=numpy.uint8).reshape(shape)
+            # frombuffer() of bytes is read only.
+            blocks = blocks.copy()
+        else:
+            blocks = numpy.frombuffer(self.map, dtype=numpy.uint8,
+                                      count=length, offset=start)
+            blocks = blocks.reshape(shape)
+        if self.lookup is not None:
+            blocks = self.lookup[blocks]
+        return y0, blocks
+
+    def close(self):
+        self.map = None
+
+
+def sector_path(directory, sector):
+    """ Return the path of the file holding `sector` in the region store
+    `directory`.
+
+    """
+    return os.path.join(directory, '%d_%d.world' % (sector[0], sector[2]))
+
+
+def region_files(directory):
+    """ Return a mapping from each sector saved in the region store
+    `directory` to the name of the world file holding it. Stores without a
+    manifest hold one `sector_path()` file per sector.
+
+    """
+    files = {}
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                x, z, name = line.split()
+                files[int(x), 0, int(z)] = name
+        return files
+    for name in os.listdir(directory):
+        if not name.endswith('.world'):
+            continue
+        x, z = name[:-len('.world')].split('_')
+        files[int(x), 0, int(z)] = name
+    return files
+
+
+def region_sectors(directory):
+    """ Return the set of sectors saved in the region store `directory`.
+
+    """
+    return set(region_files(directory))
+
+
+def write_region(directory, sector_size, chunks, names, compress=True,
+                 sync=True):
+    """ Save the (sector, y0, blocks) `chunks` to the region store
+    `directory`, removing the sectors whose `blocks` is None and keeping
+    every other sector saved there before.
+
+    Each chunk goes to a new file, and the manifest naming the file of every
+    sector is then replaced with one rename, so a save that fails or is
+    interrupted leaves the store as it was before. Files no longer named are
+    removed after the switch. See `write()` for `sync`.
+
+    Returns
+    -------
+    size : int
+        The number of bytes written.
+
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    files = region_files(directory)
+    generation = 1 + max([int(name.split('.')[1]) for name in files.values()
+                          if name.count('.') == 2] or [0])
+    size = 0
+    for sector, y0, blocks in chunks:
+        if blocks is None:
+            files.pop(sector, None)
+            continue
+        name = '%d_%d.%d.world' % (sector[0], sector[2], generation)
+        size += write(os.path.join(directory, name), sector_size,
+                      [(sector, y0, blocks)], names, compress, sync)
+        files[sector] = name
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        for (x, _, z), name in sorted(files.items()):
+            f.write('%d %d %s\n' % (x, z, name))
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    named = set(files.values())
+    for name in os.listdir(directory):
+        if name.endswith(('.world', '.world.tmp')) and name not in named:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                # still mapped on some systems, the next save retries.
+                pass
+    return size
+
+
+def write_sector(directory, sector_size, sector, y0, blocks, names,
+                 compress=True, sync=True):
+    """ Save one chunk as a world file of its own in the region store
+    `directory`, replacing its old file. If `blocks` is None the sector's
+    file is removed. See `write()` for `sync`.
+
+    Returns
+    -------
+    size : int
+        The number of bytes written.
+
+    """
+    path = sector_path(directory, sector)
+    if blocks is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    return write(path, sector_size, [(sector, y0, blocks)], names, compress,
+                 sync)
+
+
+def read_region(directory, sector_size, ids=None):
+    """ Yield (sector, y0, blocks) for every chunk saved in the region
+    store `directory`. See `WorldFile` for `ids`.
+
+    """
+    for name in sorted(set(region_files(directory).values())):
+        data = WorldFile(os.path.join(directory, name), ids)
+        if data.sector_size != sector_size:
+            raise ValueError("%s was saved with sectors of %d blocks" % (
+                name, data.sector_size))
+        for sector in data:
+            yield (sector,) + data.chunk(sector)
+        data.close()
+
+
+def read_txt(path):
+    """ Read a .txt structure file of "x y z index" lines in one go.
+
+    Returns
+    -------
+    positions : (N, 3) int array
+    indices : (N,) int array
+        Lists of tuples and ints without NumPy.
+
+    """
+    with open(path) as f:
+        values = f.read().split()
+    if numpy is None:
+        values = [int(v) for v in values]
+        return ([tuple(values[i:i + 3]) for i in range(0, len(values), 4)],
+                values[3::4])
+    data = numpy.array(values, dtype=numpy.int64).reshape(-1, 4)
+    return data[:, :3], data[:, 3]
+
+
+def to_chunks(world, sector_size):
+    """ Split `world`, a mapping from position to block id, into chunks for
+    `write()`.
+
+    """
+    s = sector_size
+    columns = {}
+    for (x, y, z), block in world.items():
+        columns.setdefault((x // s, 0, z // s), []).append((x % s, y, z % s,
+                                                            block))
+    result = []
+    for sector, cells in columns.items():
+        cells = numpy.array(cells)
+        y0 = int(cells[:, 1].min())
+        blocks = numpy.zeros((s, int(cells[:, 1].max()) - y0 + 1, s),
+                             dtype=numpy.uint8)
+        blocks[cells[:, 0], cells[:, 1] - y0, cells[:, 2]] = cells[:, 3]
+        result.append((sector, y0, blocks))
+    return result
+
+
+def _benchmark(name, world, path='benchmark.world', sector_size=16):
+    import time
+    names = ['Air'] + ['block %d' % i for i in range(1, 256)]
+    start = time.perf_counter()
+    with open(path, 'w') as f:
+        for (x, y, z), block in world.items():
+            f.write("%d %d %d %d\n" % (x, y, z, block - 1))
+    txt_write = time.perf_counter() - start
+    txt_size = os.path.getsize(path)
+    start = time.perf_counter()
+    loaded = {}
+    with open(path) as f:
+        line = f.readline()
+        while line:
+            line = line.split(" ")
+            loaded[int(line[0]), int(line[1]), int(line[2])] = \
+                int(line[3]) + 1
+            line = f.readline()
+    txt_read = time.perf_counter() - start
+    print("%-18s %-6s %8d bytes  write %7.4fs  read %7.4fs" % (
+        name, "txt", txt_size, txt_write, txt_read))
+    for compress in (False, True):
+        start = time.perf_counter()
+        size = write(path, sector_size, to_chunks(world, sector_size),
+                     names, compress)
+        binary_write = time.perf_counter() - start
+        start = time.perf_counter()
+        data = WorldFile(path)
+        count = 0
+        for sector in data:
+            count += int(numpy.count_nonzero(data.chunk(sector)[1]))
+        binary_read = time.perf_counter() - start
+        data.close()
+        assert count == len(world)
+        print("%-18s %-6s %8d bytes  write %7.4fs  read %7.4fs" % (
+            name, "zlib" if compress else "raw", size, binary_write,
+            binary_read))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    # Compare the .txt format with raw and compressed world files.
+    for path in ['rocket.txt', 'nmusaf.txt']:
+        world = {}
+        with open(path) as f:
+            for line in f:
+                x, y, z, index = [int(v) for v in line.split()]
+                world[x, y, z] = index + 1
+        _benchmark(path, world)
+    # the floor and outer walls built by Model._initialize().
+    world = {}
+    n = 80
+    for x in range(-n, n + 1):
+        for z in range(-n, n + 1):
+            world[x, -2, z] = 1
+            world[x, -3, z] = 2
+            if x in (-n, n) or z in (-n, n):
+                for y in range(-2, 3):
+                    world[x, y, z] = 2
+    _benchmark("161x161 world", world)